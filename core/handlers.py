@@ -5,7 +5,7 @@
 - График поставок
 - Акции (с фото)
 - Справка (3 сообщения)
-- Каталог с заказом (пошагово)
+- Каталог с заказом (пошагово) — по снимку остатков, SQL только на резерв
 - Контакты
 - Мои заказы + отмена
 """
@@ -14,11 +14,14 @@ import os
 from typing import Tuple
 from typing import Dict, Any, List
 from html import escape
-from datetime import date, datetime
+from datetime import datetime
 
 # ✅ Глобальный импорт db
 from database.repository import db
+from database.inventory import inventory
 from core.session import get_session
+from utils.schedule_render import render_schedule
+from utils.promotions_cache import get_active_promotions
 
 logger = logging.getLogger(__name__)
 
@@ -59,12 +62,9 @@ def get_today_str():
 
 
 async def get_available_breeds_from_db():
+    """Породы в продаже — из снимка остатков (SQL только после изменения партий/заказов)"""
     try:
-        result = await db.execute_read(
-            "SELECT DISTINCT breed FROM stocks WHERE available_quantity > 0 AND status = 'active' AND date >= ?",
-            (get_today_str(),)
-        )
-        return [row[0] for row in result]
+        return await inventory.breeds()
     except Exception as e:
         logger.error(f"❌ Ошибка загрузки пород: {e}")
         return []
@@ -72,57 +72,9 @@ async def get_available_breeds_from_db():
 
 # === 1. Форматирование графика поставок ===
 async def format_schedule_message() -> str:
+    """График поставок в markdown — готовый текст из кэша utils.schedule_render"""
     try:
-        today = date.today().isoformat()
-        result = await db.execute_read(
-            """
-            SELECT breed, incubator, date, available_quantity, quantity, price 
-            FROM stocks 
-            WHERE quantity > 0 AND status = 'active' AND date >= ?
-            ORDER BY date
-            """,
-            (today,)
-        )
-
-        if not result:
-            return "📅 Нет активных поставок на ближайшее время."
-
-        message_lines = ["📦 *График поставок:*", ""]
-        for record in result:
-            breed, incubator, raw_date, avail_qty, total_qty, price = record
-            try:
-                avail = max(int(avail_qty or 0), 0)
-                total = max(int(total_qty or 0), 1)
-                percent = (avail / total) * 100
-            except (ValueError, TypeError):
-                continue
-
-            icon = "🟢" if percent >= 50 else "🟡" if percent >= 10 else "🔴"
-
-            try:
-                price_value = int(float(price or 0))
-            except (ValueError, TypeError):
-                price_value = 0
-
-            try:
-                dt = datetime.strptime(raw_date, "%Y-%m-%d")
-                formatted_date = dt.strftime("%d-%m-%Y")
-            except ValueError:
-                formatted_date = raw_date
-
-            breed_safe = escape(breed)
-            incubator_safe = escape(incubator) if incubator else "Не указан"
-
-            message_lines.append(
-                f"🐔 *Порода:* {breed_safe}\n"
-                f"🏢 *Инкубатор:* {incubator_safe}\n"
-                f"📅 *Поставка:* {formatted_date}\n"
-                f"{icon} *Доступно:* {avail} шт.\n"
-                f"💰 *Цена:* {price_value} руб."
-            )
-            message_lines.append("")
-
-        return "\n".join(message_lines).strip()
+        return await render_schedule("markdown")
 
     except Exception as e:
         logger.error(f"❌ Ошибка формирования графика: {e}", exc_info=True)
@@ -131,32 +83,13 @@ async def format_schedule_message() -> str:
 
 # === 2. Получение акций ===
 async def get_formatted_promotions() -> List[Dict[str, Any]]:
+    """Акции для MAX — из общего кэша utils.promotions_cache"""
     try:
-        promotions = await db.get_active_promotions()
+        promotions = await get_active_promotions()
         if not promotions:
             return [{"text": "📭 Нет активных акций.", "image_url": None}]
 
-        result = []
-        for promo in promotions:
-            try:
-                title = escape(str(promo['title']))
-                desc = escape(str(promo['description']))
-                image_url = str(promo['image_url']).strip() if promo['image_url'] else None
-                start_date = promo['start_date']
-                end_date = promo['end_date']
-
-                start_str = f"📅 Начало: {start_date}\n" if start_date else ""
-                end_str = f"🔚 Окончание: {end_date}\n" if end_date else "🔚 Окончание: бессрочно\n"
-                text = f"🎁 *{title}*\n\n{start_str}{end_str}{desc}"
-
-                result.append({
-                    "text": text,
-                    "image_url": image_url
-                })
-            except Exception as e:
-                logger.error(f"❌ Ошибка формирования акции: {e}", exc_info=True)
-
-        return result
+        return [{"text": promo["caption_markdown"], "image_url": promo["image_url"]} for promo in promotions]
 
     except Exception as e:
         logger.error(f"❌ Ошибка загрузки акций: {e}", exc_info=True)
@@ -337,11 +270,11 @@ async def cancel_order_by_id(order_id: int, user_id: str) -> Tuple[bool, str]:
         if not row["stock_id"]:
             return False, "Заказ не привязан к партии."
 
-        # Откатываем количество
-        success = await db.execute_transaction([
-            ("UPDATE stocks SET available_quantity = available_quantity + ? WHERE id = ?", (row["quantity"], row["stock_id"])),
-            ("UPDATE orders SET status = 'cancelled', updated_at = datetime('now') WHERE id = ?", (order_id,))
-        ])
+        # Количество в партию возвращает триггер trg_orders_update_hold
+        success = await db.execute_write(
+            "UPDATE orders SET status = 'cancelled', updated_at = datetime('now') WHERE id = ? AND status = 'pending'",
+            (order_id,)
+        )
 
         if success:
             return True, f"✅ Заказ №{order_id} отменён. {row['quantity']} шт. возвращены в партию."
@@ -394,14 +327,10 @@ async def handle_catalog_breed(user_id: str, breed: str) -> Dict[str, Any]:
     session.data["selected_breed"] = breed
     session.state = SELECTING_INCUBATOR
 
-    result = await db.execute_read(
-        "SELECT DISTINCT incubator FROM stocks WHERE breed = ? AND available_quantity > 0 AND status = 'active' AND date >= ?",
-        (breed, get_today_str())
-    )
-    if not result:
+    incubators = await inventory.incubators(breed)
+    if not incubators:
         return {"text": "🏭 Нет доступных инкубаторов."}
 
-    incubators = [row[0] for row in result]
     session.data["available_incubators"] = incubators
 
     buttons = [[{
@@ -424,18 +353,7 @@ async def handle_catalog_incubator(user_id: str, incubator: str) -> Dict[str, An
     session.state = SELECTING_DATE
 
     breed = session.data["selected_breed"]
-    result = await db.execute_read(
-        "SELECT date, available_quantity, price FROM stocks WHERE breed = ? AND incubator = ? AND available_quantity > 0 AND status = 'active' ORDER BY date ASC",
-        (breed, incubator)
-    )
-
-    today = datetime.now().date()
-    filtered = []
-    for date_str, qty, price in result:
-        stock_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-        if stock_date >= today:
-            filtered.append((date_str, qty, price))
-
+    filtered = await inventory.dates(breed, incubator)
     if not filtered:
         return {"text": "📅 Нет доступных дат."}
 
@@ -513,13 +431,14 @@ async def handle_catalog_phone(user_id: str, phone: str) -> Dict[str, Any]:
     elif not phone.startswith("+7"):
         return {"text": "❌ Введите +7XXXXXXXXXX"}
 
-    if await db.is_phone_blocked(phone):
+    verdict = await db.get_phone_verdict(phone)
+    if verdict["blocked"]:
         session.state = "idle"
         session.data.clear()
         return {"text": "🚫 Номер заблокирован."}
 
     session.data["phone"] = phone
-    session.data["phone_verified"] = await db.is_trusted_phone(phone)
+    session.data["phone_verified"] = verdict["trusted"]
 
     is_admin = False
     if not session.data["phone_verified"] and qty > 50 and not is_admin:
@@ -567,30 +486,18 @@ async def confirm_order_final(user_id: str) -> Dict[str, Any]:
     session = get_session(user_id)
     data = session.data
 
-    stock_id = await db.get_stock_id(data["selected_breed"], data["selected_incubator"], data["selected_date"])
-    if not stock_id:
-        return {"text": "❌ Партия не найдена."}
-
-    stock = await db.execute_read("SELECT available_quantity FROM stocks WHERE id = ?", (stock_id,))
-    if not stock or data["selected_quantity"] > stock[0][0]:
+    order_id = await db.reserve_and_create_order(
+        user_id=int(user_id),
+        phone=data["phone"],
+        quantity=data["selected_quantity"],
+        price=data["selected_price"],
+        breed=data["selected_breed"],
+        date=data["selected_date"],
+        incubator=data["selected_incubator"]
+    )
+    if not order_id:
         return {"text": "❌ Количество изменилось. Попробуйте снова."}
 
-    success = await db.execute_transaction([
-        ("INSERT INTO orders (user_id, phone, breed, date, quantity, price, stock_id, incubator, status, created_at, updated_at) "
-         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', datetime('now'), datetime('now'))",
-         (int(user_id), data["phone"], data["selected_breed"], data["selected_date"],
-          data["selected_quantity"], data["selected_price"], stock_id, data["selected_incubator"])),
-
-        ("UPDATE stocks SET available_quantity = available_quantity - ? WHERE id = ? AND available_quantity >= ?",
-         (data["selected_quantity"], stock_id, data["selected_quantity"])),
-
-        ("UPDATE stocks SET status = 'inactive' WHERE id = ? AND (SELECT available_quantity FROM stocks WHERE id = ?) <= 0",
-         (stock_id, stock_id)),
-    ])
-
-    if not success:
-        return {"text": "❌ Не удалось оформить заказ. Попробуйте позже."}
-
     try:
         delivery_date = datetime.strptime(data["selected_date"], "%Y-%m-%d").strftime("%d-%m-%Y")
     except ValueError:
@@ -1,3 +1,4 @@
 # database/__init__.py
 from .repository import db, init_db, close_db, DB
-__all__ = ["db", "init_db", "close_db", "DB"]
+from .inventory import inventory, Inventory
+__all__ = ["db", "init_db", "close_db", "DB", "inventory", "Inventory"]
@@ -0,0 +1,143 @@
+# database/inventory.py
+"""
+Снимок остатков для каталога: порода → инкубатор → дата → (stock_id, available, price).
+✅ Один SELECT на загрузку, дальше выбор породы/инкубатора/даты/количества — без SQL
+✅ Резерв заказа патчит снимок на месте (DB.add_stock_listener → stock_id, delta)
+✅ Любая другая запись в stocks/orders (отмена, выдача, правка, архив, новая партия) — перезагрузка при следующем обращении
+✅ Смена дня — перезагрузка (партии в прошлом из каталога уходят)
+✅ Общий для Telegram-каталога и MAX (core.handlers)
+✅ version() — (DB.stock_version, сегодня): ключ для кэшей, производных от остатков (график поставок)
+✅ Ошибка SELECT не запоминается как пустой склад — перечитываем при следующем обращении
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from database.repository import db as default_db, DB
+
+logger = logging.getLogger(__name__)
+
+# (stock_id, available_quantity, price)
+StockEntry = Tuple[int, int, float]
+
+
+class Inventory:
+    def __init__(self, database: DB):
+        self.db = database
+        self._tree: Dict[str, Dict[str, Dict[str, list]]] = {}
+        self._by_id: Dict[int, Tuple[str, str, str]] = {}
+        self._loaded_day: Optional[str] = None
+        self._dirty = True
+        self._generation = 0  # Изменения во время загрузки не теряются
+        self._lock = asyncio.Lock()
+        self._stats = {"reloads": 0, "patches": 0, "invalidations": 0, "last_reload_ms": 0.0}
+        database.add_stock_listener(self._on_stock_change)
+
+    # === Актуализация ===
+
+    def _on_stock_change(self, stock_id: Optional[int], delta: Optional[int]):
+        self._generation += 1
+        if self._dirty:
+            return
+        location = self._by_id.get(stock_id) if stock_id is not None and delta is not None else None
+        if location is None:
+            self.invalidate()
+            return
+        breed, incubator, date = location
+        entry = self._tree[breed][incubator][date]
+        entry[1] += delta
+        self._stats["patches"] += 1
+        if entry[1] <= 0:
+            self._remove(stock_id)
+
+    def _remove(self, stock_id: int):
+        breed, incubator, date = self._by_id.pop(stock_id)
+        incubators = self._tree[breed]
+        del incubators[incubator][date]
+        if not incubators[incubator]:
+            del incubators[incubator]
+        if not incubators:
+            del self._tree[breed]
+
+    def version(self) -> Tuple[int, str]:
+        """Меняется при любой записи в stocks/orders и при смене дня — без SQL"""
+        return self.db.stock_version, datetime.now().strftime("%Y-%m-%d")
+
+    def invalidate(self):
+        """Снимок устарел — перечитать при следующем обращении"""
+        if not self._dirty:
+            self._stats["invalidations"] += 1
+        self._dirty = True
+
+    async def _ensure(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        if not self._dirty and self._loaded_day == today:
+            return
+        async with self._lock:
+            if not self._dirty and self._loaded_day == today:
+                return
+            await self._reload(today)
+
+    async def _reload(self, today: str):
+        started = datetime.now()
+        generation = self._generation
+        try:
+            rows = await self.db.execute_read(
+                """
+                SELECT id, breed, incubator, date, available_quantity, price
+                FROM stocks
+                WHERE status = 'active' AND available_quantity > 0 AND date >= ?
+                ORDER BY date
+                """,
+                (today,),
+                raise_errors=True
+            )
+        except Exception:
+            # Сбой чтения — не пустой склад: старый снимок остаётся, _dirty — повтор при следующем обращении
+            self._dirty = True
+            logger.warning("⚠️ Снимок остатков не обновлён: ошибка чтения stocks")
+            return
+        tree: Dict[str, Dict[str, Dict[str, list]]] = {}
+        by_id: Dict[int, Tuple[str, str, str]] = {}
+        for stock_id, breed, incubator, date, available, price in rows:
+            tree.setdefault(breed, {}).setdefault(incubator, {})[date] = [stock_id, available, price]
+            by_id[stock_id] = (breed, incubator, date)
+
+        self._tree, self._by_id, self._loaded_day = tree, by_id, today
+        # Пока шёл SELECT, кто-то записал — снимок мог не увидеть запись
+        self._dirty = generation != self._generation
+        self._stats["reloads"] += 1
+        self._stats["last_reload_ms"] = round((datetime.now() - started).total_seconds() * 1000, 2)
+        logger.debug(f"📦 Снимок остатков: {len(by_id)} партий, {len(tree)} пород")
+
+    # === Чтение ===
+
+    async def breeds(self) -> List[str]:
+        """Породы, у которых есть партии с остатком на сегодня и позже"""
+        await self._ensure()
+        return sorted(self._tree)
+
+    async def incubators(self, breed: str) -> List[str]:
+        await self._ensure()
+        return sorted(self._tree.get(breed, {}))
+
+    async def dates(self, breed: str, incubator: str) -> List[Tuple[str, int, float]]:
+        """[(date, available_quantity, price)] по возрастанию даты — формат available_dates в каталоге"""
+        await self._ensure()
+        dates = self._tree.get(breed, {}).get(incubator, {})
+        return [(date, entry[1], entry[2]) for date, entry in sorted(dates.items())]
+
+    async def get(self, breed: str, incubator: str, date: str) -> Optional[StockEntry]:
+        """(stock_id, available_quantity, price) или None, если партии нет в продаже"""
+        await self._ensure()
+        entry = self._tree.get(breed, {}).get(incubator, {}).get(date)
+        return tuple(entry) if entry else None
+
+    def get_stats(self) -> Dict[str, float]:
+        return {**self._stats, "stocks": len(self._by_id), "breeds": len(self._tree), "dirty": self._dirty}
+
+
+# === Глобальный экземпляр ===
+inventory = Inventory(default_db)
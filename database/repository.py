@@ -16,13 +16,30 @@
 ✅ 🆕 set_promotion_active(), get_all_promotions()
 ✅ 🧼 Удалены дубли и логические ошибки
 ✅ ❌ УДАЛЕНА: таблица schedule (не используется)
+✅ 🆕 Пул читающих соединений (WAL) + отдельное соединение-писатель
+✅ 🆕 Фоновый PASSIVE-чекпоинт WAL по таймеру/размеру, TRUNCATE при закрытии
+✅ 🆕 Опциональный group commit: пачка одиночных записей — одна транзакция
+✅ 🆕 execute_stream() — потоковое чтение через fetchmany для больших выборок
+✅ 🆕 Тайминги запросов (count, p50/p95/max, строки) и журнал медленных запросов с EXPLAIN
+✅ 🆕 Версионные миграции (schema_version): тёплый старт — один SELECT
+✅ 🆕 reserve_and_create_order(): условная вставка заказа + RETURNING в одной транзакции
+✅ 🆕 Миграция 4: составные/покрывающие/частичные индексы горячих запросов
+✅ 🆕 stock_movements + триггеры: available_quantity ведёт БД, сверка — только затронутых партий
+✅ 🆕 stock_version и add_stock_listener(): кэши остатков узнают об изменениях без SQL
+✅ 🆕 promotions_version: кэш акций сбрасывается после правок в админке
+✅ 🆕 telegram_files: file_id локальных картинок переживает перезапуск
+✅ 🆕 add_user_listener(): кэши phone → user_id сбрасываются при upsert_user / trust_phone
+✅ 🆕 get_phone_verdict(): доверенный / блокировка / попытки — один запрос + короткий кэш
 """
 
 import os
+import re
 import aiosqlite
 import logging
 import asyncio
-from typing import List, Tuple, Optional
+import time
+from collections import deque
+from typing import List, Tuple, Optional, Dict, Any, AsyncIterator, Union, Callable
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -32,19 +49,99 @@ load_dotenv()
 # ✅ Единый путь к БД — теперь доступен для импорта
 DB_PATH = os.getenv("DB_PATH", "chicken_sales.db")
 
+# Количество read-only соединений для SELECT (0 — читать через писателя)
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "3"))
+
+# Фоновый чекпоинт WAL: период (сек) и порог размера -wal файла (байт)
+DB_CHECKPOINT_INTERVAL = float(os.getenv("DB_CHECKPOINT_INTERVAL", "60"))
+DB_CHECKPOINT_WAL_BYTES = int(os.getenv("DB_CHECKPOINT_WAL_BYTES", str(4 * 1024 * 1024)))
+
+# Group commit для execute_write: включение, окно сбора (мс) и максимум записей в пачке
+DB_GROUP_COMMIT = os.getenv("DB_GROUP_COMMIT", "False").lower() in ("true", "1", "yes")
+DB_GROUP_COMMIT_WINDOW_MS = float(os.getenv("DB_GROUP_COMMIT_WINDOW_MS", "5"))
+DB_GROUP_COMMIT_MAX_BATCH = int(os.getenv("DB_GROUP_COMMIT_MAX_BATCH", "200"))
+
+# Порог медленного запроса (мс) и размер окна замеров для перцентилей
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+QUERY_STATS_SAMPLES = 500
+SLOW_QUERY_LOG_SIZE = 50
+
+# Вердикт по номеру (доверенный / блокировка / попытки): время жизни и размер кэша
+PHONE_VERDICT_TTL = float(os.getenv("PHONE_VERDICT_TTL", "30"))
+PHONE_VERDICT_CACHE_SIZE = 2000
+
+# Статусы заказа, которые держат количество в партии:
+# available_quantity = quantity − Σ quantity таких заказов (поддерживается триггерами)
+STOCK_HOLD_STATUSES = ("pending", "active", "issued")
+_HOLD_SQL = "('pending', 'active', 'issued')"
+
 logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(f"{__name__}.slow")
+
+__all__ = ["db", "init_db", "close_db", "DB_PATH", "normalize_sql", "STOCK_HOLD_STATUSES"]
 
-__all__ = ["db", "init_db", "close_db", "DB_PATH"]
+_SQL_COMMENT_RE = re.compile(r"--[^\n]*")
+_SQL_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SQL_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SQL_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_SPACE_RE = re.compile(r"\s+")
+# Запись в эти таблицы меняет остатки (orders — через триггеры stock_movements)
+_STOCK_WRITE_RE = re.compile(r"\b(stocks|orders)\b", re.IGNORECASE)
+_PROMOTIONS_WRITE_RE = re.compile(r"\bpromotions\b", re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Приводит SQL к ключу для статистики: без комментариев, литералов и лишних пробелов.
+    IN (?, ?, ?) сворачивается в IN (?...), чтобы списки разной длины считались одним запросом.
+    """
+    q = _SQL_COMMENT_RE.sub(" ", query)
+    q = _SQL_STRING_RE.sub("?", q)
+    q = _SQL_NUMBER_RE.sub("?", q)
+    q = _SQL_IN_LIST_RE.sub("(?...)", q)
+    return _SQL_SPACE_RE.sub(" ", q).strip()
 
 
 class DB:
-    def __init__(self, db_path: str = None):
+    def __init__(self, db_path: str = None, read_pool_size: int = None, group_commit: bool = None):
         self.db_path = db_path or DB_PATH
-        self.conn = None
+        self.conn = None  # Единственный писатель: INSERT/UPDATE/DELETE и транзакции
         self.semaphore = asyncio.Semaphore(1)  # Защита от параллельных транзакций
+        self.read_pool_size = DB_READ_POOL_SIZE if read_pool_size is None else max(0, read_pool_size)
+        self._readers: List[aiosqlite.Connection] = []
+        self._read_pool: Optional[asyncio.Queue] = None
+        self._write_lock = asyncio.Lock()  # Запросы писателя не перемешиваются внутри транзакции
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        self._checkpoint_wakeup: Optional[asyncio.Event] = None
+        self._checkpoint_stats: Dict[str, Any] = {
+            "passive_runs": 0,
+            "truncate_runs": 0,
+            "busy": 0,
+            "last_mode": None,
+            "last_at": None,
+            "last_duration_ms": 0.0,
+            "last_wal_frames": 0,
+            "last_checkpointed_frames": 0,
+            "writes_since_checkpoint": 0,
+        }
+        self.group_commit = DB_GROUP_COMMIT if group_commit is None else group_commit
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._write_queue_task: Optional[asyncio.Task] = None
+        self._group_commit_stats: Dict[str, int] = {"batches": 0, "writes": 0, "max_batch": 0}
+        self.slow_query_ms = DB_SLOW_QUERY_MS
+        self._query_stats: Dict[str, Dict[str, Any]] = {}
+        self._normalized_cache: Dict[str, str] = {}
+        self._slow_queries: deque = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self._query_plans: Dict[str, str] = {}
+        self._explain_tasks: set = set()
+        self.stock_version = 0  # Растёт при каждой закоммиченной записи в stocks/orders
+        self.promotions_version = 0  # То же для promotions (правки акций в админке)
+        self._stock_listeners: List[Callable[[Optional[int], Optional[int]], None]] = []
+        self._user_listeners: List[Callable[[Optional[str], int], None]] = []
+        self._phone_verdicts: Dict[str, Tuple[Dict[str, Any], float]] = {}  # phone → (вердикт, expires_at)
 
     async def connect(self):
-        """Устанавливает соединение с базой данных"""
+        """Устанавливает соединение-писатель и открывает пул читателей"""
         try:
             if not os.path.exists(self.db_path):
                 logger.info(f"Создаём новую базу данных: {self.db_path}")
@@ -54,12 +151,316 @@ class DB:
             await self.conn.execute("PRAGMA journal_mode=WAL;")
             await self.conn.execute("PRAGMA synchronous=NORMAL;")
             logger.info(f"Подключение к БД '{self.db_path}' установлено")
-            await self._create_tables()
-            await self._create_indexes()
+            await self._apply_migrations()
+            await self._open_read_pool()
+            self._start_checkpointer()
+            if self.group_commit:
+                self._start_write_queue()
         except Exception as e:
             logger.error(f"Ошибка подключения к БД: {e}", exc_info=True)
             raise
 
+    async def _open_read_pool(self):
+        """
+        Открывает read-only соединения для SELECT.
+        В режиме WAL читатели не ждут писателя: каталог, график и отчёты
+        не встают в очередь за записью или долгим /export.
+        """
+        self._read_pool = asyncio.Queue()
+        for _ in range(self.read_pool_size):
+            reader = await aiosqlite.connect(self.db_path)
+            reader.row_factory = aiosqlite.Row
+            await reader.execute("PRAGMA query_only=ON;")
+            self._readers.append(reader)
+            self._read_pool.put_nowait(reader)
+        if self._readers:
+            logger.info(f"📚 Открыто {len(self._readers)} соединений для чтения")
+
+    async def _acquire_reader(self) -> aiosqlite.Connection:
+        """Берёт свободного читателя из пула (или писателя, если пул выключен)"""
+        if not self._readers:
+            return self.conn
+        return await self._read_pool.get()
+
+    def _release_reader(self, reader: aiosqlite.Connection):
+        if reader is not self.conn and self._read_pool is not None:
+            self._read_pool.put_nowait(reader)
+
+    # === Чекпоинт WAL ===
+
+    def _start_checkpointer(self):
+        """Запускает фоновую задачу PASSIVE-чекпоинта"""
+        if self._checkpoint_task and not self._checkpoint_task.done():
+            return
+        self._checkpoint_wakeup = asyncio.Event()
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+
+    async def _checkpoint_loop(self):
+        """
+        PASSIVE-чекпоинт раз в DB_CHECKPOINT_INTERVAL секунд
+        или раньше, если -wal файл перерос DB_CHECKPOINT_WAL_BYTES.
+        PASSIVE не ждёт читателей и не блокирует их.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._checkpoint_wakeup.wait(), timeout=DB_CHECKPOINT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._checkpoint_wakeup.clear()
+            if self._checkpoint_stats["writes_since_checkpoint"] == 0:
+                continue
+            await self.checkpoint("PASSIVE")
+
+    def _wal_size(self) -> int:
+        try:
+            return os.path.getsize(f"{self.db_path}-wal")
+        except OSError:
+            return 0
+
+    def _note_write(self):
+        """Учитывает запись и будит чекпоинтер, если WAL слишком вырос"""
+        self._checkpoint_stats["writes_since_checkpoint"] += 1
+        if self._checkpoint_wakeup and self._wal_size() >= DB_CHECKPOINT_WAL_BYTES:
+            self._checkpoint_wakeup.set()
+
+    def add_stock_listener(self, callback: Callable[[Optional[int], Optional[int]], None]):
+        """
+        Подписка на изменения остатков: callback(stock_id, delta) после коммита.
+        stock_id/delta известны только для резерва заказа, иначе — (None, None): «что-то поменялось».
+        """
+        self._stock_listeners.append(callback)
+
+    def add_user_listener(self, callback: Callable[[Optional[str], int], None]):
+        """
+        Подписка на изменения связки телефон ↔ пользователь: callback(phone, user_id)
+        после upsert_user / trust_phone / mark_phone_as_trusted (phone может быть None).
+        """
+        self._user_listeners.append(callback)
+
+    def _note_user_change(self, phone: Optional[str], user_id: int):
+        for callback in self._user_listeners:
+            try:
+                callback(phone, user_id)
+            except Exception as e:
+                logger.error(f"❌ Ошибка подписчика изменений пользователей: {e}", exc_info=True)
+
+    def _note_stock_change(self, queries=(), stock_id: int = None, delta: int = None):
+        """
+        Поднимает stock_version и будит подписчиков, если запись касалась stocks/orders.
+        Заодно поднимает promotions_version для записей в promotions.
+        """
+        if any(_PROMOTIONS_WRITE_RE.search(q) for q in queries):
+            self.promotions_version += 1
+        if stock_id is None and not any(_STOCK_WRITE_RE.search(q) for q in queries):
+            return
+        self.stock_version += 1
+        for callback in self._stock_listeners:
+            try:
+                callback(stock_id, delta)
+            except Exception as e:
+                logger.error(f"❌ Ошибка подписчика изменений остатков: {e}", exc_info=True)
+
+    async def checkpoint(self, mode: str = "PASSIVE") -> Optional[Tuple[int, int, int]]:
+        """
+        Выполняет PRAGMA wal_checkpoint(mode) на писателе.
+        :return: (busy, frames_in_wal, frames_checkpointed) или None при ошибке
+        """
+        if not self.conn:
+            return None
+        mode = mode.upper()
+        async with self._write_lock:
+            started = time.perf_counter()
+            try:
+                async with self.conn.execute(f"PRAGMA wal_checkpoint({mode});") as cursor:
+                    row = await cursor.fetchone()
+            except Exception as e:
+                logger.error(f"Ошибка чекпоинта WAL ({mode}): {e}", exc_info=True)
+                return None
+
+        busy, log_frames, checkpointed = (tuple(row) if row else (0, 0, 0))
+        stats = self._checkpoint_stats
+        stats["passive_runs" if mode == "PASSIVE" else "truncate_runs"] += 1
+        stats["busy"] += 1 if busy else 0
+        stats["last_mode"] = mode
+        stats["last_at"] = datetime.now()
+        stats["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        stats["last_wal_frames"] = log_frames
+        stats["last_checkpointed_frames"] = checkpointed
+        stats["writes_since_checkpoint"] = 0
+        logger.debug(f"🧾 WAL checkpoint {mode}: busy={busy}, log={log_frames}, done={checkpointed}")
+        return busy, log_frames, checkpointed
+
+    def get_checkpoint_stats(self) -> Dict[str, Any]:
+        """Статистика чекпоинтов + текущий размер WAL"""
+        return {**self._checkpoint_stats, "wal_bytes": self._wal_size()}
+
+    # === Статистика запросов ===
+
+    def _normalize(self, query: str) -> str:
+        key = self._normalized_cache.get(query)
+        if key is None:
+            key = normalize_sql(query)
+            if len(self._normalized_cache) < 5000:
+                self._normalized_cache[query] = key
+        return key
+
+    def _record_query(self, query: str, params: tuple, elapsed_ms: float, rows: int):
+        """Учитывает время выполнения запроса; медленные — в журнал с планом"""
+        key = self._normalize(query)
+        stats = self._query_stats.get(key)
+        if stats is None:
+            stats = self._query_stats[key] = {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0,
+                "samples": deque(maxlen=QUERY_STATS_SAMPLES),
+            }
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        stats["rows"] += max(rows, 0)
+        stats["samples"].append(elapsed_ms)
+
+        if elapsed_ms >= self.slow_query_ms and key != "COMMIT":
+            entry = {
+                "sql": key,
+                "ms": round(elapsed_ms, 2),
+                "rows": rows,
+                "at": datetime.now(),
+                "plan": self._query_plans.get(key),
+            }
+            self._slow_queries.append(entry)
+            if entry["plan"] is None:
+                task = asyncio.create_task(self._explain_slow_query(entry, query, params))
+                self._explain_tasks.add(task)
+                task.add_done_callback(self._explain_tasks.discard)
+            else:
+                self._log_slow_query(entry)
+
+    async def _explain_slow_query(self, entry: Dict[str, Any], query: str, params: tuple):
+        """Снимает EXPLAIN QUERY PLAN (один раз на запрос) и пишет его в журнал"""
+        key = entry["sql"]
+        plan = self._query_plans.get(key)
+        if plan is None:
+            reader = await self._acquire_reader()
+            try:
+                async with reader.execute(f"EXPLAIN QUERY PLAN {query}", params) as cursor:
+                    plan = "\n".join(row[3] for row in await cursor.fetchall())
+            except Exception as e:
+                plan = f"<EXPLAIN недоступен: {e}>"
+            finally:
+                self._release_reader(reader)
+            self._query_plans[key] = plan
+        entry["plan"] = plan
+        self._log_slow_query(entry)
+
+    @staticmethod
+    def _log_slow_query(entry: Dict[str, Any]):
+        slow_query_logger.warning(
+            f"🐢 Медленный запрос {entry['ms']} мс, строк: {entry['rows']}\n"
+            f"{entry['sql']}\nПЛАН:\n{entry['plan']}"
+        )
+
+    @staticmethod
+    def _percentile(sorted_samples: List[float], q: float) -> float:
+        if not sorted_samples:
+            return 0.0
+        return sorted_samples[int(round(q * (len(sorted_samples) - 1)))]
+
+    def get_query_stats(self, limit: int = 10, order_by: str = "total_ms") -> List[Dict[str, Any]]:
+        """
+        Топ запросов по суммарному времени (или p95/max/count).
+        Перцентили считаются по последним QUERY_STATS_SAMPLES замерам.
+        """
+        result = []
+        for key, stats in self._query_stats.items():
+            samples = sorted(stats["samples"])
+            result.append({
+                "sql": key,
+                "count": stats["count"],
+                "total_ms": round(stats["total_ms"], 2),
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                "p50_ms": round(self._percentile(samples, 0.5), 2),
+                "p95_ms": round(self._percentile(samples, 0.95), 2),
+                "max_ms": round(stats["max_ms"], 2),
+                "rows": stats["rows"],
+            })
+        result.sort(key=lambda item: item.get(order_by, 0), reverse=True)
+        return result[:limit]
+
+    def get_slow_queries(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Последние медленные запросы (новые первыми)"""
+        return list(self._slow_queries)[-limit:][::-1]
+
+    def reset_query_stats(self):
+        self._query_stats.clear()
+        self._slow_queries.clear()
+
+    # === Версионные миграции ===
+    # Порядок важен: новые шаги добавляются только в конец с новым номером.
+    # Шаги 1–3 идемпотентны — они же приводят к текущей схеме базы,
+    # созданные до появления schema_version.
+    MIGRATIONS: List[Tuple[int, str, str]] = [
+        (1, "Базовые таблицы", "_create_tables"),
+        (2, "Совместимость колонок старых версий", "_run_migrations"),
+        (3, "Базовые индексы", "_create_indexes"),
+        (4, "Составные и частичные индексы горячих запросов", "_create_hot_indexes"),
+        (5, "Журнал движения остатков и триггеры", "_create_stock_ledger"),
+        (6, "Реестр file_id локальных картинок", "_create_telegram_files"),
+        (7, "Рассылки и статусы получателей", "_create_broadcasts"),
+    ]
+
+    async def _get_schema_version(self) -> int:
+        """Текущая версия схемы (0 — таблицы schema_version ещё нет)"""
+        try:
+            async with self.conn.execute("SELECT MAX(version) FROM schema_version") as cursor:
+                row = await cursor.fetchone()
+            return row[0] or 0
+        except aiosqlite.OperationalError:
+            await self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TEXT DEFAULT (datetime('now')),
+                    duration_ms REAL
+                )
+            ''')
+            await self.conn.commit()
+            return 0
+
+    async def _apply_migrations(self):
+        """
+        Применяет только те шаги MIGRATIONS, что новее записанной версии.
+        На тёплом старте это один SELECT MAX(version).
+        Упавший шаг не записывается и пробрасывается — connect()/init_db() прерывают запуск:
+        без таблиц или триггеров остатков (шаг 5) бот работать не должен.
+        """
+        started_total = time.perf_counter()
+        current = await self._get_schema_version()
+        latest = self.MIGRATIONS[-1][0]
+        if current >= latest:
+            logger.info(f"🗂 Схема БД актуальна (версия {current}) — миграции не требуются")
+            return
+
+        for version, name, method_name in self.MIGRATIONS:
+            if version <= current:
+                continue
+            started = time.perf_counter()
+            try:
+                await getattr(self, method_name)()
+            except Exception as e:
+                # Шаг не записывается в schema_version — повторим при следующем запуске
+                logger.error(f"❌ Миграция {version} «{name}» не применена: {e}", exc_info=True)
+                raise
+            duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            await self.conn.execute(
+                "INSERT INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)",
+                (version, name, duration_ms)
+            )
+            await self.conn.commit()
+            logger.info(f"✅ Миграция {version} «{name}» применена за {duration_ms} мс")
+
+        total_ms = round((time.perf_counter() - started_total) * 1000, 2)
+        logger.info(f"🗂 Схема БД обновлена: {current} → {latest} за {total_ms} мс")
+
     async def _create_tables(self):
         """Создаёт таблицы при первом запуске"""
         if not self.conn:
@@ -186,7 +587,6 @@ class DB:
 
             await self.conn.commit()
             logger.info("Все таблицы созданы или уже существуют")
-            await self._run_migrations()
 
         except Exception as e:
             logger.error(f"Ошибка создания таблиц: {e}", exc_info=True)
@@ -308,49 +708,454 @@ class DB:
         except Exception as e:
             logger.error(f"Ошибка создания индексов: {e}", exc_info=True)
             await self.conn.rollback()
+            raise
 
-    async def execute_read(self, query: str, params: tuple = ()) -> List[aiosqlite.Row]:
-        """Выполняет SELECT-запрос"""
+    async def _create_hot_indexes(self):
+        """
+        Индексы под горячие пути (проверяются scripts/check_query_plans.py).
+        Одноколоночные idx_orders_status / idx_stocks_status и т.п. заменяются составными
+        с тем же первым столбцом: без статистики планировщик выбирал их и сортировал во временном B-дереве.
+        Условие частичного индекса должно дословно совпадать с условием в запросе.
+        """
         try:
-            async with self.conn.execute(query, params) as cursor:
-                return await cursor.fetchall()
+            await self.conn.executescript('''
+                DROP INDEX IF EXISTS idx_orders_user_id;
+                DROP INDEX IF EXISTS idx_orders_stock_id;
+                DROP INDEX IF EXISTS idx_orders_status;
+                DROP INDEX IF EXISTS idx_stocks_status;
+                DROP INDEX IF EXISTS idx_stocks_breed_date;
+
+                -- Мои заказы: WHERE user_id = ? AND status IN ('pending', 'active') ORDER BY created_at
+                CREATE INDEX IF NOT EXISTS idx_orders_open_user
+                    ON orders(user_id, created_at) WHERE status IN ('pending', 'active');
+                CREATE INDEX IF NOT EXISTS idx_orders_user_status
+                    ON orders(user_id, status, created_at);
+                -- Заказы по статусу и дате поставки: напоминания, выдача, отчёты
+                CREATE INDEX IF NOT EXISTS idx_orders_status_date
+                    ON orders(status, date);
+                -- Сверка остатков: SUM(quantity) по партии без чтения строк заказов
+                CREATE INDEX IF NOT EXISTS idx_orders_stock_status
+                    ON orders(stock_id, status, quantity);
+                -- Дневная статистика по диапазону created_at
+                CREATE INDEX IF NOT EXISTS idx_orders_created_at
+                    ON orders(created_at);
+
+                -- Каталог: только продаваемые партии, все нужные колонки в индексе
+                CREATE INDEX IF NOT EXISTS idx_stocks_available
+                    ON stocks(breed, incubator, date, available_quantity, price)
+                    WHERE status = 'active' AND available_quantity > 0;
+                CREATE INDEX IF NOT EXISTS idx_stocks_status_date
+                    ON stocks(status, date);
+                CREATE INDEX IF NOT EXISTS idx_stocks_breed_incubator_date
+                    ON stocks(breed, incubator, date);
+                CREATE INDEX IF NOT EXISTS idx_stocks_date
+                    ON stocks(date);
+            ''')
+            await self.conn.commit()
+            logger.info("✅ Индексы горячих запросов созданы")
         except Exception as e:
-            logger.error(f"Ошибка SELECT: {query} | {params} | {e}", exc_info=True)
-            return []
+            logger.error(f"Ошибка создания индексов горячих запросов: {e}", exc_info=True)
+            await self.conn.rollback()
+            raise
 
-    async def execute_write(self, query: str, params: tuple = ()) -> bool:
-        """Выполняет запись (INSERT/UPDATE/DELETE)"""
+    async def _create_stock_ledger(self):
+        """
+        stock_movements — журнал изменений available_quantity, триггеры ведут его сами:
+        • заказ создан / сменил статус, количество или партию — резерв снимается и ставится заново
+        • у партии изменено quantity — разница уходит в available_quantity
+        Ручные UPDATE stocks SET available_quantity в коде больше не нужны.
+        После создания — разовая сверка активных партий (reason = 'reconcile').
+        """
         try:
-            async with self.conn.cursor() as cursor:
-                await cursor.execute(query, params)
+            await self.conn.executescript(f'''
+                CREATE TABLE IF NOT EXISTS stock_movements (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stock_id INTEGER NOT NULL,
+                    order_id INTEGER,
+                    delta INTEGER NOT NULL,
+                    reason TEXT NOT NULL,
+                    created_at TEXT DEFAULT (datetime('now'))
+                );
+                CREATE INDEX IF NOT EXISTS idx_stock_movements_stock ON stock_movements(stock_id, id);
+
+                -- Докуда дошла инкрементальная сверка (одна строка)
+                CREATE TABLE IF NOT EXISTS stock_ledger_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    last_verified_movement INTEGER NOT NULL DEFAULT 0,
+                    verified_at TEXT
+                );
+                INSERT OR IGNORE INTO stock_ledger_state (id, last_verified_movement) VALUES (1, 0);
+
+                CREATE TRIGGER IF NOT EXISTS trg_orders_insert_hold
+                AFTER INSERT ON orders
+                WHEN NEW.status IN {_HOLD_SQL} AND NEW.stock_id IS NOT NULL
+                BEGIN
+                    UPDATE stocks SET available_quantity = available_quantity - NEW.quantity WHERE id = NEW.stock_id;
+                    INSERT INTO stock_movements (stock_id, order_id, delta, reason)
+                    VALUES (NEW.stock_id, NEW.id, -NEW.quantity, 'order_created');
+                END;
+
+                -- Сначала возврат старого резерва, потом новый — CHECK (available_quantity >= 0) не сработает зря
+                CREATE TRIGGER IF NOT EXISTS trg_orders_update_hold
+                AFTER UPDATE OF status, quantity, stock_id ON orders
+                WHEN (OLD.status IN {_HOLD_SQL}) != (NEW.status IN {_HOLD_SQL})
+                  OR (NEW.status IN {_HOLD_SQL}
+                      AND (NEW.quantity != OLD.quantity OR NEW.stock_id IS NOT OLD.stock_id))
+                BEGIN
+                    UPDATE stocks SET available_quantity = available_quantity + OLD.quantity
+                    WHERE id = OLD.stock_id AND OLD.status IN {_HOLD_SQL};
+                    INSERT INTO stock_movements (stock_id, order_id, delta, reason)
+                    SELECT OLD.stock_id, OLD.id, OLD.quantity,
+                           CASE WHEN NEW.status IN {_HOLD_SQL} THEN 'order_changed' ELSE 'order_' || NEW.status END
+                    WHERE OLD.status IN {_HOLD_SQL} AND OLD.stock_id IS NOT NULL;
+
+                    UPDATE stocks SET available_quantity = available_quantity - NEW.quantity
+                    WHERE id = NEW.stock_id AND NEW.status IN {_HOLD_SQL};
+                    INSERT INTO stock_movements (stock_id, order_id, delta, reason)
+                    SELECT NEW.stock_id, NEW.id, -NEW.quantity,
+                           CASE WHEN OLD.status IN {_HOLD_SQL} THEN 'order_changed' ELSE 'order_reopened' END
+                    WHERE NEW.status IN {_HOLD_SQL} AND NEW.stock_id IS NOT NULL;
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_stocks_insert
+                AFTER INSERT ON stocks
+                BEGIN
+                    INSERT INTO stock_movements (stock_id, delta, reason)
+                    VALUES (NEW.id, NEW.available_quantity, 'stock_created');
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_stocks_quantity
+                AFTER UPDATE OF quantity ON stocks
+                WHEN NEW.quantity != OLD.quantity
+                BEGIN
+                    UPDATE stocks SET available_quantity = available_quantity + (NEW.quantity - OLD.quantity)
+                    WHERE id = NEW.id;
+                    INSERT INTO stock_movements (stock_id, delta, reason)
+                    VALUES (NEW.id, NEW.quantity - OLD.quantity, 'stock_quantity');
+                END;
+            ''')
+
+            # Разовая сверка: до триггеров остатки правились вручную
+            expected = (
+                f"MAX(0, quantity - (SELECT COALESCE(SUM(o.quantity), 0) FROM orders o "
+                f"WHERE o.stock_id = stocks.id AND o.status IN {_HOLD_SQL}))"
+            )
+            await self.conn.execute(f"""
+                INSERT INTO stock_movements (stock_id, delta, reason)
+                SELECT id, {expected} - available_quantity, 'reconcile'
+                FROM stocks WHERE status = 'active' AND {expected} != available_quantity
+            """)
+            await self.conn.execute(f"""
+                UPDATE stocks SET available_quantity = {expected}
+                WHERE status = 'active' AND {expected} != available_quantity
+            """)
             await self.conn.commit()
-             # 🔥 Гарантируем, что изменения записаны в .db
-            await self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+            logger.info("✅ Журнал движения остатков и триггеры созданы")
+        except Exception as e:
+            logger.error(f"Ошибка создания журнала остатков: {e}", exc_info=True)
+            await self.conn.rollback()
+            raise
 
-            if query.strip().upper().startswith(("UPDATE", "DELETE")):
-                return cursor.rowcount > 0
-            return True
+    async def _create_telegram_files(self):
+        """
+        telegram_files: локальная картинка (путь + sha256 содержимого) → file_id в Telegram.
+        Файл загружается один раз; изменённый файл получает новый хэш и загружается заново.
+        """
+        try:
+            await self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS telegram_files (
+                    path TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    file_unique_id TEXT,
+                    uploaded_at TEXT DEFAULT (datetime('now')),
+                    PRIMARY KEY (path, content_hash)
+                );
+            ''')
+            await self.conn.commit()
+            logger.info("✅ Таблица telegram_files создана")
         except Exception as e:
-            logger.error(f"Ошибка записи: {query} | {params} | {e}", exc_info=True)
+            logger.error(f"Ошибка создания telegram_files: {e}", exc_info=True)
             await self.conn.rollback()
-            return False
+            raise
 
-    async def execute_transaction(self, queries: List[Tuple[str, tuple]]) -> bool:
-        """Выполняет транзакцию"""
+    async def _create_broadcasts(self):
+        """
+        broadcasts: рассылка (содержимое, статус, сообщение с прогрессом у админа).
+        broadcast_recipients: статус каждого получателя — после перезапуска досылаем только pending.
+        """
         try:
-            await self.conn.execute("BEGIN IMMEDIATE")
-            for query, params in queries:
-                await self.conn.execute(query, params)
+            await self.conn.executescript('''
+                CREATE TABLE IF NOT EXISTS broadcasts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_by INTEGER NOT NULL,
+                    kind TEXT NOT NULL CHECK(kind IN ('text', 'photo')),
+                    text TEXT,
+                    photo_id TEXT,
+                    caption TEXT,
+                    recipients_label TEXT,
+                    status TEXT NOT NULL DEFAULT 'running' CHECK(status IN ('running', 'done', 'cancelled')),
+                    total INTEGER NOT NULL DEFAULT 0,
+                    send_seconds REAL NOT NULL DEFAULT 0,
+                    progress_chat_id INTEGER,
+                    progress_message_id INTEGER,
+                    created_at TEXT DEFAULT (datetime('now')),
+                    finished_at TEXT
+                );
+                CREATE TABLE IF NOT EXISTS broadcast_recipients (
+                    broadcast_id INTEGER NOT NULL REFERENCES broadcasts(id) ON DELETE CASCADE,
+                    user_id INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'sent', 'blocked', 'failed')),
+                    error TEXT,
+                    PRIMARY KEY (broadcast_id, user_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status
+                    ON broadcast_recipients(broadcast_id, status);
+                CREATE INDEX IF NOT EXISTS idx_broadcasts_running
+                    ON broadcasts(status) WHERE status = 'running';
+            ''')
             await self.conn.commit()
-            return True
+            logger.info("✅ Таблицы broadcasts и broadcast_recipients созданы")
         except Exception as e:
-            logger.error(f"Ошибка транзакции: {e}", exc_info=True)
+            logger.error(f"Ошибка создания таблиц рассылок: {e}", exc_info=True)
             await self.conn.rollback()
-            return False
+            raise
+
+    async def execute_read(self, query: str, params: tuple = (), raise_errors: bool = False) -> List[aiosqlite.Row]:
+        """
+        Выполняет SELECT-запрос на соединении из пула читателей.
+        Ошибка → [] (пишется в лог). raise_errors=True — ошибка пробрасывается:
+        для кэшей, которые не должны запомнить сбой как пустой результат.
+        """
+        reader = await self._acquire_reader()
+        try:
+            started = time.perf_counter()
+            async with reader.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+            self._record_query(query, params, (time.perf_counter() - started) * 1000, len(rows))
+            return rows
+        except Exception as e:
+            logger.error(f"Ошибка SELECT: {query} | {params} | {e}", exc_info=True)
+            if raise_errors:
+                raise
+            return []
+        finally:
+            self._release_reader(reader)
+
+    async def execute_stream(
+        self,
+        query: str,
+        params: tuple = (),
+        batch_size: int = 500,
+        batched: bool = False
+    ) -> AsyncIterator[Union[aiosqlite.Row, List[aiosqlite.Row]]]:
+        """
+        Потоковый SELECT: читает результат порциями по batch_size через fetchmany.
+        Отдаёт строки по одной (или списки строк при batched=True),
+        поэтому память не растёт вместе с таблицей.
+        Читатель из пула занят, пока итерация не закончится.
+        Без пула (read_pool_size=0) читаем через писателя под _write_lock на всё время итерации —
+        запись не вклинится в открытый курсор; писать внутри такого цикла нельзя.
+        """
+        writer_lock = self._write_lock if not self._readers else None
+        if writer_lock:
+            await writer_lock.acquire()
+        reader = await self._acquire_reader()
+        elapsed = 0.0
+        total_rows = 0
+        try:
+            started = time.perf_counter()
+            async with reader.execute(query, params) as cursor:
+                elapsed += time.perf_counter() - started
+                while True:
+                    started = time.perf_counter()
+                    rows = await cursor.fetchmany(batch_size)
+                    elapsed += time.perf_counter() - started
+                    if not rows:
+                        break
+                    total_rows += len(rows)
+                    if batched:
+                        yield rows
+                    else:
+                        for row in rows:
+                            yield row
+        except Exception as e:
+            logger.error(f"Ошибка потокового SELECT: {query} | {params} | {e}", exc_info=True)
+        finally:
+            # Учитывается только время SQLite, без времени обработки строк вызывающим
+            self._record_query(query, params, elapsed * 1000, total_rows)
+            self._release_reader(reader)
+            if writer_lock:
+                writer_lock.release()
+
+    @staticmethod
+    def _write_result(query: str, rowcount: int) -> bool:
+        """UPDATE/DELETE успешны, только если затронули строки"""
+        if query.strip().upper().startswith(("UPDATE", "DELETE")):
+            return rowcount > 0
+        return True
+
+    async def execute_write(self, query: str, params: tuple = ()) -> bool:
+        """
+        Выполняет запись (INSERT/UPDATE/DELETE) через писателя.
+        При включённом group commit запрос встаёт в очередь и коммитится
+        вместе с соседними; результат для вызывающего — тот же.
+        """
+        if self._write_queue is not None:
+            future = asyncio.get_running_loop().create_future()
+            self._write_queue.put_nowait((query, params, future))
+            return await future
+
+        async with self._write_lock:
+            try:
+                started = time.perf_counter()
+                async with self.conn.cursor() as cursor:
+                    await cursor.execute(query, params)
+                self._record_query(query, params, (time.perf_counter() - started) * 1000, cursor.rowcount)
+                await self._commit()
+                self._note_write()
+                self._note_stock_change((query,))
+                return self._write_result(query, cursor.rowcount)
+            except Exception as e:
+                logger.error(f"Ошибка записи: {query} | {params} | {e}", exc_info=True)
+                await self.conn.rollback()
+                return False
+
+    # === Group commit ===
+
+    def _start_write_queue(self):
+        """Включает очередь записей с групповым коммитом"""
+        if self._write_queue_task and not self._write_queue_task.done():
+            return
+        self._write_queue = asyncio.Queue()
+        self._write_queue_task = asyncio.create_task(self._write_queue_loop())
+        logger.info(f"📝 Group commit включён: окно {DB_GROUP_COMMIT_WINDOW_MS} мс, до {DB_GROUP_COMMIT_MAX_BATCH} записей")
+
+    async def _write_queue_loop(self):
+        """Собирает записи за окно DB_GROUP_COMMIT_WINDOW_MS и коммитит их одной транзакцией"""
+        queue = self._write_queue
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            batch = [item]
+            await asyncio.sleep(DB_GROUP_COMMIT_WINDOW_MS / 1000)
+            stop = False
+            while len(batch) < DB_GROUP_COMMIT_MAX_BATCH and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            await self._commit_write_batch(batch)
+            if stop:
+                return
+
+    async def _commit_write_batch(self, batch: List[Tuple[str, tuple, asyncio.Future]]):
+        """
+        Выполняет пачку записей в одной транзакции.
+        Каждая запись — под своим SAVEPOINT: ошибка одной откатывает только её.
+        """
+        results: List[Any] = []
+        async with self._write_lock:
+            try:
+                await self.conn.execute("BEGIN IMMEDIATE")
+                for query, params, _ in batch:
+                    await self.conn.execute("SAVEPOINT group_write")
+                    try:
+                        started = time.perf_counter()
+                        async with self.conn.execute(query, params) as cursor:
+                            results.append(self._write_result(query, cursor.rowcount))
+                        self._record_query(query, params, (time.perf_counter() - started) * 1000, cursor.rowcount)
+                        await self.conn.execute("RELEASE group_write")
+                    except Exception as e:
+                        logger.error(f"Ошибка записи: {query} | {params} | {e}", exc_info=True)
+                        await self.conn.execute("ROLLBACK TO group_write")
+                        await self.conn.execute("RELEASE group_write")
+                        results.append(False)
+                await self._commit()
+                self._note_write()
+                self._note_stock_change([query for (query, _, _), ok in zip(batch, results) if ok])
+            except Exception as e:
+                logger.error(f"Ошибка группового коммита ({len(batch)} записей): {e}", exc_info=True)
+                await self.conn.rollback()
+                results = [False] * len(batch)
+
+        stats = self._group_commit_stats
+        stats["batches"] += 1
+        stats["writes"] += len(batch)
+        stats["max_batch"] = max(stats["max_batch"], len(batch))
+
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _stop_write_queue(self):
+        """Дописывает всё, что осталось в очереди, и останавливает её"""
+        if not self._write_queue_task:
+            return
+        self._write_queue.put_nowait(None)
+        try:
+            await self._write_queue_task
+        except Exception as e:
+            logger.error(f"Ошибка остановки очереди записей: {e}", exc_info=True)
+        self._write_queue = None
+        self._write_queue_task = None
+
+    def get_group_commit_stats(self) -> Dict[str, Any]:
+        """Статистика group commit: число пачек, записей и средний размер пачки"""
+        stats = dict(self._group_commit_stats)
+        stats["enabled"] = self._write_queue is not None
+        stats["avg_batch"] = round(stats["writes"] / stats["batches"], 2) if stats["batches"] else 0
+        return stats
+
+    async def _commit(self):
+        """COMMIT писателя; время коммита учитывается отдельным ключом"""
+        started = time.perf_counter()
+        await self.conn.commit()
+        self._record_query("COMMIT", (), (time.perf_counter() - started) * 1000, 0)
+
+    async def execute_transaction(self, queries: List[Tuple[str, tuple]]) -> bool:
+        """Выполняет транзакцию через писателя"""
+        async with self._write_lock:
+            try:
+                await self.conn.execute("BEGIN IMMEDIATE")
+                for query, params in queries:
+                    started = time.perf_counter()
+                    cursor = await self.conn.execute(query, params)
+                    self._record_query(query, params, (time.perf_counter() - started) * 1000, cursor.rowcount)
+                await self._commit()
+                self._note_write()
+                self._note_stock_change([query for query, _ in queries])
+                return True
+            except Exception as e:
+                logger.error(f"Ошибка транзакции: {e}", exc_info=True)
+                await self.conn.rollback()
+                return False
 
     async def close(self):
-        """Закрывает соединение"""
+        """Останавливает чекпоинтер, закрывает читателей, делает TRUNCATE и закрывает писателя"""
+        await self._stop_write_queue()
+
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            try:
+                await self._checkpoint_task
+            except asyncio.CancelledError:
+                pass
+            self._checkpoint_task = None
+
+        for reader in self._readers:
+            try:
+                await reader.close()
+            except Exception as e:
+                logger.error(f"Ошибка закрытия читающего соединения: {e}", exc_info=True)
+        self._readers = []
+        self._read_pool = None
+
         if self.conn:
+            # 🔥 Переносим весь WAL в .db и обрезаем его перед остановкой
+            await self.checkpoint("TRUNCATE")
             try:
                 await self.conn.close()
                 logger.info("Соединение с БД закрыто")
@@ -395,14 +1200,53 @@ class DB:
         )
 
     # === УПРАВЛЕНИЕ НОМЕРАМИ ===
+    async def get_phone_verdict(self, phone: str) -> Dict[str, Any]:
+        """
+        Всё о номере одним запросом: {"trusted", "blocked", "blocked_until", "attempts"}.
+        attempts — только за последние 24 часа (старый счётчик считается нулём, без записи).
+        Кэшируется на PHONE_VERDICT_TTL секунд; block_phone / add_attempt / trust_phone и т.д. сбрасывают запись.
+        """
+        cached = self._phone_verdicts.get(phone)
+        if cached and cached[1] > time.monotonic():
+            verdict = cached[0]
+        else:
+            rows = await self.execute_read("""
+                SELECT t.phone IS NOT NULL AS trusted,
+                       b.phone IS NOT NULL AS has_block,
+                       b.blocked_until,
+                       CASE WHEN a.last_attempt >= datetime('now', '-1 day') THEN a.attempts ELSE 0 END AS attempts
+                FROM (SELECT ? AS phone) p
+                LEFT JOIN trusted_phones t ON t.phone = p.phone
+                LEFT JOIN blocked_phones b ON b.phone = p.phone
+                LEFT JOIN phone_attempts a ON a.phone = p.phone
+            """, (phone,))
+            if not rows:
+                # Ошибка чтения (запрос всегда даёт строку): как раньше — не заблокирован и не доверен,
+                # номер пойдёт обычной проверкой. В кэш не кладём — следующий вызов перечитает
+                logger.warning(f"⚠️ Не удалось прочитать статус номера {phone} — проверка без блокировки")
+                return {"trusted": False, "has_block": False, "blocked_until": None, "attempts": 0, "blocked": False}
+            row = rows[0]
+            verdict = {
+                "trusted": bool(row["trusted"]),
+                "has_block": bool(row["has_block"]),
+                "blocked_until": row["blocked_until"],
+                "attempts": row["attempts"] or 0,
+            }
+            if len(self._phone_verdicts) >= PHONE_VERDICT_CACHE_SIZE:
+                self._phone_verdicts.clear()
+            self._phone_verdicts[phone] = (verdict, time.monotonic() + PHONE_VERDICT_TTL)
+
+        # Истечение блокировки проверяем в момент вопроса, а не загрузки
+        blocked = verdict["has_block"] and (
+            verdict["blocked_until"] is None or self._parse_datetime(verdict["blocked_until"]) > datetime.now()
+        )
+        return {**verdict, "blocked": blocked}
+
+    def _forget_phone_verdict(self, phone: str):
+        self._phone_verdicts.pop(phone, None)
+
     async def is_phone_blocked(self, phone: str) -> bool:
-        r = await self.execute_read("SELECT blocked_until FROM blocked_phones WHERE phone = ?", (phone,))
-        if not r:
-            return False
-        until = r[0]['blocked_until']
-        if until is None:
-            return True
-        return self._parse_datetime(until) > datetime.now()
+        return (await self.get_phone_verdict(phone))["blocked"]
 
     async def block_phone(self, phone: str, reason: str, duration_hours: int = 24):
         until = None
@@ -412,33 +1256,28 @@ class DB:
             "INSERT OR REPLACE INTO blocked_phones (phone, reason, blocked_until) VALUES (?, ?, ?)",
             (phone, reason, until)
         )
+        self._forget_phone_verdict(phone)
 
     async def get_daily_attempts(self, phone: str) -> int:
-        r = await self.execute_read("SELECT attempts, last_attempt FROM phone_attempts WHERE phone = ?", (phone,))
-        if not r:
-            return 0
-        attempts = r[0]['attempts']
-        last = self._parse_datetime(r[0]['last_attempt'])
-        if datetime.now() - last > timedelta(hours=24):
-            await self.reset_attempt(phone)
-            return 0
-        return attempts
+        return (await self.get_phone_verdict(phone))["attempts"]
 
     async def add_attempt(self, phone: str):
+        # Счётчик старше суток начинается заново — отдельный reset_attempt не нужен
         await self.execute_write("""
             INSERT INTO phone_attempts (phone, attempts, last_attempt)
             VALUES (?, 1, datetime('now'))
             ON CONFLICT(phone) DO UPDATE SET
-                attempts = attempts + 1,
+                attempts = CASE WHEN last_attempt >= datetime('now', '-1 day') THEN attempts + 1 ELSE 1 END,
                 last_attempt = datetime('now')
         """, (phone,))
+        self._forget_phone_verdict(phone)
 
     async def reset_attempt(self, phone: str):
         await self.execute_write("DELETE FROM phone_attempts WHERE phone = ?", (phone,))
+        self._forget_phone_verdict(phone)
 
     async def is_trusted_phone(self, phone: str) -> bool:
-        r = await self.execute_read("SELECT 1 FROM trusted_phones WHERE phone = ?", (phone,))
-        return bool(r)
+        return (await self.get_phone_verdict(phone))["trusted"]
 
     async def trust_phone(self, phone: str, user_id: int):
         """
@@ -450,6 +1289,8 @@ class DB:
             INSERT OR REPLACE INTO trusted_phones (phone, user_id, marked_by, marked_at, source)
             VALUES (?, ?, NULL, ?, 'auto')
         """, (phone, user_id, now))
+        self._forget_phone_verdict(phone)
+        self._note_user_change(phone, user_id)
 
     async def get_trusted_phone_for_user(self, user_id: int) -> Optional[str]:
         """
@@ -470,9 +1311,130 @@ class DB:
             INSERT OR REPLACE INTO trusted_phones (phone, user_id, marked_by, marked_at, source)
             VALUES (?, ?, ?, ?, 'admin')
         """, (phone, user_id, admin_id, now))
+        self._forget_phone_verdict(phone)
+        self._note_user_change(phone, user_id)
 
     async def unmark_trusted_phone(self, phone: str):
         await self.execute_write("DELETE FROM trusted_phones WHERE phone = ?", (phone,))
+        self._forget_phone_verdict(phone)
+
+    # === FILE_ID ЛОКАЛЬНЫХ КАРТИНОК ===
+    async def get_telegram_file_ids(self) -> Dict[Tuple[str, str], str]:
+        """Весь реестр: {(path, content_hash): file_id} — он маленький, читается один раз"""
+        rows = await self.execute_read("SELECT path, content_hash, file_id FROM telegram_files")
+        return {(row["path"], row["content_hash"]): row["file_id"] for row in rows}
+
+    async def save_telegram_file_id(self, path: str, content_hash: str, file_id: str, file_unique_id: str = None) -> bool:
+        return await self.execute_write(
+            "INSERT OR REPLACE INTO telegram_files (path, content_hash, file_id, file_unique_id, uploaded_at) "
+            "VALUES (?, ?, ?, ?, datetime('now'))",
+            (path, content_hash, file_id, file_unique_id)
+        )
+
+    async def forget_telegram_file_id(self, path: str, content_hash: str) -> bool:
+        return await self.execute_write(
+            "DELETE FROM telegram_files WHERE path = ? AND content_hash = ?", (path, content_hash)
+        )
+
+    # === РАССЫЛКИ ===
+    async def create_broadcast(
+        self,
+        created_by: int,
+        kind: str,
+        recipients_query: str,
+        recipients_params: tuple = (),
+        text: str = None,
+        photo_id: str = None,
+        caption: str = None,
+        recipients_label: str = None
+    ) -> Optional[int]:
+        """
+        Создаёт рассылку и список получателей одной транзакцией.
+        recipients_query — SELECT с колонкой user_id; получатели копируются SQL-ом, без списка в памяти.
+        :return: ID рассылки или None
+        """
+        insert_recipients = (
+            "INSERT OR IGNORE INTO broadcast_recipients (broadcast_id, user_id) "
+            f"SELECT ?, user_id FROM ({recipients_query}) WHERE user_id IS NOT NULL"
+        )
+        async with self._write_lock:
+            try:
+                await self.conn.execute("BEGIN IMMEDIATE")
+                async with self.conn.execute(
+                    "INSERT INTO broadcasts (created_by, kind, text, photo_id, caption, recipients_label) "
+                    "VALUES (?, ?, ?, ?, ?, ?) RETURNING id",
+                    (created_by, kind, text, photo_id, caption, recipients_label)
+                ) as cursor:
+                    broadcast_id = (await cursor.fetchone())[0]
+
+                started = time.perf_counter()
+                params = (broadcast_id, *recipients_params)
+                cursor = await self.conn.execute(insert_recipients, params)
+                total = cursor.rowcount
+                self._record_query(insert_recipients, params, (time.perf_counter() - started) * 1000, total)
+
+                await self.conn.execute("UPDATE broadcasts SET total = ? WHERE id = ?", (total, broadcast_id))
+                await self._commit()
+                self._note_write()
+                return broadcast_id
+            except Exception as e:
+                logger.error(f"Ошибка создания рассылки: {e}", exc_info=True)
+                await self.conn.rollback()
+                return None
+
+    async def get_broadcast(self, broadcast_id: int) -> Optional[aiosqlite.Row]:
+        r = await self.execute_read("SELECT * FROM broadcasts WHERE id = ?", (broadcast_id,))
+        return r[0] if r else None
+
+    async def get_running_broadcast_ids(self) -> List[int]:
+        rows = await self.execute_read("SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id")
+        return [row[0] for row in rows]
+
+    async def get_pending_broadcast_recipients(self, broadcast_id: int, limit: int) -> List[int]:
+        rows = await self.execute_read(
+            "SELECT user_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = 'pending' LIMIT ?",
+            (broadcast_id, limit)
+        )
+        return [row[0] for row in rows]
+
+    async def get_broadcast_counts(self, broadcast_id: int) -> Dict[str, int]:
+        """{'pending': n, 'sent': n, 'blocked': n, 'failed': n}"""
+        rows = await self.execute_read(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status",
+            (broadcast_id,)
+        )
+        counts = {"pending": 0, "sent": 0, "blocked": 0, "failed": 0}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    async def mark_broadcast_recipients(
+        self, broadcast_id: int, results: List[Tuple[int, str, Optional[str]]], send_seconds: float = 0.0
+    ) -> bool:
+        """Статусы пачки получателей [(user_id, status, error)] и время отправки — одной транзакцией"""
+        queries = [
+            (
+                "UPDATE broadcast_recipients SET status = ?, error = ? WHERE broadcast_id = ? AND user_id = ?",
+                (status, error, broadcast_id, user_id)
+            )
+            for user_id, status, error in results
+        ]
+        queries.append((
+            "UPDATE broadcasts SET send_seconds = send_seconds + ? WHERE id = ?",
+            (send_seconds, broadcast_id)
+        ))
+        return await self.execute_transaction(queries)
+
+    async def set_broadcast_progress_message(self, broadcast_id: int, chat_id: int, message_id: int) -> bool:
+        return await self.execute_write(
+            "UPDATE broadcasts SET progress_chat_id = ?, progress_message_id = ? WHERE id = ?",
+            (chat_id, message_id, broadcast_id)
+        )
+
+    async def finish_broadcast(self, broadcast_id: int, status: str = 'done') -> bool:
+        return await self.execute_write(
+            "UPDATE broadcasts SET status = ?, finished_at = datetime('now') WHERE id = ?",
+            (status, broadcast_id)
+        )
 
     # === УПРАВЛЕНИЕ ПАРТИЯМИ ===
     async def get_stock_id(self, breed: str, incubator: str, date: str) -> Optional[int]:
@@ -495,6 +1457,61 @@ class DB:
         query += " ORDER BY date ASC"
         return await self.execute_read(query, params)
 
+    async def verify_stock_consistency(self, full: bool = False, fix: bool = True) -> Dict[str, Any]:
+        """
+        Сверяет available_quantity с заказами (quantity − Σ заказов в STOCK_HOLD_STATUSES).
+        По умолчанию — только партии, у которых есть записи в stock_movements после прошлой сверки.
+        :param full: проверить все активные партии
+        :param fix: исправить расхождения (с записью 'reconcile' в журнал)
+        :return: {"mode", "checked", "mismatches": [{id, breed, incubator, date, quantity, available, expected}]}
+        """
+        state = await self.execute_read("SELECT last_verified_movement FROM stock_ledger_state WHERE id = 1")
+        last_id = state[0][0] if state else 0
+        top = await self.execute_read("SELECT COALESCE(MAX(id), 0) FROM stock_movements")
+        max_id = top[0][0] if top else 0
+
+        where, params = "s.status = 'active'", ()
+        if not full:
+            where += " AND s.id IN (SELECT stock_id FROM stock_movements WHERE id > ? AND id <= ?)"
+            params = (last_id, max_id)
+
+        query = f"""
+            SELECT s.id, s.breed, s.incubator, s.date, s.quantity, s.available_quantity,
+                   COALESCE(SUM(o.quantity), 0) AS total_ordered
+            FROM stocks s
+            LEFT JOIN orders o ON s.id = o.stock_id AND o.status IN {_HOLD_SQL}
+            WHERE {where}
+            GROUP BY s.id
+        """
+        checked, mismatches = 0, []
+        async for row in self.execute_stream(query, params):
+            checked += 1
+            expected = max(0, row["quantity"] - row["total_ordered"])
+            if row["available_quantity"] != expected:
+                mismatches.append({
+                    "id": row["id"], "breed": row["breed"], "incubator": row["incubator"], "date": row["date"],
+                    "quantity": row["quantity"], "available": row["available_quantity"], "expected": expected,
+                })
+
+        result = {"mode": "full" if full else "incremental", "checked": checked, "mismatches": mismatches}
+        if not fix:
+            return result  # без исправлений отметку не двигаем — расхождения проверятся снова
+
+        statements = []
+        for m in mismatches:
+            statements.append(("UPDATE stocks SET available_quantity = ? WHERE id = ?", (m["expected"], m["id"])))
+            statements.append((
+                "INSERT INTO stock_movements (stock_id, delta, reason) VALUES (?, ?, 'reconcile')",
+                (m["id"], m["expected"] - m["available"])
+            ))
+        statements.append((
+            "UPDATE stock_ledger_state SET last_verified_movement = ?, verified_at = datetime('now') WHERE id = 1",
+            (max_id,)
+        ))
+        if not await self.execute_transaction(statements):
+            logger.error("❌ Не удалось сохранить результат сверки остатков")
+        return result
+
     # === УПРАВЛЕНИЕ ПОЛЬЗОВАТЕЛЯМИ ===
     async def upsert_user(self, user_id: int, full_name: str, username: str = None, phone: str = None):
         await self.execute_write('''
@@ -506,8 +1523,84 @@ class DB:
                 phone = COALESCE(EXCLUDED.phone, users.phone),
                 last_active = datetime('now')
         ''', (user_id, full_name, username, phone))
+        self._note_user_change(phone, user_id)
 
     # === ОФОРМЛЕНИЕ ЗАКАЗА ===
+    async def reserve_and_create_order(
+        self,
+        user_id: int,
+        phone: str,
+        quantity: int,
+        price: float,
+        breed: str,
+        date: str,
+        incubator: str,
+        stock_id: int = None,
+        customer_name: str = None,
+        customer_phone: str = None,
+        created_by_admin: bool = False,
+        deactivate_sold_out: bool = True
+    ) -> Optional[int]:
+        """
+        Атомарно резервирует остаток и создаёт заказ в одной короткой транзакции BEGIN IMMEDIATE:
+        INSERT INTO orders ... SELECT ... FROM stocks WHERE ... AND available_quantity >= ? RETURNING id
+        — заказ вставляется, только если в партии хватает остатка; без отдельного SELECT и без last_insert_rowid().
+        Списание available_quantity и запись в stock_movements делает триггер trg_orders_insert_hold.
+        Если stock_id не передан, партия ищется по (breed, incubator, date).
+        :param deactivate_sold_out: перевести партию в 'inactive', если остаток стал 0
+        :return: ID заказа или None, если остатка не хватило / произошла ошибка
+        """
+        if stock_id is not None:
+            stock_filter = "s.id = ?"
+            stock_params = (stock_id,)
+        else:
+            stock_filter = "s.breed = ? AND s.incubator = ? AND s.date = ?"
+            stock_params = (breed, incubator, date)
+
+        insert_query = (
+            "INSERT INTO orders "
+            "(user_id, phone, breed, date, quantity, price, stock_id, incubator, status, "
+            "created_at, updated_at, customer_name, customer_phone, created_by_admin) "
+            "SELECT ?, ?, ?, ?, ?, ?, s.id, ?, 'pending', datetime('now'), datetime('now'), ?, ?, ? "
+            f"FROM stocks s WHERE {stock_filter} AND s.status = 'active' AND s.available_quantity >= ? "
+            "LIMIT 1 "
+            "RETURNING id, stock_id"
+        )
+        insert_params = (
+            user_id, phone, breed, date, quantity, price, incubator,
+            customer_name, customer_phone, int(created_by_admin),
+            *stock_params, quantity
+        )
+
+        async with self._write_lock:
+            try:
+                await self.conn.execute("BEGIN IMMEDIATE")
+
+                started = time.perf_counter()
+                async with self.conn.execute(insert_query, insert_params) as cursor:
+                    order_row = await cursor.fetchone()
+                self._record_query(insert_query, insert_params, (time.perf_counter() - started) * 1000, 1 if order_row else 0)
+                if not order_row:
+                    await self.conn.rollback()
+                    logger.info(f"📦 Недостаточно остатка: {breed} / {incubator} / {date}, запрошено {quantity}")
+                    return None
+
+                if deactivate_sold_out:
+                    await self.conn.execute(
+                        "UPDATE stocks SET status = 'inactive' WHERE id = ? AND available_quantity <= 0",
+                        (order_row[1],)
+                    )
+
+                await self._commit()
+                self._note_write()
+                self._note_stock_change(stock_id=order_row[1], delta=-quantity)
+                return order_row[0]
+
+            except Exception as e:
+                logger.error(f"Ошибка резервирования и создания заказа: {e}", exc_info=True)
+                await self.conn.rollback()
+                return None
+
     async def create_order(
         self,
         user_id: int,
@@ -524,26 +1617,21 @@ class DB:
         customer_phone: str = None,
         created_by_admin: bool = False
     ) -> Optional[int]:
-        stock = await self.get_stock_by_id(stock_id)
-        if not stock or stock['available_quantity'] < quantity:
-            return None
-
-        new_avail = stock['available_quantity'] - quantity
-        queries = [
-            (
-                "INSERT INTO orders (user_id, phone, breed, date, quantity, price, stock_id, incubator, status, "
-                "customer_name, customer_phone, created_by_admin) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?)",
-                (user_id, phone, breed, date, quantity, price, stock_id, incubator,
-                 customer_name or full_name, customer_phone or phone, int(created_by_admin))
-            ),
-            (
-                "UPDATE stocks SET available_quantity = ? WHERE id = ?",
-                (new_avail, stock_id)
-            )
-        ]
-        success = await self.execute_transaction(queries)
-        if not success:
+        order_id = await self.reserve_and_create_order(
+            user_id=user_id,
+            phone=phone,
+            quantity=quantity,
+            price=price,
+            breed=breed,
+            date=date,
+            incubator=incubator,
+            stock_id=stock_id,
+            customer_name=customer_name or full_name,
+            customer_phone=customer_phone or phone,
+            created_by_admin=created_by_admin,
+            deactivate_sold_out=False
+        )
+        if not order_id:
             return None
 
         await self.upsert_user(user_id, full_name, username, phone)
@@ -552,14 +1640,6 @@ class DB:
         if not created_by_admin and phone:
             await self.trust_phone(phone, user_id)
 
-        try:
-            async with self.conn.execute("SELECT last_insert_rowid()") as cursor:
-                row = await cursor.fetchone()
-                order_id = row[0] if row else None
-        except Exception as e:
-            logger.error(f"Ошибка получения ID заказа: {e}")
-            order_id = None
-
         return order_id
 
     # === УПРАВЛЕНИЕ ЗАКАЗАМИ ===
@@ -574,12 +1654,13 @@ class DB:
 
     # === УПРАВЛЕНИЕ АКЦИЯМИ ===
 
-    async def get_active_promotions(self) -> List[aiosqlite.Row]:
+    async def get_active_promotions(self, raise_errors: bool = False) -> List[aiosqlite.Row]:
         """
         Возвращает активные акции, которые:
         - is_active = 1
         - start_date <= now (или NULL)
         - end_date >= now (или NULL)
+        raise_errors — как в execute_read (для кэша акций)
         """
         query = """
             SELECT id, title, description, image_url, start_date, end_date
@@ -590,7 +1671,7 @@ class DB:
             ORDER BY end_date NULLS LAST, updated_at DESC
             LIMIT 10
         """
-        return await self.execute_read(query)
+        return await self.execute_read(query, raise_errors=raise_errors)
 
     async def get_all_promotions(self) -> List[aiosqlite.Row]:
         """
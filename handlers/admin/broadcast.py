@@ -7,6 +7,9 @@
 ✅ Исправлено: все кнопки — из config/buttons
 ✅ Исправлено: «Назад» работает по шагам
 ✅ Исправлено: выход через exit_to_admin_menu — единый стиль
+✅ Отправка — через очередь utils.send_queue с низшим приоритетом (не тормозит ответы пользователям)
+✅ Рассылка сохраняется в БД и идёт в фоне (utils.broadcast_runner) — диалог не держит апдейт,
+   перезапуск бота не теряет прогресс
 """
 
 import logging
@@ -38,6 +41,7 @@ from config.buttons import (
 )
 from utils.admin_helpers import check_admin, exit_to_admin_menu
 from utils.messaging import safe_reply
+from utils.broadcast_runner import start_broadcast
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +56,13 @@ BROADCAST_KEYS = [
     'current_conversation', 'broadcast_flow_history'
 ]
 
+# === Выборка получателей ===
+RECIPIENT_QUERIES = {
+    BROADCAST_RECIPIENTS_ALL_FULL: "SELECT DISTINCT user_id FROM users",
+    BROADCAST_RECIPIENTS_CUSTOMERS_FULL: "SELECT DISTINCT user_id FROM orders WHERE status = 'active'",
+    BROADCAST_RECIPIENTS_ADMINS_FULL: "SELECT user_id FROM admins",
+}
+
 # === Константа завершения ===
 END = ConversationHandler.END
 
@@ -208,22 +219,26 @@ async def confirm_send(update: Update, context: ContextTypes.DEFAULT_TYPE):
             keys_to_clear=BROADCAST_KEYS
         )
 
-    try:
-        if recipients_label == BROADCAST_RECIPIENTS_ALL_FULL:
-            rows = await db.execute_read("SELECT DISTINCT user_id FROM users")
-        elif recipients_label == BROADCAST_RECIPIENTS_CUSTOMERS_FULL:
-            rows = await db.execute_read("SELECT DISTINCT user_id FROM orders WHERE status = 'active'")
-        elif recipients_label == BROADCAST_RECIPIENTS_ADMINS_FULL:
-            rows = await db.execute_read("SELECT user_id FROM admins")
-        elif recipients_label == BROADCAST_RECIPIENTS_TEST_FULL:
-            user_id = update.effective_user.id
-            rows = [(user_id,)]
-        else:
-            rows = []
-
-        user_ids = [row[0] for row in rows if row[0]]
-    except Exception as e:
-        logger.error(f"❌ Ошибка получения пользователей: {e}", exc_info=True)
+    admin_id = update.effective_user.id
+    if recipients_label == BROADCAST_RECIPIENTS_TEST_FULL:
+        recipients_query, recipients_params = "SELECT ? AS user_id", (admin_id,)
+    else:
+        recipients_query, recipients_params = RECIPIENT_QUERIES.get(recipients_label), ()
+
+    broadcast_id = None
+    if recipients_query:
+        # Получатели копируются в broadcast_recipients SQL-ом — список в память не загружается
+        broadcast_id = await db.create_broadcast(
+            created_by=admin_id,
+            kind=b_type,
+            recipients_query=recipients_query,
+            recipients_params=recipients_params,
+            text=context.user_data.get('text'),
+            photo_id=context.user_data.get('photo_id'),
+            caption=context.user_data.get('caption', ''),
+            recipients_label=recipients_label,
+        )
+    if not broadcast_id:
         return await exit_to_admin_menu(
             update,
             context,
@@ -231,48 +246,26 @@ async def confirm_send(update: Update, context: ContextTypes.DEFAULT_TYPE):
             keys_to_clear=BROADCAST_KEYS
         )
 
-    logger.info(f"Запуск рассылки: {len(user_ids)} получателей, тип: {b_type}")
-
-    sent, blocked, failed = 0, 0, 0
-    for user_id in user_ids:
-        try:
-            if b_type == 'text':
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=context.user_data['text'],
-                    parse_mode="HTML",
-                    disable_web_page_preview=True
-                )
-            elif b_type == 'photo':
-                caption = context.user_data.get('caption', '')
-                await context.bot.send_photo(
-                    chat_id=user_id,
-                    photo=context.user_data['photo_id'],
-                    caption=caption,
-                    parse_mode="HTML" if caption else None
-                )
-            sent += 1
-        except Exception as e:
-            error_msg = str(e).lower()
-            if "blocked" in error_msg or "kicked" in error_msg or "bot was blocked" in error_msg:
-                logger.info(f"🚫 Пользователь {user_id} заблокировал бота — пропускаем.")
-                blocked += 1
-            else:
-                logger.error(f"❌ Ошибка отправки {user_id}: {e}")
-                failed += 1
-
-    summary = (
-        f"📤 <b>Рассылка завершена:</b>\n"
-        f"✅ Доставлено: <b>{sent}</b>\n"
-        f"🛡️ Заблокировали: <b>{blocked}</b>\n"
-        f"❌ Ошибки: <b>{failed}</b>"
+    broadcast = await db.get_broadcast(broadcast_id)
+    logger.info(f"Запуск рассылки #{broadcast_id}: {broadcast['total']} получателей, тип: {b_type}")
+
+    # Это сообщение исполнитель будет обновлять по ходу рассылки
+    progress = await safe_reply(
+        update,
+        context,
+        f"📤 <b>Рассылка #{broadcast_id} запущена:</b> 0/{broadcast['total']}",
+        parse_mode="HTML",
+        disable_cooldown=True
     )
+    if progress:
+        await db.set_broadcast_progress_message(broadcast_id, progress.chat_id, progress.message_id)
+
+    start_broadcast(context.application, broadcast_id)
 
     await exit_to_admin_menu(
         update,
         context,
-        summary,
-        parse_mode="HTML",
+        "🕊️ Рассылка идёт в фоне — прогресс обновляется в сообщении выше, итог придёт отдельно.",
         keys_to_clear=BROADCAST_KEYS
     )
     return END
@@ -0,0 +1,118 @@
+"""
+Модуль диагностики БД: /dbstats — самые дорогие SQL-запросы бота.
+Только для админов.
+✅ Топ запросов по суммарному времени: count, p50/p95/max, строки
+✅ Последние медленные запросы с EXPLAIN QUERY PLAN
+✅ /dbstats reset — сброс статистики
+✅ Снимок остатков каталога, кэши графика поставок и акций: перезагрузки, патчи, попадания
+"""
+
+import logging
+from html import escape
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from utils.admin_helpers import check_admin
+from utils.messaging import safe_reply
+
+logger = logging.getLogger(__name__)
+
+# 📚 Текст помощи
+HELP_TEXT = "🗄 Статистика SQL: самые дорогие и медленные запросы (/dbstats reset — сброс)"
+
+TOP_LIMIT = 10
+SLOW_LIMIT = 5
+SQL_PREVIEW_LENGTH = 300
+
+
+def _short_sql(sql: str) -> str:
+    if len(sql) > SQL_PREVIEW_LENGTH:
+        sql = sql[:SQL_PREVIEW_LENGTH] + "…"
+    return escape(sql)
+
+
+def _format_inventory_stats() -> str:
+    from database.inventory import inventory
+    from utils.schedule_render import get_schedule_cache_stats
+    from utils.promotions_cache import get_promotions_cache_stats
+
+    stats = inventory.get_stats()
+    schedule = get_schedule_cache_stats()
+    promos = get_promotions_cache_stats()
+    return (
+        f"📦 <b>Снимок остатков:</b> {stats['stocks']} партий, {stats['breeds']} пород | "
+        f"перезагрузок {stats['reloads']} ({stats['last_reload_ms']} мс), "
+        f"патчей {stats['patches']}, инвалидаций {stats['invalidations']}\n"
+        f"📅 <b>График поставок:</b> из кэша {schedule['hits']}, перерисовок {schedule['renders']}\n"
+        f"🎁 <b>Акции:</b> из кэша {promos['hits']}, загрузок {promos['loads']}, "
+        f"до {promos['valid_until'] or 'правки'} | file_id: {promos['file_ids']} (повторов {promos['file_id_hits']})"
+    )
+
+
+def format_db_stats(db) -> str:
+    """Формирует HTML-отчёт по статистике запросов."""
+    top = db.get_query_stats(limit=TOP_LIMIT)
+    if not top:
+        return "🗄 <b>Статистика SQL</b>\n\n📭 Запросов пока не было.\n\n" + _format_inventory_stats()
+
+    lines = [
+        "🗄 <b>Статистика SQL</b>",
+        f"🐢 Порог медленного запроса: <b>{int(db.slow_query_ms)} мс</b>\n",
+        f"🔝 <b>Топ-{len(top)} по суммарному времени</b>",
+    ]
+    for i, item in enumerate(top, 1):
+        lines.append(
+            f"\n<b>{i}.</b> Σ <b>{item['total_ms']:.0f} мс</b> | ×{item['count']} | "
+            f"p50 {item['p50_ms']} / p95 {item['p95_ms']} / max {item['max_ms']} мс | "
+            f"строк: {item['rows']}\n"
+            f"<code>{_short_sql(item['sql'])}</code>"
+        )
+
+    slow = db.get_slow_queries(limit=SLOW_LIMIT)
+    if slow:
+        lines.append("\n\n🐢 <b>Последние медленные запросы</b>")
+        for item in slow:
+            plan = item.get("plan") or "…"
+            lines.append(
+                f"\n⏱ <b>{item['ms']} мс</b> | строк: {item['rows']} | {item['at'].strftime('%d.%m %H:%M:%S')}\n"
+                f"<code>{_short_sql(item['sql'])}</code>\n"
+                f"<pre>{escape(plan)}</pre>"
+            )
+
+    lines.append("\n" + _format_inventory_stats())
+    return "\n".join(lines)
+
+
+async def handle_dbstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает самые дорогие запросы к БД."""
+    if not await check_admin(update, context):
+        return
+
+    db = context.application.bot_data.get("db")
+    if not db:
+        await safe_reply(update, context, "❌ База данных недоступна.")
+        return
+
+    try:
+        if context.args and context.args[0].lower() == "reset":
+            db.reset_query_stats()
+            logger.info(f"🧹 Статистика SQL сброшена пользователем {update.effective_user.id}")
+            await safe_reply(update, context, "🧹 Статистика SQL сброшена.", disable_cooldown=True)
+            return
+
+        await safe_reply(update, context, format_db_stats(db), parse_mode="HTML", disable_cooldown=True)
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка в /dbstats: {e}", exc_info=True)
+        await safe_reply(update, context, "❌ Ошибка при сборе статистики.")
+
+
+def register_dbstats_handler(application):
+    """Регистрирует обработчик /dbstats"""
+    application.add_handler(CommandHandler("dbstats", handle_dbstats))
+    logger.info("✅ Обработчик /dbstats зарегистрирован")
+
+
+def get_help_text() -> str:
+    """Возвращает текст помощи для команды /dbstats"""
+    return HELP_TEXT
@@ -6,6 +6,7 @@
 ✅ Подсвечивает статусы цветом: активный — зелёный, ожидание — жёлтый, отменён — красный, выдан — серый
 ✅ Отправляет сообщения ПОСЛЕ команды (не редактирует)
 ✅ Удаляет временное сообщение "Подготовка..." при необходимости
+✅ Заказы читаются потоково (db.execute_stream), книга пишется в режиме write_only
 """
 
 from telegram import Update
@@ -17,10 +18,10 @@ import logging
 import os
 from datetime import datetime
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 import asyncio
 from telegram.error import NetworkError, TimedOut
-from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
@@ -55,38 +56,7 @@ async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     filepath = None  # Чтобы было доступно в finally
     try:
-        # Получаем все заказы
-        rows = await db.execute_read("""
-            SELECT id, breed, incubator, date, quantity, price, phone, status, created_at
-            FROM orders ORDER BY created_at DESC
-        """)
-
-        if not rows:
-            await effective_message.reply_text("❌ Нет заказов для выгрузки.")
-            return
-
-        # Группируем заказы по дате поставки
-        grouped = defaultdict(list)
-        for row in rows:
-            status = row[7]
-            if status in CLOSED_STATUSES:
-                continue
-
-            date_str = row[3] or ""
-            delivery_date = date_str.split()[0] if date_str else "Без даты"
-            grouped[delivery_date].append(row)
-
-        if not grouped:
-            await effective_message.reply_text("❌ Нет открытых заказов для выгрузки.")
-            return
-
-        total_count = sum(len(orders) for orders in grouped.values())
-        logger.info(f"📊 Подготовлено {total_count} заказов для экспорта")
-
-        # Создаём книгу Excel
-        wb = Workbook()
-        wb.remove(wb.active)
-
+        # Стили
         header_font = Font(bold=True, color="FFFFFF")
         header_fill = PatternFill(start_color="2E74B5", end_color="2E74B5", fill_type="solid")
         header_alignment = Alignment(horizontal="center", vertical="center")
@@ -97,86 +67,108 @@ async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         currency_format = '# ##0 ₽'
 
         headers = ["Номер", "Порода", "Инкубатор", "Поставка", "Количество", "Цена, ₽", "Сумма, ₽", "Телефон", "Статус", "Создан"]
-
-        for delivery_date, orders in grouped.items():
-            sheet_title = delivery_date[:31] if delivery_date else "Без даты"
-            ws = wb.create_sheet(title=sheet_title)
-
-            ws.append(headers)
-            for col_num, _ in enumerate(headers, 1):
-                cell = ws.cell(row=1, column=col_num)
+        column_widths = {
+            'A': 8,   # Номер
+            'B': 15,  # Порода
+            'C': 18,  # Инкубатор
+            'D': 12,  # Поставка
+            'E': 10,  # Количество
+            'F': 10,  # Цена
+            'G': 12,  # Сумма
+            'H': 18,  # Телефон
+            'I': 12,  # Статус
+            'J': 12   # Создан
+        }
+
+        # write_only — строки сразу уходят во временный файл, а не копятся в памяти
+        wb = Workbook(write_only=True)
+        sheets = {}
+
+        def make_cell(ws, value, fill=None, number_format=None):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.border = thin_border
+            if fill:
+                cell.fill = fill
+            if number_format:
+                cell.number_format = number_format
+            return cell
+
+        def get_sheet(delivery_date: str):
+            """Лист на дату поставки: создаётся при первой строке"""
+            ws = sheets.get(delivery_date)
+            if ws is not None:
+                return ws
+            ws = wb.create_sheet(title=delivery_date[:31] if delivery_date else "Без даты")
+            for col_letter, width in column_widths.items():
+                ws.column_dimensions[col_letter].width = width
+            header_cells = []
+            for title in headers:
+                cell = WriteOnlyCell(ws, value=title)
                 cell.font = header_font
                 cell.fill = header_fill
                 cell.alignment = header_alignment
                 cell.border = thin_border
+                header_cells.append(cell)
+            ws.append(header_cells)
+            sheets[delivery_date] = ws
+            return ws
+
+        # Потоково читаем открытые заказы — закрытые отсекаются в SQL
+        placeholders = ",".join("?" * len(CLOSED_STATUSES))
+        total_count = 0
+        async for row in db.execute_stream(f"""
+            SELECT id, breed, incubator, date, quantity, price, phone, status, created_at
+            FROM orders
+            WHERE status NOT IN ({placeholders})
+            ORDER BY date, created_at DESC
+        """, tuple(CLOSED_STATUSES)):
+            order_id, breed, incubator, date, qty, price, phone, status, created_at = row
 
-            for row in orders:
-                order_id, breed, incubator, date, qty, price, phone, status, created_at = row
-
-                try:
-                    qty = int(qty)
-                    price = int(float(price))
-                    total = qty * price
-                except (TypeError, ValueError):
-                    qty = 0
-                    price = 0
-                    total = 0
-
-                try:
-                    delivery_date_fmt = datetime.strptime(date.split()[0], "%Y-%m-%d").strftime("%d.%m.%Y") if date else ""
-                except:
-                    delivery_date_fmt = date or ""
-
-                try:
-                    created_date = datetime.strptime(created_at.split()[0], "%Y-%m-%d").strftime("%d.%m.%Y") if created_at else ""
-                except:
-                    created_date = created_at or ""
-
-                status_text = STATUS_TEXT.get(status, status.title())
-                formatted_phone = format_phone(phone)
-
-                ws.append([
-                    order_id,
-                    breed,
-                    incubator or "Не указан",
-                    delivery_date_fmt,
-                    qty,
-                    price,
-                    total,
-                    formatted_phone,
-                    status_text,
-                    created_date
-                ])
-
-                row_num = ws.max_row
-                fill_color = STATUS_COLORS.get(status)
-                if fill_color:
-                    for col_num in range(1, 11):
-                        cell = ws.cell(row=row_num, column=col_num)
-                        cell.fill = fill_color
-
-            column_widths = {
-                'A': 8,   # Номер
-                'B': 15,  # Порода
-                'C': 18,  # Инкубатор
-                'D': 12,  # Поставка
-                'E': 10,  # Количество
-                'F': 10,  # Цена
-                'G': 12,  # Сумма
-                'H': 18,  # Телефон
-                'I': 12,  # Статус
-                'J': 12   # Создан
-            }
-            for col_letter, width in column_widths.items():
-                ws.column_dimensions[col_letter].width = width
+            delivery_date = date.split()[0] if date else "Без даты"
+            ws = get_sheet(delivery_date)
 
-            for row_num in range(2, ws.max_row + 1):
-                cell = ws[f'G{row_num}']
-                cell.number_format = currency_format
+            try:
+                qty = int(qty)
+                price = int(float(price))
+                total = qty * price
+            except (TypeError, ValueError):
+                qty = 0
+                price = 0
+                total = 0
 
-            for row in ws.iter_rows(min_row=2, max_row=ws.max_row, min_col=1, max_col=10):
-                for cell in row:
-                    cell.border = thin_border
+            try:
+                delivery_date_fmt = datetime.strptime(date.split()[0], "%Y-%m-%d").strftime("%d.%m.%Y") if date else ""
+            except:
+                delivery_date_fmt = date or ""
+
+            try:
+                created_date = datetime.strptime(created_at.split()[0], "%Y-%m-%d").strftime("%d.%m.%Y") if created_at else ""
+            except:
+                created_date = created_at or ""
+
+            status_text = STATUS_TEXT.get(status, status.title())
+            formatted_phone = format_phone(phone)
+            fill_color = STATUS_COLORS.get(status)
+
+            ws.append([
+                make_cell(ws, order_id, fill_color),
+                make_cell(ws, breed, fill_color),
+                make_cell(ws, incubator or "Не указан", fill_color),
+                make_cell(ws, delivery_date_fmt, fill_color),
+                make_cell(ws, qty, fill_color),
+                make_cell(ws, price, fill_color),
+                make_cell(ws, total, fill_color, currency_format),
+                make_cell(ws, formatted_phone, fill_color),
+                make_cell(ws, status_text, fill_color),
+                make_cell(ws, created_date, fill_color),
+            ])
+            total_count += 1
+
+        if not total_count:
+            await effective_message.reply_text("❌ Нет открытых заказов для выгрузки.")
+            return
+
+        logger.info(f"📊 Подготовлено {total_count} заказов для экспорта")
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"orders_export_{timestamp}.xlsx"
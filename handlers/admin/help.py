@@ -39,6 +39,7 @@ HELP_TEXT = """
 /status — текущее состояние бота  
 /debug — режим отладки (если включён)  
 /checkstocks — проверить согласованность партий  
+/dbstats — статистика SQL-запросов  
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━  
 🛠️ <b>АДМИН-МЕНЮ</b>  
@@ -94,7 +95,8 @@ HELP_TEXT = """
 
 🔸 <b>/checkstocks</b>  
 Проверяет, соответствует ли <code>available_quantity</code> реальному количеству:
-> Доступно = Всего - Заказано
+> Доступно = Всего - Заказано (ожидают, активные и выданные)
+Остаток ведут триггеры БД, ночная сверка проверяет только изменённые партии.
 
 Показывает:
 - 📦 Всего цыплят в партии
@@ -104,6 +106,14 @@ HELP_TEXT = """
 
 👉 Используйте при подозрении на "битые" данные.
 
+🔸 <b>/dbstats</b>  
+Показывает самые дорогие SQL-запросы бота:
+- ⏱ Количество вызовов, p50 / p95 / max
+- 📄 Сколько строк вернули или изменили
+- 🐢 Последние медленные запросы с планом выполнения
+
+👉 <code>/dbstats reset</code> — сбросить статистику.
+
 ━━━━━━━━━━━━━━━━━━━━━━━━━━  
 📌 <b>ФОРМАТЫ ВВОДА</b>  
 ━━━━━━━━━━━━━━━━━━━━━━━━━━  
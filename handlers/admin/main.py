@@ -455,20 +455,15 @@ async def checkstocks_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             s.id, s.breed, s.incubator, s.date, s.quantity, s.available_quantity,
             COALESCE(SUM(o.quantity), 0) AS total_ordered
         FROM stocks s
-        LEFT JOIN orders o ON s.id = o.stock_id AND o.status IN ('pending', 'active')
+        LEFT JOIN orders o ON s.id = o.stock_id AND o.status IN ('pending', 'active', 'issued')
         WHERE s.status = 'active'
         GROUP BY s.id
         ORDER BY s.date, s.breed
     """
     try:
-        rows = await db.execute_read(query)
-        if not rows:
-            await safe_reply(update, context, "📭 Нет активных партий.")
-            return
-
         report_lines = ["📋 <b>Состояние партий</b> (сравнение с заказами)\n"]
 
-        for row in rows:
+        async for row in db.execute_stream(query):
             correct_avail = row['quantity'] - row['total_ordered']
             current_avail = row['available_quantity']
             incubator_text = f" | 🏢 {row['incubator']}" if row['incubator'] else ""
@@ -481,6 +476,10 @@ async def checkstocks_command(update: Update, context: ContextTypes.DEFAULT_TYPE
                 f"   🟢 Доступно: {current_avail} шт (должно быть: {correct_avail})"
             )
 
+        if len(report_lines) == 1:
+            await safe_reply(update, context, "📭 Нет активных партий.")
+            return
+
         await safe_reply(
             update, context,
             "\n".join(report_lines),
@@ -650,6 +649,7 @@ def register_admin_handlers(app: Application):
     from .orders import register_admin_orders_handler
     from .export import register_export_handler
     from .health import register_health_handler
+    from .dbstats import register_dbstats_handler
     from .stats.yearly import get_yearly_stats_handler
 
     register_admin_broadcast_handler(app)
@@ -657,6 +657,7 @@ def register_admin_handlers(app: Application):
     register_admin_orders_handler(app)
     register_export_handler(app)
     register_health_handler(app)
+    register_dbstats_handler(app)
 
     yearly_handler = get_yearly_stats_handler()
     if yearly_handler:
@@ -623,25 +623,13 @@ async def confirm_edit_final(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "date": "UPDATE orders SET date = ? WHERE id = ?",
         }
         query = field_queries[field]
-        await db.execute_write(query, (new_value, order_id))
-
-        # Если меняем количество — корректируем остатки
+        # Остаток партии при смене количества пересчитывает триггер trg_orders_update_hold;
+        # если в партии не хватает — CHECK (available_quantity >= 0) отклонит UPDATE
+        if not await db.execute_write(query, (new_value, order_id)):
+            message = "❌ В партии недостаточно остатка." if field == "quantity" else "❌ Не удалось обновить заказ."
+            return await exit_to_admin_menu(update, context, message, keys_to_clear=ORDER_KEYS_TO_CLEAR)
         if field == "quantity":
-            new_qty = int(new_value)
-            diff = new_qty - old_qty  # + = уменьшаем остаток, - = возвращаем
-            if diff != 0:
-                result = await db.execute_write(
-                    """
-                    UPDATE stocks 
-                    SET available_quantity = available_quantity - ?
-                    WHERE breed = ? AND incubator = ? AND date = ?
-                    """,
-                    (diff, old_order["breed"], old_order["incubator"], old_order["date"])
-                )
-                if result:
-                    logger.info(f"🔁 Обновлён остаток: {diff:+d} шт для {old_order['breed']} | {old_order['incubator']} | {old_order['date']}")
-                else:
-                    logger.warning(f"⚠️ Не удалось обновить остатки в stocks для заказа {order_id}")
+            logger.info(f"🔁 Остаток партии {old_order['stock_id']} пересчитан: {int(new_value) - old_qty:+d} шт в заказе {order_id}")
 
         # Отправляем уведомление клиенту
         updated_order = await db.execute_read("SELECT * FROM orders WHERE id = ?", (order_id,))
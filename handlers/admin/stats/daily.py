@@ -32,17 +32,18 @@ async def daily_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         total_clients = safe_count(await db.execute_read("SELECT COUNT(DISTINCT phone) FROM orders"))
 
         new_today = safe_count(await db.execute_read(
-            "SELECT COUNT(*) FROM orders WHERE DATE(created_at) = ?", (today,)
+            "SELECT COUNT(*) FROM orders WHERE created_at >= ? AND created_at < DATE(?, '+1 day')",
+            (today, today)
         ))
 
         new_clients_today = safe_count(await db.execute_read("""
             SELECT COUNT(*) FROM (
                 SELECT phone FROM orders
-                WHERE DATE(created_at) = ?
+                WHERE created_at >= ? AND created_at < DATE(?, '+1 day')
                 GROUP BY phone
                 HAVING COUNT(*) = 1
             )
-        """, (today,)))
+        """, (today, today)))
 
         revenue_result = await db.execute_read("""
             SELECT SUM(price * quantity)
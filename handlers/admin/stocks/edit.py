@@ -12,6 +12,7 @@
 ✅ Все fallbacks покрыты
 ✅ Нет дублирования при входе
 ✅ Не перехватывает чужие кнопки (например, 🔧 Изменить)
+✅ Остаток при смене количества пересчитывает триггер БД
 """
 
 import logging
@@ -501,7 +502,10 @@ async def handle_confirm_edit_stock(update: Update, context: ContextTypes.DEFAUL
             field_name = "quantity"
             old_row = await db.execute_read("SELECT quantity FROM stocks WHERE id = ?", (stock_id,))
             old_value = old_row[0][0] if old_row else "неизвестно"
-            await db.execute_write("UPDATE stocks SET quantity = ? WHERE id = ?", (new_value, stock_id))
+            # available_quantity сдвигает триггер trg_stocks_quantity; ниже уже заказанного — CHECK отклонит
+            if not await db.execute_write("UPDATE stocks SET quantity = ? WHERE id = ?", (new_value, stock_id)):
+                await exit_to_admin_menu(update, context, "❌ Нельзя сделать партию меньше уже заказанного количества.")
+                return ConversationHandler.END
 
         elif action == "date":
             new_value = context.user_data.get('edit_date')
@@ -68,7 +68,7 @@ async def _search_stocks(update: Update, context: ContextTypes.DEFAULT_TYPE, que
             SELECT breed, incubator, date, quantity, available_quantity, price
             FROM stocks
             WHERE quantity > 0
-              AND date(date) >= date('now')
+              AND date >= date('now')
               AND (breed LIKE ? OR incubator LIKE ? OR date LIKE ?)
             ORDER BY date
             """,
@@ -138,7 +138,7 @@ async def start_stock_view(update: Update, context: ContextTypes.DEFAULT_TYPE):
             SELECT breed, incubator, date, quantity, available_quantity, price 
             FROM stocks 
             WHERE quantity > 0 
-              AND date(date) >= date('now')
+              AND date >= date('now')
             ORDER BY date
             """
         )
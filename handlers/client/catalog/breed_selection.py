@@ -17,9 +17,9 @@ from utils.keyboards import (
     get_available_breeds_from_db,
 )
 
-from database.repository import db
+from database.inventory import inventory
 from utils.messaging import safe_reply
-from .utils import send_breed_info, get_today_str
+from .utils import send_breed_info
 from .navigation import handle_back_button
 from states import SELECTING_BREED, SELECTING_INCUBATOR
 
@@ -53,7 +53,7 @@ async def handle_breed_selection(update: Update, context: ContextTypes.DEFAULT_T
     # Извлекаем чистое имя породы
     breed_clean = text.split(maxsplit=1)[1] if ' ' in text else text
 
-    # Получаем актуальные породы из БД
+    # Получаем актуальные породы из снимка остатков
     available_breeds = await get_available_breeds_from_db()
 
     # Проверяем, есть ли такая порода
@@ -65,17 +65,14 @@ async def handle_breed_selection(update: Update, context: ContextTypes.DEFAULT_T
     context.user_data["selected_breed"] = breed_clean
     await send_breed_info(update, breed_clean, context)
 
-    # Проверяем доступные инкубаторы
-    result = await db.execute_read(
-        "SELECT DISTINCT incubator FROM stocks WHERE breed = ? AND available_quantity > 0 AND status = 'active' AND date >= ?",
-        (breed_clean, get_today_str())
-    )
+    # Проверяем доступные инкубаторы (снимок остатков — без SQL)
+    result = await inventory.incubators(breed_clean)
     if not result:
         from config.buttons import get_main_keyboard
         await safe_reply(update, context, "📅 Нет доступных партий этой породы.", reply_markup=get_main_keyboard())
         return ConversationHandler.END
 
-    available_incubators = [row[0] for row in result if row[0] in INCUBATORS]
+    available_incubators = [inc for inc in result if inc in INCUBATORS]
     context.user_data["available_incubators"] = available_incubators
     context.user_data["navigation_stack"] = [SELECTING_BREED, SELECTING_INCUBATOR]
 
@@ -123,51 +123,21 @@ async def _create_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # ✅ Доверим номер позже при подтверждении (в админке)
             logger.info(f"🛍️ Пользователь {user_id} оформил заказ: {full_name} ({phone})")
 
-        # Получаем stock_id
-        stock_id = await db.get_stock_id(breed, incubator, date)
-        if not stock_id:
-            await safe_reply(update, context, "❌ Партия не найдена.", reply_markup=get_main_keyboard())
-            return ConversationHandler.END
-
-        # Проверяем остаток
-        stock = await db.execute_read("SELECT available_quantity FROM stocks WHERE id = ?", (stock_id,))
-        if not stock:
-            await safe_reply(update, context, "❌ Партия не существует.", reply_markup=get_main_keyboard())
-            return ConversationHandler.END
-
-        available_quantity = stock[0]["available_quantity"]
-        if qty > available_quantity:
-            await safe_reply(
-                update, context,
-                f"❌ Невозможно оформить заказ.\n\n"
-                f"📦 Доступно: <b>{available_quantity} шт.</b>\n"
-                f"🛒 Вы запрашиваете: <b>{qty} шт.</b>\n\n"
-                f"Пожалуйста, измените количество.",
-                parse_mode="HTML",
-                reply_markup=get_main_keyboard()
-            )
-            return ConversationHandler.END
+        # Списание остатка и заказ — одной транзакцией, без окна между проверкой и записью
+        order_id = await db.reserve_and_create_order(
+            user_id=user_id,
+            phone=phone,
+            quantity=qty,
+            price=price,
+            breed=breed,
+            date=date,
+            incubator=incubator,
+            customer_name=customer_name,
+            customer_phone=customer_phone,
+            created_by_admin=is_admin
+        )
 
-        # Транзакция
-        async with db.semaphore:
-            success = await db.execute_transaction([
-                ("INSERT INTO orders "
-                 "(user_id, phone, breed, date, quantity, price, stock_id, incubator, status, "
-                 "created_at, updated_at, customer_name, customer_phone, created_by_admin) "
-                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', datetime('now'), datetime('now'), ?, ?, ?)",
-                 (user_id, phone, breed, date, qty, price, stock_id, incubator,
-                  customer_name, customer_phone, int(is_admin))),
-
-                ("UPDATE stocks SET available_quantity = available_quantity - ? "
-                 "WHERE id = ? AND available_quantity >= ?",
-                 (qty, stock_id, qty)),
-
-                ("UPDATE stocks SET status = 'inactive' "
-                 "WHERE id = ? AND (SELECT available_quantity FROM stocks WHERE id = ?) <= 0",
-                 (stock_id, stock_id)),
-            ])
-
-        if not success:
+        if not order_id:
             await safe_reply(
                 update, context,
                 "❌ К сожалению, количество изменилось. Попробуйте ещё раз.",
@@ -188,7 +158,7 @@ async def _create_order(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
         # Лог
-        logger.info(f"✅ Заказ на {qty} шт. {breed} от {customer_phone} (админ={is_admin}) успешно создан")
+        logger.info(f"✅ Заказ №{order_id} на {qty} шт. {breed} от {customer_phone} (админ={is_admin}) успешно создан")
 
     except Exception as e:
         logger.error(f"❌ Ошибка при создании заказа: {e}", exc_info=True)
@@ -9,7 +9,7 @@ from .navigation import handle_back_button
 
 # === ИМПОРТЫ НАВЕРХ ===
 from states import SELECTING_DATE, CHOOSE_QUANTITY, SELECTING_INCUBATOR
-from database.repository import db
+from database.inventory import inventory
 from .incubator_selection import _back_to_incubator_selection
 
 
@@ -36,25 +36,8 @@ async def _back_to_date_selection(update: Update, context: ContextTypes.DEFAULT_
     if not breed_clean or not incubator:
         return await _back_to_incubator_selection(update, context)
 
-    result = await db.execute_read(
-        "SELECT date, available_quantity, price FROM stocks WHERE breed = ? AND incubator = ? AND available_quantity > 0 AND status = 'active' ORDER BY date ASC",
-        (breed_clean, incubator)
-    )
-    if not result:
-        from config.buttons import get_main_keyboard
-        await safe_reply(update, context, "❌ Нет доступных партий.", reply_markup=get_main_keyboard())
-        return ConversationHandler.END
-
-    today = datetime.now().date()
-    filtered = []
-    for date_str, qty, price in result:
-        try:
-            stock_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-            if stock_date >= today:
-                filtered.append((date_str, qty, price))
-        except ValueError:
-            continue
-
+    # Снимок остатков уже отфильтрован: активные, с остатком, дата не в прошлом
+    filtered = await inventory.dates(breed_clean, incubator)
     if not filtered:
         from config.buttons import get_main_keyboard
         await safe_reply(update, context, "📅 Нет доступных дат.", reply_markup=get_main_keyboard())
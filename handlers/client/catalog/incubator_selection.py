@@ -1,6 +1,5 @@
 """Выбор инкубатора: показ и обработка."""
 
-from .utils import get_today_str
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from config.buttons import get_incubator_keyboard, INCUBATORS, INCUBATOR_EMOJI, with_emoji, BTN_BACK_FULL
@@ -13,7 +12,7 @@ from .navigation import handle_back_button
 
 from states import SELECTING_INCUBATOR, SELECTING_DATE, SELECTING_BREED
 from config.buttons import BREEDS
-from database.repository import db
+from database.inventory import inventory
 
 
 async def _back_to_incubator_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,16 +23,13 @@ async def _back_to_incubator_selection(update: Update, context: ContextTypes.DEF
         from .breed_selection import _back_to_breed_selection
         return await _back_to_breed_selection(update, context)
 
-    result = await db.execute_read(
-        "SELECT DISTINCT incubator FROM stocks WHERE breed = ? AND available_quantity > 0 AND status = 'active' AND date >= ?",
-        (breed_clean, get_today_str())
-    )
+    result = await inventory.incubators(breed_clean)
     if not result:
         from config.buttons import get_main_keyboard
         await safe_reply(update, context, "📅 Нет доступных инкубаторов.", reply_markup=get_main_keyboard())
         return ConversationHandler.END
 
-    incubators = [row[0] for row in result if row[0] in INCUBATORS]
+    incubators = [inc for inc in result if inc in INCUBATORS]
     context.user_data["available_incubators"] = incubators
 
     keyboard = get_incubator_keyboard(incubators)
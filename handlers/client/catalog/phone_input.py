@@ -51,6 +51,7 @@ async def _back_to_phone_input(update: Update, context: ContextTypes.DEFAULT_TYP
 ✅ Проверка верификации
 ✅ Ограничение >50 шт. только для не-админов
 ✅ Админ может вносить любые заказы от лица клиента
+✅ Доверие / блокировка / попытки — один DB.get_phone_verdict() вместо 3–4 запросов
 """
 
 from datetime import datetime
@@ -125,7 +126,7 @@ async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     # 2. Кнопка "Использовать доверенный"
     elif trusted_phone_match:
         phone = trusted_phone_match
-        if not await db.is_trusted_phone(phone):
+        if not (await db.get_phone_verdict(phone))["trusted"]:
             await safe_reply(update, context,
                              "❌ Этот номер больше не доверенный. Введите новый.",
                              reply_markup=get_phone_input_keyboard())
@@ -157,8 +158,11 @@ async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
                          reply_markup=get_phone_input_keyboard())
         return ENTER_PHONE
 
+    # Доверие, блокировка и попытки — одним запросом (и из короткого кэша при повторе)
+    verdict = await db.get_phone_verdict(phone)
+
     # 🔴 Проверка: номер заблокирован?
-    if await db.is_phone_blocked(phone):
+    if verdict["blocked"]:
         clear_catalog_data(context)
         await safe_reply(update, context, "🚫 Номер заблокирован.", reply_markup=get_main_keyboard())
         return ConversationHandler.END
@@ -187,9 +191,8 @@ async def handle_phone_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
             logger.info(f"🛠️ Админ {user_id} вносит заказ >50 шт. за клиента: {phone}")
 
     # 🔒 Попытки и блокировки — только для не-админов и не-доверенных
-    if not is_admin and not verified and not await db.is_trusted_phone(phone):
-        attempts = await db.get_daily_attempts(phone)
-        if attempts >= 2:
+    if not is_admin and not verified and not verdict["trusted"]:
+        if verdict["attempts"] >= 2:
             await db.block_phone(phone, "Слишком много попыток", 24)
             clear_catalog_data(context)
             await safe_reply(update, context, "🚫 Номер заблокирован.", reply_markup=get_main_keyboard())
@@ -9,7 +9,7 @@ from .navigation import handle_back_button
 
 # === ИМПОРТЫ НАВЕРХ ===
 from states import CHOOSE_QUANTITY, ENTER_PHONE, SELECTING_DATE
-from database.repository import db
+from database.inventory import inventory
 
 # ✅ УДАЛЁН: from .phone_input import _back_to_phone_input
 
@@ -24,16 +24,13 @@ async def _back_to_quantity_input(update: Update, context: ContextTypes.DEFAULT_
         from .date_selection import _back_to_date_selection
         return await _back_to_date_selection(update, context)
 
-    result = await db.execute_read(
-        "SELECT available_quantity, price FROM stocks WHERE breed = ? AND incubator = ? AND date = ? AND status = 'active' AND available_quantity > 0",
-        (breed_clean, incubator, date)
-    )
-    if not result:
+    stock = await inventory.get(breed_clean, incubator, date)
+    if not stock:
         from config.buttons import get_main_keyboard
         await safe_reply(update, context, "❌ Партия недоступна.", reply_markup=get_main_keyboard())
         return ConversationHandler.END
 
-    avail_qty, price = result[0]
+    _, avail_qty, price = stock
     context.user_data.update({"available_quantity": avail_qty, "selected_price": price})
 
     try:
@@ -8,6 +8,7 @@ from html import escape
 from config.buttons import BREED_EMOJI, BREEDS
 from database.repository import db
 from utils.messaging import safe_reply
+from utils.telegram_files import reply_local_photo
 
 # === Описания пород ===
 BREED_DESCRIPTIONS = {
@@ -64,8 +65,8 @@ async def send_breed_info(update: Update, breed: str, context: ContextTypes.DEFA
     try:
         image_path = BREED_IMAGES.get(breed)
         if image_path and os.path.exists(image_path):
-            with open(image_path, "rb") as photo:
-                await update.message.reply_photo(photo=photo, caption=BREED_DESCRIPTIONS[breed], parse_mode="HTML")
+            # file_id из реестра telegram_files — файл загружается в Telegram только один раз
+            await reply_local_photo(update.message, image_path, caption=BREED_DESCRIPTIONS[breed], parse_mode="HTML")
         else:
             await update.message.reply_text(BREED_DESCRIPTIONS[breed], parse_mode="HTML")
     except Exception as e:
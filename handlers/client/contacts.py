@@ -13,6 +13,7 @@ from config.buttons import (
     get_main_keyboard,
 )
 from utils.messaging import safe_reply
+from utils.telegram_files import reply_local_photo
 import os
 import logging
 
@@ -63,13 +64,13 @@ async def contacts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Проверяем наличие изображения
         if os.path.exists(IMAGE_PATH):
             try:
-                with open(IMAGE_PATH, "rb") as photo:
-                    await update.message.reply_photo(
-                        photo=photo,
-                        caption=message,
-                        parse_mode="HTML",
-                        disable_web_page_preview=True
-                    )
+                # disable_web_page_preview не поддерживается reply_photo — из-за него фото всегда падало в текст
+                await reply_local_photo(
+                    update.message,
+                    IMAGE_PATH,
+                    caption=message,
+                    parse_mode="HTML"
+                )
                 logger.info(f"🖼️ Отправлено фото и контакты пользователю {update.effective_user.id}")
             except Exception as e:
                 logger.warning(f"❌ Не удалось отправить фото: {e}")
@@ -4,29 +4,66 @@
 ✅ Исправлен доступ к sqlite3.Row
 ✅ Удалён недопустимый параметр disable_web_page_preview
 ✅ Отправка фото по одному — стабильно и безопасно
+✅ Акции из utils.promotions_cache; фото повторно — по file_id, без скачивания по URL
 """
 
 from telegram import Update
 from telegram.ext import ContextTypes, MessageHandler, filters
-from database.repository import db
 from config.buttons import PROMOTIONS_BUTTON_TEXT, get_main_keyboard
 from utils.messaging import safe_reply
-from html import escape
+from utils.promotions_cache import (
+    get_active_promotions,
+    get_photo_file_id,
+    remember_photo_file_id,
+    forget_photo_file_id,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+async def _send_promo_photo(update: Update, image_url: str, caption: str, title: str) -> bool:
+    """
+    Фото акции: по сохранённому file_id, а если его нет или он не принят — по URL.
+    После успешной отправки по URL запоминает file_id.
+    """
+    file_id = get_photo_file_id(image_url)
+    if file_id:
+        try:
+            await update.effective_message.reply_photo(
+                photo=file_id, caption=caption, parse_mode="HTML", disable_notification=True
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"🖼️ file_id акции '{title}' не принят, отправляем по URL: {e}")
+            forget_photo_file_id(image_url)
+
+    try:
+        message = await update.effective_message.reply_photo(
+            photo=image_url,
+            caption=caption,
+            parse_mode="HTML",
+            # ✅ УДАЛЕНО: disable_web_page_preview=True
+            # ❌ Этот параметр НЕ поддерживается в reply_photo()
+            disable_notification=True
+        )
+        remember_photo_file_id(image_url, message)
+        return True
+    except Exception as e:
+        logger.warning(f"🖼️ Не удалось отправить фото для акции '{title}': {e}")
+        return False
+
+
 async def handle_promotions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Показывает клиенту активные акции.
-    Работает с sqlite3.Row напрямую.
+    Подписи и список — из кэша акций, БД не трогается между границами дат.
     """
     if not update.effective_user or not update.effective_message:
         return
 
     try:
-        promotions = await db.get_active_promotions()
+        promotions = await get_active_promotions()
         if not promotions:
             await safe_reply(
                 update,
@@ -42,37 +79,20 @@ async def handle_promotions(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         for promo in promotions:
             try:
-                # ✅ Правильный доступ к sqlite3.Row
-                title = escape(str(promo['title']))
-                desc = escape(str(promo['description']))
+                title = promo['title']
+                caption = promo['caption_html']
                 image_url = promo['image_url']
-                start_date = promo['start_date']
-                end_date = promo['end_date']
-
-                # Формируем текст
-                start_str = f"📅 Начало: {start_date}\n" if start_date else ""
-                end_str = f"🔚 Окончание: {end_date}\n" if end_date else "🔚 Окончание: бессрочно\n"
-                caption = f"🎁 <b>{title}</b>\n\n{start_str}{end_str}{desc}"
 
                 # Отправляем фото или текст
-                if image_url and str(image_url).strip():
+                if image_url:
+                    if await _send_promo_photo(update, image_url, caption, title):
+                        sent_count += 1
+                        continue
                     try:
-                        await update.effective_message.reply_photo(
-                            photo=str(image_url).strip(),
-                            caption=caption,
-                            parse_mode="HTML",
-                            # ✅ УДАЛЕНО: disable_web_page_preview=True
-                            # ❌ Этот параметр НЕ поддерживается в reply_photo()
-                            disable_notification=True
-                        )
+                        await safe_reply(update, context, caption, parse_mode="HTML", reply_markup=None)
                         sent_count += 1
-                    except Exception as e:
-                        logger.warning(f"🖼️ Не удалось отправить фото для акции '{title}': {e}")
-                        try:
-                            await safe_reply(update, context, caption, parse_mode="HTML", reply_markup=None)
-                            sent_count += 1
-                        except Exception:
-                            failed_count += 1
+                    except Exception:
+                        failed_count += 1
                 else:
                     try:
                         await safe_reply(update, context, caption, parse_mode="HTML", reply_markup=None)
@@ -2,6 +2,7 @@
 📅 Обработчик 'График поставок' — показ ближайших партий.
 Работает по кнопке '📅 График'.
 ✅ Удалена защита HANDLED_KEY — она мешает при быстрых кликах
+✅ Текст — из utils.schedule_render: перерисовка только при изменении остатков
 """
 
 from telegram import Update
@@ -13,13 +14,10 @@ from telegram.ext import (
 from config.buttons import (
     SCHEDULE_BUTTON_TEXT,
     get_main_keyboard,
-    SEPARATOR,
     # HANDLED_KEY — больше не используется
 )
 from utils.messaging import safe_reply
-from database.repository import db
-from html import escape
-from datetime import datetime, date
+from utils.schedule_render import render_schedule
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,67 +29,7 @@ async def handle_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Без защиты от повторного вызова — пусть обрабатывает каждый клик.
     """
     try:
-        today = date.today().isoformat()
-        result = await db.execute_read(
-            """
-            SELECT breed, incubator, date, available_quantity, quantity, price 
-            FROM stocks 
-            WHERE quantity > 0 AND status = 'active' AND date >= ?
-            ORDER BY date
-            """,
-            (today,)
-        )
-
-        if not result:
-            await safe_reply(
-                update,
-                context,
-                "📅 Нет активных поставок на ближайшее время.",
-                reply_markup=get_main_keyboard(),
-                parse_mode="HTML"
-            )
-            return
-
-        message_lines = ["📦 <b>График поставок:</b>", SEPARATOR]
-        for record in result:
-            breed, incubator, raw_date, avail_qty, total_qty, price = record
-            try:
-                avail = max(int(avail_qty or 0), 0)
-                total = max(int(total_qty or 0), 1)
-                percent = (avail / total) * 100
-            except (ValueError, TypeError):
-                continue
-
-            icon = "🟢" if percent >= 50 else "🟡" if percent >= 10 else "🔴"
-
-            try:
-                price_value = int(float(price or 0))
-            except (ValueError, TypeError):
-                price_value = 0
-
-            try:
-                dt = datetime.strptime(raw_date, "%Y-%m-%d")
-                formatted_date = dt.strftime("%d-%m-%Y")
-            except ValueError:
-                formatted_date = raw_date
-
-            breed_safe = escape(breed)
-            incubator_safe = escape(incubator) if incubator else "Не указан"
-
-            message_lines.append(
-                f"🐔 <b>Порода:</b> {breed_safe}\n"
-                f"🏢 <b>Инкубатор:</b> {incubator_safe}\n"
-                f"📅 <b>Поставка:</b> {formatted_date}\n"
-                f"{icon} <b>Доступно:</b> {avail} шт.\n"
-                f"💰 <b>Цена:</b> {price_value} руб."
-            )
-            message_lines.append(SEPARATOR)
-
-        if message_lines and message_lines[-1] == SEPARATOR:
-            message_lines.pop()
-
-        message = "\n".join(message_lines).strip()
-
+        message = await render_schedule("html")
         await safe_reply(
             update,
             context,
@@ -0,0 +1,214 @@
+# handlers/router.py
+"""
+🧭 Фронт-контроллер кнопок reply-клавиатуры (group=-1)
+✅ Таблица «точный текст кнопки → обработчики» строится один раз из зарегистрированных фильтров
+   (filters.Text([...]) с полными текстами with_emoji из config.buttons)
+✅ Нажатие кнопки — один поиск в dict вместо проверки фильтров всех ConversationHandler во всех группах
+✅ Семантика PTB сохраняется: по одному обработчику на группу, в порядке групп,
+   ConversationHandler запускается через свой handle_update (состояние, таймауты — как раньше)
+✅ Пользователь внутри диалога (utils.conversation_index, O(1)) — обычная обработка PTB (состояние диалога важнее кнопки)
+✅ Обработчики с фильтрами, которые нельзя разобрать (Regex, TEXT...), проверяются честно — таблица их не пропускает
+✅ Новые экраны попадают в таблицу сами: она перестраивается при изменении набора обработчиков
+"""
+
+import logging
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import (
+    Application,
+    ApplicationHandlerStop,
+    BaseHandler,
+    CommandHandler,
+    ContextTypes,
+    ConversationHandler,
+    MessageHandler,
+    filters,
+)
+
+from utils.conversation_index import has_conversations, track_conversations
+
+logger = logging.getLogger(__name__)
+
+ROUTER_GROUP = -1
+
+# По группам: (кандидаты по порядку регистрации, последний кандидат точно принимает текст)
+RoutePlan = List[Tuple[List[BaseHandler], bool]]
+
+_routes: Dict[str, RoutePlan] = {}
+_fingerprint: Optional[Tuple[Tuple[int, int], ...]] = None
+_stats = {"routed": 0, "in_conversation": 0, "missed": 0, "fallbacks": 0, "builds": 0}
+
+
+# === Разбор фильтров ===
+
+def _filter_texts(flt) -> Optional[FrozenSet[str]]:
+    """
+    Точные тексты, которые пропускает фильтр в личном чате.
+    None — фильтр нельзя свести к набору текстов (Regex, TEXT, инверсия...).
+    """
+    if isinstance(flt, filters.Text):
+        return frozenset(flt.strings) if flt.strings is not None else None
+    if isinstance(flt, filters._MergedFilter):
+        if flt.and_filter is not None:
+            # Роутер работает только в личных чатах — ChatType.PRIVATE там всегда истинен
+            if flt.base_filter is filters.ChatType.PRIVATE:
+                return _filter_texts(flt.and_filter)
+            if flt.and_filter is filters.ChatType.PRIVATE:
+                return _filter_texts(flt.base_filter)
+            left, right = _filter_texts(flt.base_filter), _filter_texts(flt.and_filter)
+            if left is None or right is None:
+                return None
+            return left & right
+        left, right = _filter_texts(flt.base_filter), _filter_texts(flt.or_filter)
+        if left is None or right is None:
+            return None
+        return left | right
+    return None
+
+
+def _handler_texts(handler: BaseHandler) -> Optional[FrozenSet[str]]:
+    """
+    Тексты, на которые обработчик может сработать у пользователя вне диалогов.
+    Пустой набор — точно не сработает на кнопку, None — неизвестно (проверять честно).
+    """
+    if isinstance(handler, CommandHandler):
+        return frozenset()  # Тексты кнопок не начинаются с '/'
+    if isinstance(handler, MessageHandler):
+        return _filter_texts(handler.filters)
+    if isinstance(handler, ConversationHandler):
+        if handler.per_message:
+            return frozenset()  # Такие диалоги живут только на callback_query
+        texts = set()
+        for entry_point in handler.entry_points:
+            entry_texts = _handler_texts(entry_point)
+            if entry_texts is None:
+                return None
+            texts |= entry_texts
+        return frozenset(texts)
+    return None
+
+
+# === Таблица маршрутов ===
+
+def _make_fingerprint(application: Application) -> Tuple[Tuple[int, int], ...]:
+    return tuple((group, len(handlers)) for group, handlers in application.handlers.items())
+
+
+def build_routes(application: Application) -> None:
+    """Перестраивает таблицу по текущим обработчикам приложения"""
+    global _routes, _fingerprint
+
+    groups = []
+    conversation_handlers = []
+    for group in sorted(application.handlers):
+        if group <= ROUTER_GROUP:
+            continue
+        analyzed = []
+        for handler in application.handlers[group]:
+            if isinstance(handler, ConversationHandler):
+                conversation_handlers.append(handler)
+            analyzed.append((handler, _handler_texts(handler)))
+        groups.append(analyzed)
+
+    all_texts = set()
+    for analyzed in groups:
+        for _, texts in analyzed:
+            if texts:
+                all_texts |= texts
+
+    routes: Dict[str, RoutePlan] = {}
+    for text in all_texts:
+        plan: RoutePlan = []
+        for analyzed in groups:
+            candidates, definite = [], False
+            for handler, texts in analyzed:
+                if texts is None:
+                    candidates.append(handler)
+                elif text in texts:
+                    candidates.append(handler)
+                    definite = True
+                    break  # Дальше в группе очередь не дойдёт
+            if candidates:
+                plan.append((candidates, definite))
+        routes[text] = plan
+
+    if track_conversations(application) < len(conversation_handlers):
+        # Без индекса нельзя понять, что пользователь в диалоге — быстрый путь выключаем
+        logger.warning("⚠️ Не все диалоги индексируются — фронт-контроллер кнопок отключён")
+        routes = {}
+
+    _routes = routes
+    _fingerprint = _make_fingerprint(application)
+    _stats["builds"] += 1
+    logger.info(
+        f"🧭 Таблица кнопок: {len(routes)} текстов, "
+        f"{len(conversation_handlers)} диалогов"
+    )
+
+
+# === Фронт-контроллер ===
+
+async def route_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Кнопка из таблицы и пользователь вне диалогов — вызываем обработчики напрямую
+    и останавливаем цепочку. Иначе — ничего не делаем, PTB обработает как обычно.
+    """
+    application = context.application
+    if _fingerprint != _make_fingerprint(application):
+        build_routes(application)
+
+    plan = _routes.get(update.message.text)
+    if plan is None:
+        _stats["missed"] += 1
+        return
+    if has_conversations(update.effective_user.id):
+        _stats["in_conversation"] += 1
+        return
+
+    targets = []
+    for candidates, definite in plan:
+        for handler in candidates:
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                targets.append((handler, check))
+                break
+        else:
+            if definite:
+                # Таблица разошлась с обработчиками — пусть решает PTB
+                _stats["fallbacks"] += 1
+                logger.debug(f"🧭 Кнопка '{update.message.text}' не совпала с таблицей — обычная обработка")
+                return
+
+    _stats["routed"] += 1
+    for handler, check in targets:
+        try:
+            coroutine = handler.handle_update(update, application, check, context)
+            if handler.block is False:
+                application.create_task(coroutine, update=update)
+            else:
+                await coroutine
+        except ApplicationHandlerStop:
+            break
+        except Exception as exc:
+            # Как в Application.process_update: ошибка одного обработчика не мешает следующим группам
+            if await application.process_error(update=update, error=exc):
+                break
+
+    raise ApplicationHandlerStop
+
+
+def get_router_stats() -> Dict[str, int]:
+    return {**_stats, "buttons": len(_routes)}
+
+
+def register_router(application: Application) -> None:
+    """Регистрирует фронт-контроллер кнопок в group=-1 — после автозапуска (group=-2)"""
+    application.add_handler(
+        MessageHandler(
+            filters.ChatType.PRIVATE & filters.UpdateType.MESSAGE & filters.TEXT & ~filters.COMMAND,
+            route_button
+        ),
+        group=ROUTER_GROUP
+    )
+    logger.info(f"✅ Фронт-контроллер кнопок активирован (group={ROUTER_GROUP})")
@@ -2,16 +2,16 @@
 🚀 Автоматический /start при первом взаимодействии после перезапуска
 ✅ Срабатывает на ЛЮБОЕ текстовое сообщение (включая кнопки)
 ✅ Не мешает дальнейшей обработке — например, catalog_handler сам обработает '🐔 Каталог'
-✅ Принудительно завершает все активные диалоги
+✅ Принудительно завершает все активные диалоги — через индекс user_id → диалоги, без обхода всех обработчиков
 ✅ Очищает временные данные пользователя
 ✅ Отправляет главное меню
-✅ Работает ДО всех других обработчиков (group=-1)
+✅ Работает ДО всех других обработчиков (group=-2), в том числе до фронт-контроллера кнопок
 
 💡 Использование:
 - Пользователь пишет "Привет", "Тест", "⬅️ Назад", "✅ Подтвердить" — всё подходит
 - Бот отправляет приветствие и клавиатуру
 - Все старые диалоги сбрасываются
-- Повторные сообщения не вызывают реакцию
+- Повторные сообщения не вызывают реакцию (utils.restart_epoch — компактный учёт, а не словарь в bot_data)
 """
 
 from telegram import Update
@@ -20,16 +20,15 @@ import logging
 
 # Импортируем только get_main_keyboard — остальное не нужно
 from config.buttons import get_main_keyboard
+from utils.conversation_index import reset_user_conversations
+from utils.restart_epoch import mark_seen
 
 logger = logging.getLogger(__name__)
 
-# 🔑 Ключ для отслеживания активации после перезапуска
-FIRST_INTERACTION_KEY = "auto_start_done"
-
 
 async def auto_start_if_needed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Выполняется первым (group=-1).
+    Выполняется первым (group=-2).
     Если пользователь ещё не активен после перезапуска —
     сбрасывает состояние и возвращает в главное меню.
     ВАЖНО: НЕ останавливает цепочку обработки!
@@ -37,20 +36,8 @@ async def auto_start_if_needed(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.effective_user.id
     username = update.effective_user.username or "N/A"
 
-    # --- 1. Проверяем, есть ли доступ к bot_data ---
-    if not context.application.bot_data:
-        logger.warning("⚠️ bot_data недоступен — невозможно отслеживать автозапуск")
-        return
-
-    # --- 2. Инициализируем хранилище активаций ---
-    try:
-        auto_start_done = context.application.bot_data.setdefault(FIRST_INTERACTION_KEY, {})
-    except Exception as e:
-        logger.error(f"❌ Ошибка инициализации {FIRST_INTERACTION_KEY}: {e}")
-        return
-
-    # --- 3. Проверяем, уже ли активировался пользователь ---
-    if user_id in auto_start_done:
+    # --- 1. Проверяем и отмечаем пользователя в текущей эпохе перезапуска ---
+    if not mark_seen(user_id):
         logger.debug(f"⏭️ Пользователь {user_id} (@{username}) уже прошёл автозапуск — выходим")
         return
 
@@ -61,38 +48,15 @@ async def auto_start_if_needed(update: Update, context: ContextTypes.DEFAULT_TYP
         f"(@{username}) через '{text}'"
     )
 
-    # --- 4. Отмечаем, что автозапуск выполнен ---
-    try:
-        auto_start_done[user_id] = True
-    except Exception as e:
-        logger.error(f"❌ Не удалось отметить автозапуск для {user_id}: {e}")
-        return
-
-    # --- 5. Принудительно завершаем ВСЕ активные диалоги ---
+    # --- 2. Принудительно завершаем ВСЕ активные диалоги (по индексу — только свои) ---
     try:
-        for group_id, handler_group in context.application.handlers.items():
-            for handler in handler_group:
-                conv = getattr(handler, 'conversations', None)
-                if not isinstance(conv, dict):
-                    continue  # Пропускаем, если нет словаря диалогов
-                try:
-                    keys_to_delete = []
-                    for key in list(conv.keys()):  # копируем ключи
-                        if (isinstance(key, tuple) and user_id in key) or key == user_id:
-                            keys_to_delete.append(key)
-                    # Удаляем
-                    for key in keys_to_delete:
-                        logger.debug(
-                            f"🛑 Прерван диалог {getattr(handler, 'name', 'unknown')} "
-                            f"(group={group_id}) для пользователя {user_id}"
-                        )
-                        del conv[key]
-                except Exception as e:
-                    logger.warning(f"⚠️ Не удалось очистить диалог у {handler}: {e}")
+        interrupted = reset_user_conversations(user_id)
+        if interrupted:
+            logger.debug(f"🛑 Прервано диалогов пользователя {user_id}: {interrupted}")
     except Exception as e:
-        logger.error(f"❌ Ошибка при обходе handlers: {e}")
+        logger.error(f"❌ Ошибка при сбросе диалогов {user_id}: {e}")
 
-    # --- 6. Очищаем user_data от известных временных ключей ---
+    # --- 3. Очищаем user_data от известных временных ключей ---
     keys_to_clear = {
         # Ключи клиентских диалогов
         "awaiting_action", "dialog_state", "in_active_dialog",
@@ -121,7 +85,7 @@ async def auto_start_if_needed(update: Update, context: ContextTypes.DEFAULT_TYP
     if cleared_keys:
         logger.debug(f"🧹 Очищены ключи user_data: {cleared_keys}")
 
-    # --- 7. Отправляем приветствие и главное меню ---
+    # --- 4. Отправляем приветствие и главное меню ---
     try:
         await update.message.reply_text(
             "👋 Бот был перезапущен.\n\n"
@@ -133,7 +97,7 @@ async def auto_start_if_needed(update: Update, context: ContextTypes.DEFAULT_TYP
     except Exception as e:
         logger.error(f"❌ Не удалось отправить главное меню {user_id}: {e}")
 
-    # --- 8. Логируем событие ---
+    # --- 5. Логируем событие ---
     logger.info(f"[LOG] User {user_id} - Автоматический старт после перезапуска")
 
     # ❗ ВАЖНО: НЕ останавливаем цепочку!
@@ -142,7 +106,7 @@ async def auto_start_if_needed(update: Update, context: ContextTypes.DEFAULT_TYP
 
 def register_startup_handler(application: Application):
     """
-    Регистрирует обработчик автозапуска в группе -1 (высший приоритет).
+    Регистрирует обработчик автозапуска в группе -2 (высший приоритет).
     Выполняется ДО всех других обработчиков.
     """
     application.add_handler(
@@ -150,6 +114,6 @@ def register_startup_handler(application: Application):
             filters.ChatType.PRIVATE & filters.TEXT,
             callback=auto_start_if_needed
         ),
-        group=-1
+        group=-2
     )
-    logger.info("✅ Обработчик автозапуска активирован (group=-1)")
+    logger.info("✅ Обработчик автозапуска активирован (group=-2)")
@@ -2,7 +2,9 @@
 🚀 Основной файл запуска бота — v4.9.9 (production-ready + test mode + startup fix)
 ✅ Полная поддержка админ-панели
 ✅ Группы обработчиков:
-   - group=-1 — автозапуск (первым!)
+   - group=-3 — отметка активности для очистки user_data (utils/data_sweeper.py)
+   - group=-2 — автозапуск (первым!)
+   - group=-1 — фронт-контроллер кнопок (handlers/router.py)
    - group=0  — админ-команды
    - group=1  — клиентские диалоги
    - group=2  — админские диалоги
@@ -89,6 +91,9 @@ from utils.messaging import (
 )
 from utils.archive import auto_archive_old_stocks
 from utils.reminder_reporter import send_unconfirmed_orders_report
+from utils.restart_epoch import get_epoch_stats
+from utils.data_sweeper import get_sweeper_stats
+from utils.send_queue import send_queue
 
 
 # --- Глобальный обработчик ошибок ---
@@ -124,12 +129,44 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     start_time = context.application.bot_data.get("start_time")
     uptime = str(datetime.now() - start_time).split(".")[0] if start_time else "Неизвестно"
     db_status = "✅ Подключена"
+    db = context.application.bot_data.get("db")
+    wal_line = ""
+    if db and hasattr(db, "get_checkpoint_stats"):
+        cp = db.get_checkpoint_stats()
+        wal_line = (
+            f"🧾 WAL: <code>{cp['wal_bytes'] // 1024} КБ</code>, "
+            f"чекпоинтов: {cp['passive_runs']} (busy: {cp['busy']})\n"
+        )
+    epoch = get_epoch_stats()
+    sweeper = get_sweeper_stats()
+    limiter_line = ""
+    limiter = getattr(context.bot, "rate_limiter", None)
+    if limiter and hasattr(limiter, "get_stats"):
+        rl = limiter.get_stats()
+        limiter_line = (
+            f"🚦 Отправки: {rl['requests']}, ждали очереди: {rl['delayed']} "
+            f"(макс. {rl['max_wait_s']:.1f} с), flood-пауз: {rl['flood_waits']}, "
+            f"сетевых повторов: {rl['network_retries']}\n"
+        )
+    queue = send_queue.get_stats()
+    queue_line = (
+        f"📮 Очередь отправки: {queue['pending']} ждут "
+        f"(напоминания {queue['reminder']['sent']}, рассылка {queue['bulk']['sent']})\n"
+    )
     text = (
         "🔧 <b>Статус бота</b>\n\n"
         f"🟢 Состояние: <b>Работает</b>\n"
         f"📦 Версия: <code>{BOT_VERSION}</code>\n"
         f"⏱ Аптайм: <code>{uptime}</code>\n"
         f"🗄 База данных: {db_status}\n"
+        f"{wal_line}"
+        f"👥 Писали после перезапуска: <code>{epoch['seen']}</code> "
+        f"({epoch['bytes'] // 1024} КБ)\n"
+        f"🧹 user_data: {len(context.application.user_data)} польз., "
+        f"освобождено {sweeper['bytes_reclaimed'] // 1024} КБ "
+        f"(удалено {sweeper['users_evicted']}, урезано ключей {sweeper['keys_trimmed']})\n"
+        f"{limiter_line}"
+        f"{queue_line}"
         f"📅 Запущен: <code>{start_time.strftime('%d.%m.%Y %H:%M:%S') if start_time else '—'}</code>"
     )
     await safe_reply(update, context, text, parse_mode="HTML", disable_cooldown=True)
@@ -191,20 +228,15 @@ async def checkstocks_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             s.id, s.breed, s.incubator, s.date, s.quantity, s.available_quantity,
             COALESCE(SUM(o.quantity), 0) AS total_ordered
         FROM stocks s
-        LEFT JOIN orders o ON s.id = o.stock_id AND o.status IN ('pending', 'active')
+        LEFT JOIN orders o ON s.id = o.stock_id AND o.status IN ('pending', 'active', 'issued')
         WHERE s.status = 'active'
         GROUP BY s.id
         ORDER BY s.date, s.breed
     """
     try:
-        rows = await db.execute_read(query)
-        if not rows:
-            await safe_reply(update, context, "📭 Нет активных партий.", disable_cooldown=True)
-            return
-
         report_lines = ["📋 <b>Состояние партий</b> (сравнение с заказами)\n"]
 
-        for row in rows:
+        async for row in db.execute_stream(query):
             correct_avail = row['quantity'] - row['total_ordered']
             current_avail = row['available_quantity']
             incubator_text = f" | 🏢 {row['incubator']}" if row['incubator'] else ""
@@ -217,6 +249,10 @@ async def checkstocks_command(update: Update, context: ContextTypes.DEFAULT_TYPE
                 f"   🟢 Доступно: {current_avail} шт (должно быть: {correct_avail})"
             )
 
+        if len(report_lines) == 1:
+            await safe_reply(update, context, "📭 Нет активных партий.", disable_cooldown=True)
+            return
+
         await safe_reply(
             update, context,
             "\n".join(report_lines),
@@ -233,6 +269,7 @@ async def checkstocks_command(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def post_init(application: Application):
     from config.buttons import get_main_keyboard
     from database.repository import init_db
+    from database.inventory import inventory
 
     logger.info("🔄 Начало инициализации post_init...")
 
@@ -246,52 +283,26 @@ async def post_init(application: Application):
         raise
 
     # === 1.1 Проверка и исправление available_quantity ===
-    async def check_and_fix_stock_consistency():
-        logger.info("🔍 Проверка согласованности available_quantity по всем партиям...")
+    async def check_and_fix_stock_consistency(context=None):
+        """Сверка остатков: только партии, затронутые с прошлого запуска (журнал stock_movements)"""
+        logger.info("🔍 Проверка согласованности available_quantity по затронутым партиям...")
         try:
-            query = """
-                SELECT 
-                    s.id,
-                    s.quantity,
-                    s.available_quantity,
-                    COALESCE(SUM(o.quantity), 0) AS total_ordered
-                FROM stocks s
-                LEFT JOIN orders o ON s.id = o.stock_id AND o.status IN ('pending', 'active')
-                WHERE s.status = 'active'
-                GROUP BY s.id
-            """
-            rows = await db.execute_read(query)
-
-            fixes = []
-            for row in rows:
-                correct_avail = row['quantity'] - row['total_ordered']
-                current_avail = row['available_quantity']
-
-                if abs(current_avail - correct_avail) > 0:
-                    logger.warning(
-                        f"⚠️ Расхождение в stock_id={row['id']}: "
-                        f"available={current_avail}, должно быть {correct_avail}"
-                    )
-                    fixes.append((correct_avail, row['id']))
+            result = await db.verify_stock_consistency()
+            fixes = result["mismatches"]
 
-            if fixes:
-                logger.info(f"🔧 Применяем исправления к {len(fixes)} партиям...")
-                for avail, stock_id in fixes:
-                    success = await db.execute_write(
-                        "UPDATE stocks SET available_quantity = ? WHERE id = ?",
-                        (avail, stock_id)
-                    )
-                    if success:
-                        logger.info(f"✅ Исправлено: stock_id={stock_id}, available_quantity = {avail}")
-                    else:
-                        logger.error(f"❌ Не удалось обновить stock_id={stock_id}")
+            for m in fixes:
+                logger.warning(
+                    f"⚠️ Расхождение в stock_id={m['id']}: "
+                    f"available={m['available']}, должно быть {m['expected']} — исправлено"
+                )
 
+            if fixes:
                 if DEVOPS_CHAT_ID:
                     fix_report = (
                         "🔧 <b>Автоисправление данных</b>\n"
                         f"📦 Исправлено <b>{len(fixes)}</b> партий\n"
                         "⚙️ Причина: расхождение между available_quantity и реальными заказами.\n"
-                        "📅 Это могло произойти из-за сбоя при создании заказов."
+                        "📅 Это могло произойти из-за ручной правки БД в обход триггеров."
                     )
                     try:
                         await application.bot.send_message(
@@ -303,7 +314,10 @@ async def post_init(application: Application):
                     except Exception as e:
                         logger.error(f"❌ Не удалось отправить уведомление об исправлении: {e}")
             else:
-                logger.info("🟢 Все значения available_quantity согласованы — исправления не требуются.")
+                logger.info(
+                    f"🟢 Проверено партий: {result['checked']} — "
+                    "все значения available_quantity согласованы, исправления не требуются."
+                )
 
         except Exception as e:
             logger.error(f"❌ Ошибка при проверке согласованности партий: {e}", exc_info=True)
@@ -315,20 +329,14 @@ async def post_init(application: Application):
     os.makedirs("exports", exist_ok=True)
     logger.info("📁 Папка 'exports' создана/проверена")
 
-    # === 3. Загрузка доступных пород ===
+    # === 3. Загрузка доступных пород (заодно прогреваем снимок остатков каталога) ===
     try:
-        result = await db.execute_read("""
-            SELECT DISTINCT breed
-            FROM stocks
-            WHERE available_quantity > 0 AND status = 'active'
-        """)
-        available_breeds = sorted({row[0] for row in result}) if result else []
+        available_breeds = await inventory.breeds()
     except Exception as e:
         logger.error(f"❌ Ошибка загрузки пород: {e}")
         available_breeds = []
       
     # === 4. Инициализация флагов ===
-    application.bot_data.setdefault("auto_start_done", {})
     application.bot_data["ADMIN_PASSWORD"] = ADMIN_PASSWORD
     application.bot_data["DEVOPS_CHAT_ID"] = DEVOPS_CHAT_ID
     application.bot_data["BOT_VERSION"] = BOT_VERSION
@@ -339,16 +347,13 @@ async def post_init(application: Application):
         logger.info(f"🧹 Удалён устаревший started_users: {old_count} пользователей")
         del application.bot_data["started_users"]
 
-    # === 6. Принудительная очистка всех активных диалогов ===
-    cleared_handlers = 0
-    for group_id, handler_group in application.handlers.items():
-        for handler in handler_group:
-            if hasattr(handler, 'conversations') and isinstance(handler.conversations, dict):
-                if handler.conversations:
-                    logger.debug(f"🧹 Очищен словарь диалогов у {getattr(handler, 'name', 'unnamed')} (group={group_id})")
-                handler.conversations.clear()
-                cleared_handlers += 1
-    logger.info(f"✅ Принудительно очищено {cleared_handlers} словарей диалогов")
+    # === 6. Индекс активных диалогов (persistent=False — после запуска диалогов нет, чистить нечего) ===
+    try:
+        from utils.conversation_index import track_conversations
+        tracked = track_conversations(application)
+        logger.info(f"✅ Индекс диалогов подключён к {tracked} ConversationHandler")
+    except Exception as e:
+        logger.error(f"❌ Ошибка подключения индекса диалогов: {e}", exc_info=True)
 
     # === 7. Регистрация /start и /back ПОСЛЕ инициализации ===
     try:
@@ -431,11 +436,36 @@ async def post_init(application: Application):
     except Exception as e:
         logger.error(f"❌ Ошибка при настройке автобэкапа: {e}", exc_info=True)
 
+    # === 13. Очистка user_data/chat_data неактивных пользователей ===
+    try:
+        from utils.data_sweeper import setup_sweeper_job
+        setup_sweeper_job(application)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при настройке очистки user_data: {e}", exc_info=True)
+
+    # === 14. Продолжение рассылок, прерванных перезапуском ===
+    try:
+        from utils.broadcast_runner import resume_broadcasts
+        await resume_broadcasts(application)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при возобновлении рассылок: {e}", exc_info=True)
+
     logger.info("✅ Готов к работе. Никаких автоматических сообщений не отправлено.")
 
 
 # --- Завершение работы ---
 async def post_shutdown(application: Application):
+    try:
+        from utils.broadcast_runner import shutdown_broadcasts
+        await shutdown_broadcasts()
+    except Exception as e:
+        logger.error(f"❌ Ошибка при остановке рассылок: {e}", exc_info=True)
+
+    try:
+        await send_queue.shutdown()
+    except Exception as e:
+        logger.error(f"❌ Ошибка при остановке очереди отправки: {e}", exc_info=True)
+
     try:
         from database.repository import db
         if hasattr(db, "close"):
@@ -449,18 +479,32 @@ async def post_shutdown(application: Application):
 def register_handlers(application: Application):
     logger.info("🔧 Регистрация всех обработчиков...")
 
-    # === 1. АВТОЗАПУСК — ДО ВСЕХ ОСТАЛЬНЫХ ОБРАБОТЧИКОВ (group=-1) ===
+    # === 0. ОТМЕТКА АКТИВНОСТИ ДЛЯ ОЧИСТКИ user_data (group=-3) ===
+    try:
+        from utils.data_sweeper import register_activity_tracker
+        register_activity_tracker(application)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при регистрации отметки активности: {e}", exc_info=True)
+
+    # === 1. АВТОЗАПУСК — ДО ВСЕХ ОСТАЛЬНЫХ ОБРАБОТЧИКОВ (group=-2) ===
     try:
         from handlers.startup import register_startup_handler
         logger.debug("📌 Регистрация auto_start_handler (должна быть первой!)")
         register_startup_handler(application)
         if DEBUG:
-            logger.info("✅ Автоматический /start активирован (group=-1)")
+            logger.info("✅ Автоматический /start активирован (group=-2)")
         else:
             logger.debug("✅ Автоматический /start активирован")
     except Exception as e:
         logger.error(f"❌ Ошибка при регистрации автозапуска: {e}", exc_info=True)
 
+    # === 1.1 ФРОНТ-КОНТРОЛЛЕР КНОПОК (group=-1) — таблица строится при первом нажатии ===
+    try:
+        from handlers.router import register_router
+        register_router(application)
+    except Exception as e:
+        logger.error(f"❌ Ошибка при регистрации фронт-контроллера кнопок: {e}", exc_info=True)
+
     # === 2. Админ-команды ===
     try:
         from handlers.admin.main import register_admin_handlers
@@ -575,6 +619,7 @@ def register_handlers(application: Application):
 # ================== УПРОЩЁННЫЙ ЗАПУСК ==================
 if __name__ == "__main__":
     from telegram.request import HTTPXRequest
+    from utils.safe_send import OutboundRateLimiter
 
     request = HTTPXRequest(
         connect_timeout=20.0,
@@ -587,6 +632,7 @@ if __name__ == "__main__":
         ApplicationBuilder()
         .token(TOKEN)
         .request(request)
+        .rate_limiter(OutboundRateLimiter())
         .post_init(post_init)
         .post_shutdown(post_shutdown)
         .build()
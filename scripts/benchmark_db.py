@@ -0,0 +1,375 @@
+# scripts/benchmark_db.py
+"""
+Замеры производительности БД: публичные методы DB и «сырой» SQL отчётов.
+Запуск:
+    python scripts/generate_dataset.py --db bench.sqlite
+    python scripts/benchmark_db.py --db bench.sqlite [--repeat 5] [--label "до индексов"]
+    python scripts/benchmark_db.py --db bench.sqlite --compare benchmarks/<прошлый>.json
+
+✅ Работает на временной копии БД — исходный файл не меняется
+✅ Все публичные async-методы DB; непокрытые перечисляются в отчёте
+✅ SELECT-запросы из handlers/admin/stats, utils/messaging, utils/archive + потоковая выгрузка export
+✅ Параметры подставляются из реальных данных (самый загруженный день, пользователь, партия)
+✅ Результат — JSON в benchmarks/ с коммитом и версией SQLite; --compare показывает разницу
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from check_query_plans import collect_queries  # noqa: E402
+from database.repository import DB, normalize_sql  # noqa: E402
+
+# Откуда берём «сырой» SQL для замеров
+RAW_SQL_SOURCES = ("handlers/admin/stats/", "utils/messaging.py", "utils/archive.py", "handlers/admin/export.py")
+
+# Инфраструктура, а не бизнес-методы — меряется косвенно через остальные
+INFRA_METHODS = {"connect", "close", "checkpoint", "execute_read", "execute_write", "execute_stream", "execute_transaction"}
+
+# Запросы export собираются f-строкой — воспроизводим как в handlers/admin/export.py
+STREAM_CASES = [
+    (
+        "handlers/admin/export.py: открытые заказы (stream)",
+        "SELECT id, breed, incubator, date, quantity, price, phone, status, created_at "
+        "FROM orders WHERE status NOT IN (?, ?) ORDER BY date, created_at DESC",
+        ("issued", "cancelled"),
+    ),
+]
+
+# Какой образец подставить вместо ? — по тексту прямо перед ним
+PARAM_RULES = [
+    (re.compile(r"strftime\([^)]*\)\s*=\s*$", re.IGNORECASE), "year"),
+    (re.compile(r"LIKE\s*$", re.IGNORECASE), "like"),
+    (re.compile(r"(created_at\s*(=|>=|<=|<|>)|DATE\()\s*$", re.IGNORECASE), "day"),
+    (re.compile(r"\bdate\s*(=|>=|<=|<|>)\s*$", re.IGNORECASE), "delivery_date"),
+    (re.compile(r"\buser_id\s*=\s*$", re.IGNORECASE), "user_id"),
+    (re.compile(r"\bphone\s*=\s*$", re.IGNORECASE), "phone"),
+    (re.compile(r"\bstock_id\s*=\s*$", re.IGNORECASE), "stock_id"),
+    (re.compile(r"\bbreed\s*=\s*$", re.IGNORECASE), "breed"),
+    (re.compile(r"\bincubator\s*=\s*$", re.IGNORECASE), "incubator"),
+    (re.compile(r"\bstatus\s*=\s*$", re.IGNORECASE), "status"),
+    (re.compile(r"\bid\s*=\s*$", re.IGNORECASE), "id"),
+]
+
+BENCH_USER_ID = 999_000_001
+BENCH_PHONE = "+70000000001"
+
+
+def bind_params(query: str, samples: dict):
+    """Подбирает параметры для ? по правилам PARAM_RULES; None — если не удалось"""
+    params = []
+    for match in re.finditer(r"\?", query):
+        before = query[max(0, match.start() - 80):match.start()]
+        for rule, key in PARAM_RULES:
+            if rule.search(before):
+                if key == "id":
+                    key = "stock_id" if re.search(r"\bFROM\s+stocks\b", query, re.IGNORECASE) else "order_id"
+                params.append(samples[key])
+                break
+        else:
+            return None
+    return tuple(params)
+
+
+async def pick_samples(db: DB) -> dict:
+    """Образцы параметров из самой нагруженной части данных"""
+    async def one(query, params=()):
+        rows = await db.execute_read(query, params)
+        return rows[0] if rows else None
+
+    user = await one(
+        "SELECT user_id, phone FROM orders WHERE status IN ('pending', 'active') "
+        "GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ) or await one("SELECT user_id, phone FROM orders LIMIT 1")
+    stock = await one(
+        "SELECT id, breed, incubator, date, price FROM stocks WHERE status = 'active' "
+        "ORDER BY available_quantity DESC LIMIT 1"
+    ) or await one("SELECT id, breed, incubator, date, price FROM stocks LIMIT 1")
+    delivery = await one(
+        "SELECT date FROM orders WHERE status IN ('pending', 'active') GROUP BY date ORDER BY COUNT(*) DESC LIMIT 1"
+    ) or await one("SELECT date FROM orders GROUP BY date ORDER BY COUNT(*) DESC LIMIT 1")
+    day = await one("SELECT substr(created_at, 1, 10) FROM orders GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1")
+    order = await one("SELECT id FROM orders WHERE status IN ('pending', 'active') LIMIT 1") or await one(
+        "SELECT id FROM orders LIMIT 1"
+    )
+    admin = await one("SELECT user_id FROM admins LIMIT 1")
+
+    if not (user and stock and delivery and day and order):
+        raise RuntimeError("БД пуста — сначала запустите scripts/generate_dataset.py")
+
+    return {
+        "user_id": user[0],
+        "phone": user[1],
+        "stock_id": stock[0],
+        "breed": stock[1],
+        "incubator": stock[2],
+        "stock_date": stock[3],
+        "price": stock[4],
+        "delivery_date": delivery[0],
+        "day": day[0],
+        "year": day[0][:4],
+        "order_id": order[0],
+        "admin_id": admin[0] if admin else BENCH_USER_ID,
+        "status": "active",
+        "like": "%79%",
+    }
+
+
+def method_cases(db: DB, s: dict):
+    """(метод, вызов) для каждого публичного метода DB"""
+    promo = {}
+
+    async def add_promotion():
+        await db.add_promotion("Бенчмарк", "Замер", start_date=s["day"], end_date=s["delivery_date"])
+        rows = await db.execute_read("SELECT MAX(id) FROM promotions")
+        promo["id"] = rows[0][0]
+
+    return [
+        ("is_admin", lambda: db.is_admin(s["admin_id"])),
+        ("add_admin", lambda: db.add_admin(BENCH_USER_ID, s["admin_id"])),
+        ("get_all_admins", lambda: db.get_all_admins()),
+        ("remove_admin", lambda: db.remove_admin(BENCH_USER_ID)),
+        ("is_phone_blocked", lambda: db.is_phone_blocked(s["phone"])),
+        ("block_phone", lambda: db.block_phone(BENCH_PHONE, "benchmark", 1)),
+        ("add_attempt", lambda: db.add_attempt(BENCH_PHONE)),
+        ("get_daily_attempts", lambda: db.get_daily_attempts(BENCH_PHONE)),
+        ("reset_attempt", lambda: db.reset_attempt(BENCH_PHONE)),
+        ("is_trusted_phone", lambda: db.is_trusted_phone(s["phone"])),
+        ("trust_phone", lambda: db.trust_phone(BENCH_PHONE, BENCH_USER_ID)),
+        ("get_trusted_phone_for_user", lambda: db.get_trusted_phone_for_user(s["user_id"])),
+        ("mark_phone_as_trusted", lambda: db.mark_phone_as_trusted(BENCH_PHONE, s["admin_id"], BENCH_USER_ID)),
+        ("unmark_trusted_phone", lambda: db.unmark_trusted_phone(BENCH_PHONE)),
+        ("get_stock_id", lambda: db.get_stock_id(s["breed"], s["incubator"], s["stock_date"])),
+        ("get_stock_by_id", lambda: db.get_stock_by_id(s["stock_id"])),
+        ("get_available_stocks", lambda: db.get_available_stocks()),
+        ("get_available_stocks(breed)", lambda: db.get_available_stocks(s["breed"])),
+        ("upsert_user", lambda: db.upsert_user(BENCH_USER_ID, "Бенчмарк", None, BENCH_PHONE)),
+        ("reserve_and_create_order", lambda: db.reserve_and_create_order(
+            BENCH_USER_ID, BENCH_PHONE, 1, s["price"], s["breed"], s["stock_date"], s["incubator"],
+            stock_id=s["stock_id"])),
+        ("create_order", lambda: db.create_order(
+            BENCH_USER_ID, BENCH_PHONE, s["stock_id"], 1, s["price"], s["breed"], s["stock_date"],
+            s["incubator"], "Бенчмарк")),
+        ("get_orders_by_user", lambda: db.get_orders_by_user(s["user_id"])),
+        ("get_order_by_id", lambda: db.get_order_by_id(s["order_id"])),
+        ("get_active_promotions", lambda: db.get_active_promotions()),
+        ("get_all_promotions", lambda: db.get_all_promotions()),
+        ("add_promotion", add_promotion),
+        ("get_promotion_by_id", lambda: db.get_promotion_by_id(promo.get("id", 0))),
+        ("update_promotion", lambda: db.update_promotion(promo.get("id", 0), title="Бенчмарк 2")),
+        ("set_promotion_active", lambda: db.set_promotion_active(promo.get("id", 0), True)),
+        ("delete_promotion", lambda: db.delete_promotion(promo.get("id", 0))),
+    ]
+
+
+def sql_cases(samples: dict):
+    """SELECT-запросы из RAW_SQL_SOURCES с подобранными параметрами"""
+    static, _ = collect_queries(ROOT)
+    cases, skipped, seen = [], [], set()
+    for path, lineno, query in static:
+        source = path.as_posix()
+        if not source.startswith(RAW_SQL_SOURCES) or not re.match(r"\s*(SELECT|WITH)\b", query, re.IGNORECASE):
+            continue
+        key = normalize_sql(query)
+        if key in seen:
+            continue
+        seen.add(key)
+        params = bind_params(query, samples)
+        if params is None:
+            skipped.append(f"{source}:{lineno}")
+            continue
+        cases.append((f"{source}:{lineno}", query, params))
+    return cases, skipped
+
+
+def summarize(name: str, kind: str, timings: list, rows) -> dict:
+    ordered = sorted(timings)
+    return {
+        "name": name,
+        "kind": kind,
+        "runs": len(timings),
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max_ms": round(ordered[-1], 3),
+        "rows": rows,
+    }
+
+
+def _rows(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, bool) or result is None:
+        return None
+    return 1
+
+
+async def run(db_path: str, repeat: int) -> dict:
+    db = DB(db_path)
+    db.slow_query_ms = float("inf")  # без EXPLAIN в фоне — он искажает замеры
+    await db.connect()
+    try:
+        samples = await pick_samples(db)
+        results = []
+
+        # Методы: один прогон на прогрев, затем repeat замеров
+        cases = method_cases(db, samples)
+        for name, call in cases:
+            result = await call()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = await call()
+                timings.append((time.perf_counter() - started) * 1000)
+            results.append(summarize(name, "method", timings, _rows(result)))
+
+        # Сырой SQL — через execute_read, как в боте
+        raw_cases, skipped = sql_cases(samples)
+        for name, query, params in raw_cases:
+            await db.execute_read(query, params)
+            timings, rows = [], 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = len(await db.execute_read(query, params))
+                timings.append((time.perf_counter() - started) * 1000)
+            results.append(summarize(name, "sql", timings, rows))
+
+        for name, query, params in STREAM_CASES:
+            timings, rows = [], 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = 0
+                async for _row in db.execute_stream(query, params):
+                    rows += 1
+                timings.append((time.perf_counter() - started) * 1000)
+            results.append(summarize(name, "stream", timings, rows))
+
+        public = {
+            name for name, member in inspect.getmembers(DB, inspect.iscoroutinefunction)
+            if not name.startswith("_") and name not in INFRA_METHODS
+        }
+        covered = {name.split("(")[0] for name, _ in cases}
+        counts = {}
+        for table in ("users", "stocks", "orders", "user_actions"):
+            rows = await db.execute_read(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = rows[0][0] if rows else 0
+
+        return {
+            "results": results,
+            "uncovered_methods": sorted(public - covered),
+            "skipped_sql": skipped,
+            "dataset": counts,
+            "statements": db.get_query_stats(limit=20),
+        }
+    finally:
+        await db.close()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path: str, report: dict, threshold: float = 0.2):
+    """Печатает разницу медиан с прошлым прогоном; регрессии больше threshold помечаются"""
+    with open(old_path, encoding="utf-8") as f:
+        old = {r["name"]: r for r in json.load(f)["results"]}
+    print(f"\n📈 Сравнение с {old_path}:")
+    for r in report["results"]:
+        before = old.get(r["name"])
+        if not before:
+            print(f"   🆕 {r['name']}: {r['median_ms']:.2f} мс")
+            continue
+        base = before["median_ms"] or 0.001
+        delta = (r["median_ms"] - base) / base
+        mark = "🔴" if delta > threshold else "🟢" if delta < -threshold else "⚪"
+        print(f"   {mark} {r['name']}: {base:.2f} → {r['median_ms']:.2f} мс ({delta:+.0%})")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Замеры публичных методов DB и SQL отчётов")
+    parser.add_argument("--db", required=True, help="БД для замеров (см. scripts/generate_dataset.py)")
+    parser.add_argument("--repeat", type=int, default=5, help="Сколько замеров на случай")
+    parser.add_argument("--label", default="", help="Подпись прогона в JSON")
+    parser.add_argument("--out", help="Куда сохранить JSON (по умолчанию benchmarks/<время>_<коммит>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if not os.path.exists(args.db):
+        print(f"❌ Нет файла {args.db}")
+        return 1
+
+    commit = _git_commit()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Копия через backup API — корректно и для БД в режиме WAL
+        work_path = os.path.join(tmp, "bench.sqlite")
+        src, dst = sqlite3.connect(args.db), sqlite3.connect(work_path)
+        src.backup(dst)
+        src.close()
+        dst.close()
+
+        started = time.perf_counter()
+        data = asyncio.run(run(work_path, max(1, args.repeat)))
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "label": args.label,
+            "db": os.path.abspath(args.db),
+            "repeat": args.repeat,
+            "sqlite_version": sqlite3.sqlite_version,
+            "python": platform.python_version(),
+            "elapsed_s": round(elapsed, 2),
+            "dataset": data["dataset"],
+        },
+        "results": data["results"],
+        "uncovered_methods": data["uncovered_methods"],
+        "skipped_sql": data["skipped_sql"],
+        "statements": data["statements"],
+    }
+
+    out = args.out or os.path.join(
+        ROOT, "benchmarks", f"{datetime.now():%Y%m%d_%H%M%S}_{commit or 'nogit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ {len(report['results'])} замеров за {elapsed:.1f} с → {out}")
+    for r in sorted(report["results"], key=lambda r: r["median_ms"], reverse=True)[:15]:
+        print(f"   {r['median_ms']:9.2f} мс  p95 {r['p95_ms']:9.2f}  {r['name']}")
+    if report["uncovered_methods"]:
+        print(f"⚠️ Методы DB без замера: {', '.join(report['uncovered_methods'])}")
+    if report["skipped_sql"]:
+        print(f"⚠️ SQL без подобранных параметров: {', '.join(report['skipped_sql'])}")
+
+    if args.compare:
+        compare(args.compare, report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# scripts/check_query_plans.py
+"""
+Проверка планов запросов: EXPLAIN QUERY PLAN для каждой SQL-строки в коде бота.
+Запуск: python scripts/check_query_plans.py [--db путь] [--verbose]
+
+✅ SQL собирается из исходников (строковые литералы, начинающиеся с SELECT/INSERT/UPDATE/DELETE/WITH)
+✅ Схема — свежая БД, созданная DB.connect() со всеми миграциями (или --db с копией боевой)
+✅ Горячие запросы (таблицы orders / stocks) не должны падать в полный SCAN
+✅ Осознанные полные проходы перечислены в ALLOWED_SCANS с причиной
+✅ Код выхода 1 при регрессии — можно ставить в CI или pre-commit
+"""
+
+import argparse
+import ast
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from database.repository import DB, normalize_sql  # noqa: E402
+
+SKIP_DIRS = {"__pycache__", ".git", "scripts", "venv", ".venv"}
+SQL_START_RE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s", re.IGNORECASE)
+HOT_TABLES_RE = re.compile(r"\b(orders|stocks)\b", re.IGNORECASE)
+
+# Полный проход здесь ожидаем: агрегаты по всей истории и поиск подстроки
+ALLOWED_SCANS = {
+    "SELECT COUNT(*) FROM orders": "общее число заказов в /stats",
+    "SELECT COUNT(DISTINCT phone) FROM orders": "число клиентов за всё время в /stats",
+    "SELECT DISTINCT phone FROM orders WHERE phone LIKE ?": "поиск по подстроке номера",
+    "SELECT DISTINCT strftime(?, date) FROM orders WHERE date IS NOT NULL ORDER BY ? DESC": "список лет для годового отчёта",
+}
+
+
+def collect_queries(root: Path):
+    """
+    Возвращает (статические, динамические) SQL-строки как списки (файл, строка, sql).
+    f-строки проверить нельзя — они только перечисляются.
+    """
+    static, dynamic = [], []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for filename in filenames:
+            if not filename.endswith(".py"):
+                continue
+            path = Path(dirpath) / filename
+            try:
+                tree = ast.parse(path.read_text(encoding="utf-8"))
+            except (SyntaxError, UnicodeDecodeError):
+                continue
+            rel = path.relative_to(root)
+            # Куски f-строк — тоже Constant, но сами по себе не SQL
+            fragments = {
+                id(v) for n in ast.walk(tree) if isinstance(n, ast.JoinedStr) for v in n.values
+            }
+            for node in ast.walk(tree):
+                if id(node) in fragments:
+                    continue
+                if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                    if SQL_START_RE.match(node.value):
+                        static.append((rel, node.lineno, node.value))
+                elif isinstance(node, ast.JoinedStr):
+                    text = "".join(v.value if isinstance(v, ast.Constant) else "{}" for v in node.values)
+                    if SQL_START_RE.match(text):
+                        dynamic.append((rel, node.lineno, text))
+    return static, dynamic
+
+
+async def _prepare_schema(db_path: str):
+    """Создаёт/мигрирует схему штатным путём бота"""
+    db = DB(db_path, read_pool_size=0)
+    await db.connect()
+    await db.close()
+
+
+def explain(conn: sqlite3.Connection, query: str):
+    """План запроса; параметры подставляются как NULL — на выбор индекса это не влияет"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", [None] * query.count("?"))]
+
+
+def full_scans(plan):
+    """Строки плана с полным проходом таблицы или индекса"""
+    return [d for d in plan if d.startswith("SCAN ") and not d.startswith(("SCAN CONSTANT", "SCAN (subquery"))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN для всех SQL-запросов бота")
+    parser.add_argument("--db", help="Проверить на копии существующей БД (по умолчанию — свежая схема)")
+    parser.add_argument("--verbose", action="store_true", help="Печатать план каждого запроса")
+    args = parser.parse_args()
+
+    static, dynamic = collect_queries(ROOT)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, "plan_check.sqlite")
+        asyncio.run(_prepare_schema(db_path))
+        conn = sqlite3.connect(db_path)
+
+        checked, skipped, violations, seen = 0, [], [], set()
+        for path, lineno, query in static:
+            key = normalize_sql(query)
+            if key in seen:
+                continue
+            seen.add(key)
+            try:
+                plan = explain(conn, query)
+            except sqlite3.Error as e:
+                skipped.append((path, lineno, key, str(e)))
+                continue
+            checked += 1
+
+            scans = full_scans(plan)
+            hot = bool(HOT_TABLES_RE.search(query))
+            if args.verbose or (hot and scans):
+                print(f"{path}:{lineno}  {key[:110]}")
+                for detail in plan:
+                    print(f"    {detail}")
+                if hot and scans and key in ALLOWED_SCANS:
+                    print(f"    ✅ разрешено: {ALLOWED_SCANS[key]}")
+            if hot and scans and key not in ALLOWED_SCANS:
+                violations.append((path, lineno, key, scans))
+
+        conn.close()
+
+    print(f"\n📊 Проверено запросов: {checked}, пропущено: {len(skipped)}, f-строк: {len(dynamic)}")
+    if args.verbose:
+        for path, lineno, key, error in skipped:
+            print(f"   ⏭ {path}:{lineno} — {error}: {key[:80]}")
+        for path, lineno, text in dynamic:
+            print(f"   ⏭ {path}:{lineno} — f-строка: {normalize_sql(text)[:80]}")
+
+    if violations:
+        print(f"\n❌ Полный проход в горячих запросах: {len(violations)}")
+        for path, lineno, key, scans in violations:
+            print(f"   • {path}:{lineno} — {'; '.join(scans)}\n     {key[:150]}")
+        return 1
+
+    print("✅ Горячие запросы используют индексы")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
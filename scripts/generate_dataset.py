@@ -0,0 +1,231 @@
+# scripts/generate_dataset.py
+"""
+Генератор синтетической БД «как в проде» для нагрузочных замеров.
+Запуск: python scripts/generate_dataset.py --db bench.sqlite [--users 20000 --orders 200000 ...]
+
+✅ Схема создаётся штатно — DB.connect() со всеми миграциями
+✅ users, stocks, orders, user_actions (+ trusted_phones, admins, promotions)
+✅ Сезонность: пик продаж весной, партии и заказы распределены по месяцам
+✅ Прошлые партии — archived, заказы по ним — issued/cancelled; будущие — active, заказы pending/active
+✅ available_quantity выставляют триггеры БД при вставке заказов (партия не уходит в минус)
+✅ Детерминированно при одинаковом --seed
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config.buttons import BREEDS, INCUBATORS  # noqa: E402
+from database.repository import DB  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Вес месяца в продажах: цыплят берут весной и в начале лета
+MONTH_WEIGHTS = {1: 1, 2: 3, 3: 8, 4: 10, 5: 9, 6: 6, 7: 3, 8: 2, 9: 2, 10: 1, 11: 1, 12: 1}
+BASE_PRICE = {breed: 60 + 25 * i for i, breed in enumerate(BREEDS)}
+REMINDER_ACTIONS = ("reminder_sent_2_days", "reminder_sent_1_day", "confirmation_sent", "confirmed_order", "issue")
+FIRST_NAMES = ("Иван", "Мария", "Пётр", "Анна", "Сергей", "Ольга", "Алексей", "Наталья", "Дмитрий", "Елена")
+LAST_NAMES = ("Иванов", "Петрова", "Сидоров", "Кузнецова", "Смирнов", "Попова", "Васильев", "Новикова")
+
+
+def _seasonal_days(start: date, end: date):
+    """Все дни диапазона с весом сезона — для random.choices"""
+    days, weights = [], []
+    d = start
+    while d <= end:
+        days.append(d)
+        weights.append(MONTH_WEIGHTS[d.month])
+        d += timedelta(days=1)
+    return days, weights
+
+
+def generate(conn: sqlite3.Connection, args):
+    rnd = random.Random(args.seed)
+    today = date.today()
+    start = today - timedelta(days=365 * args.years)
+    end = today + timedelta(days=args.future_days)
+    days, weights = _seasonal_days(start, end)
+
+    # === Пользователи ===
+    users = []
+    for i in range(args.users):
+        user_id = 100_000_000 + i
+        phone = f"+79{rnd.randrange(10**9):09d}"
+        created = datetime.combine(rnd.choice(days[: max(1, len(days) - args.future_days)]), datetime.min.time())
+        last_active = created + timedelta(days=rnd.randint(0, 400))
+        users.append((
+            user_id,
+            f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}",
+            f"user{i}" if rnd.random() < 0.6 else None,
+            phone,
+            created.strftime("%Y-%m-%d %H:%M:%S"),
+            min(last_active, datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+        ))
+    conn.executemany(
+        "INSERT INTO users (user_id, full_name, username, phone, created_at, last_active) VALUES (?, ?, ?, ?, ?, ?)",
+        users
+    )
+
+    # === Партии: сезонные даты, уникальная тройка (порода, инкубатор, дата) ===
+    stock_keys = set()
+    while len(stock_keys) < args.stocks:
+        stock_keys.add((rnd.choice(BREEDS), rnd.choice(INCUBATORS), rnd.choices(days, weights)[0]))
+    stocks = []
+    for stock_id, (breed, incubator, stock_date) in enumerate(sorted(stock_keys, key=lambda k: k[2]), start=1):
+        # Будущие партии крупнее: на них копятся открытые заказы
+        quantity = rnd.randrange(200, 3000, 50) if stock_date < today else rnd.randrange(2000, 8000, 100)
+        price = BASE_PRICE[breed] + rnd.randint(-10, 15)
+        status = "archived" if stock_date < today else "active"
+        stocks.append([stock_id, breed, incubator, stock_date.isoformat(), quantity, quantity, price, status])
+
+    # === Заказы: на партию пропорционально её сезону, доля --open-share — на будущие ===
+    past = [s for s in stocks if s[7] == "archived"]
+    future = [s for s in stocks if s[7] == "active"]
+    past_weights = [MONTH_WEIGHTS[date.fromisoformat(s[3]).month] for s in past]
+    orders = []
+    for order_id in range(1, args.orders + 1):
+        if future and (not past or rnd.random() < args.open_share):
+            stock = rnd.choice(future)
+        else:
+            stock = rnd.choices(past, past_weights)[0]
+        stock_id, breed, incubator, stock_date_str, quantity, available, price, _ = stock
+        stock_date = date.fromisoformat(stock_date_str)
+        qty = rnd.choice((5, 10, 10, 15, 20, 20, 30, 50, 100))
+
+        if stock_date < today:
+            status = "issued" if rnd.random() < 0.82 else "cancelled"
+        else:
+            r = rnd.random()
+            status = "pending" if r < 0.35 else "active" if r < 0.95 else "cancelled"
+        # Выданные тоже держат остаток — CHECK (available_quantity >= 0) не даст перебрать
+        if status != "cancelled":
+            if available < qty:
+                status = "cancelled"
+            else:
+                stock[5] -= qty
+
+        created = datetime.combine(stock_date, datetime.min.time()) - timedelta(
+            days=rnd.randint(1, 45), seconds=rnd.randint(0, 86399)
+        )
+        user = rnd.choice(users)
+        by_admin = rnd.random() < 0.05
+        orders.append((
+            order_id, user[0], user[3], breed, stock_date_str, qty, price, stock_id, incubator, status,
+            created.strftime("%Y-%m-%d %H:%M:%S"), created.strftime("%Y-%m-%d %H:%M:%S"),
+            created.strftime("%Y-%m-%d %H:%M:%S") if status in ("active", "issued") else None,
+            user[1], user[3], int(by_admin),
+        ))
+
+    # Остаток — полный: резервы по заказам спишут триггеры stock_movements
+    conn.executemany(
+        "INSERT INTO stocks (id, breed, incubator, date, quantity, available_quantity, price, status) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(s[0], s[1], s[2], s[3], s[4], s[4], s[6], s[7]) for s in stocks]
+    )
+    conn.executemany(
+        "INSERT INTO orders (id, user_id, phone, breed, date, quantity, price, stock_id, incubator, status, "
+        "created_at, updated_at, confirmed_at, customer_name, customer_phone, created_by_admin) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        orders
+    )
+
+    # === Действия: напоминания и подтверждения по заказам ===
+    actions = []
+    for _ in range(args.actions):
+        order = rnd.choice(orders)
+        actions.append((order[1], rnd.choice(REMINDER_ACTIONS), order[0], order[10]))
+    conn.executemany(
+        "INSERT INTO user_actions (user_id, action, target_id, created_at) VALUES (?, ?, ?, ?)",
+        actions
+    )
+
+    # === Доверенные номера, админы, акции ===
+    trusted = rnd.sample(users, k=len(users) // 2)
+    conn.executemany(
+        "INSERT OR REPLACE INTO trusted_phones (phone, user_id, marked_by, marked_at, source) VALUES (?, ?, NULL, ?, 'auto')",
+        [(u[3], u[0], u[5]) for u in trusted]
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO admins (user_id, added_by, added_at) VALUES (?, NULL, datetime('now'))",
+        [(u[0],) for u in users[:3]]
+    )
+    promotions = []
+    for i in range(args.promotions):
+        promo_start = rnd.choice(days)
+        promotions.append((
+            f"Акция {i + 1}", "Скидка на суточных цыплят", None, int(rnd.random() < 0.3),
+            promo_start.isoformat(), (promo_start + timedelta(days=rnd.randint(7, 60))).isoformat(),
+        ))
+    conn.executemany(
+        "INSERT INTO promotions (title, description, image_url, is_active, start_date, end_date) VALUES (?, ?, ?, ?, ?, ?)",
+        promotions
+    )
+    conn.commit()
+
+
+async def _prepare_schema(db_path: str):
+    db = DB(db_path, read_pool_size=0)
+    await db.connect()
+    await db.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Синтетическая БД для замеров производительности")
+    parser.add_argument("--db", default="bench.sqlite", help="Куда записать БД (по умолчанию bench.sqlite)")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--stocks", type=int, default=3_000)
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--actions", type=int, default=150_000)
+    parser.add_argument("--promotions", type=int, default=50)
+    parser.add_argument("--open-share", type=float, default=0.02, help="Доля заказов на будущие партии (pending/active)")
+    parser.add_argument("--years", type=int, default=3, help="Глубина истории в годах")
+    parser.add_argument("--future-days", type=int, default=60, help="Сколько дней вперёд планировать партии")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="Перезаписать существующий файл")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    max_stocks = len(BREEDS) * len(INCUBATORS) * (365 * args.years + args.future_days)
+    if args.stocks > max_stocks:
+        print(f"❌ Слишком много партий: максимум {max_stocks} для {args.years} лет")
+        return 1
+    if os.path.exists(args.db):
+        if not args.force:
+            print(f"❌ {args.db} уже существует — добавьте --force")
+            return 1
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    started = time.perf_counter()
+    asyncio.run(_prepare_schema(args.db))
+    conn = sqlite3.connect(args.db)
+    try:
+        generate(conn, args)
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "stocks", "orders", "user_actions", "trusted_phones", "promotions")
+        }
+    finally:
+        conn.close()
+
+    size_mb = os.path.getsize(args.db) / 1024 / 1024
+    print(f"✅ {args.db}: {size_mb:.1f} МБ за {time.perf_counter() - started:.1f} с")
+    for table, count in counts.items():
+        print(f"   • {table}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
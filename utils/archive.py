@@ -10,6 +10,7 @@ from datetime import datetime, date
 from telegram.constants import ParseMode
 from database.repository import db
 from utils.messaging import safe_reply
+from utils.send_queue import PRIORITY_TRANSACTIONAL
 from html import escape
 import logging
 
@@ -80,6 +81,7 @@ async def auto_archive_old_stocks(context):
                             reply_markup=None,
                             disable_cooldown=True,
                             chat_id=user_id,
+                            priority=PRIORITY_TRANSACTIONAL,
                             parse_mode=ParseMode.HTML
                         )
 
@@ -0,0 +1,183 @@
+# utils/broadcast_runner.py
+"""
+Фоновый исполнитель рассылок (таблицы broadcasts / broadcast_recipients).
+✅ Рассылка — сохранённое задание: диалог админа только создаёт его и сразу освобождается
+✅ Получатели берутся пачками pending, отправляются параллельно через send_queue (класс bulk, под OutboundRateLimiter)
+✅ Статусы пачки пишутся одной транзакцией — после перезапуска досылаем только оставшихся
+✅ Сообщение с прогрессом у админа обновляется раз в BROADCAST_PROGRESS_INTERVAL секунд
+✅ Итог: доставлено, заблокировали, ошибки, сообщений в секунду
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden
+from telegram.ext import Application
+
+from database.repository import db
+from utils.send_queue import PRIORITY_BULK, PRIORITY_TRANSACTIONAL, send_queue
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", "200"))
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))
+
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+def _classify(result) -> Tuple[str, Optional[str]]:
+    """(status, error) получателя по результату отправки"""
+    if not isinstance(result, BaseException):
+        return "sent", None
+    error_msg = str(result)
+    lowered = error_msg.lower()
+    if isinstance(result, Forbidden) or "blocked" in lowered or "kicked" in lowered:
+        return "blocked", error_msg[:200]
+    return "failed", error_msg[:200]
+
+
+def _format_progress(broadcast, counts: Dict[str, int], finished: bool) -> str:
+    done = counts["sent"] + counts["blocked"] + counts["failed"]
+    send_seconds = broadcast["send_seconds"] or 0
+    rate = done / send_seconds if send_seconds > 0 else 0.0
+    title = "завершена" if finished else "идёт"
+    return (
+        f"📤 <b>Рассылка #{broadcast['id']} {title}:</b> {done}/{broadcast['total']}\n"
+        f"✅ Доставлено: <b>{counts['sent']}</b>\n"
+        f"🛡️ Заблокировали: <b>{counts['blocked']}</b>\n"
+        f"❌ Ошибки: <b>{counts['failed']}</b>\n"
+        f"⚡ Скорость: <b>{rate:.1f}</b> сообщ./с"
+    )
+
+
+async def _update_progress(application: Application, broadcast_id: int, finished: bool = False) -> Optional[str]:
+    broadcast = await db.get_broadcast(broadcast_id)
+    if not broadcast:
+        return None
+    text = _format_progress(broadcast, await db.get_broadcast_counts(broadcast_id), finished)
+    if broadcast["progress_chat_id"] and broadcast["progress_message_id"]:
+        try:
+            await application.bot.edit_message_text(
+                chat_id=broadcast["progress_chat_id"],
+                message_id=broadcast["progress_message_id"],
+                text=text,
+                parse_mode="HTML"
+            )
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.warning(f"⚠️ Не удалось обновить прогресс рассылки #{broadcast_id}: {e}")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось обновить прогресс рассылки #{broadcast_id}: {e}")
+    return text
+
+
+def _make_send(application: Application, broadcast, user_id: int):
+    bot = application.bot
+    if broadcast["kind"] == "photo":
+        caption = broadcast["caption"] or ""
+        return lambda: bot.send_photo(
+            chat_id=user_id,
+            photo=broadcast["photo_id"],
+            caption=caption,
+            parse_mode="HTML" if caption else None
+        )
+    return lambda: bot.send_message(
+        chat_id=user_id,
+        text=broadcast["text"],
+        parse_mode="HTML",
+        disable_web_page_preview=True
+    )
+
+
+async def _run(application: Application, broadcast_id: int):
+    broadcast = await db.get_broadcast(broadcast_id)
+    if not broadcast or broadcast["status"] != "running":
+        return
+    logger.info(f"📤 Рассылка #{broadcast_id}: старт/продолжение, всего {broadcast['total']} получателей")
+
+    last_progress = time.monotonic()
+    while True:
+        user_ids = await db.get_pending_broadcast_recipients(broadcast_id, BROADCAST_CHUNK_SIZE)
+        if not user_ids:
+            break
+
+        started = time.monotonic()
+        futures = [send_queue.submit(PRIORITY_BULK, _make_send(application, broadcast, user_id)) for user_id in user_ids]
+        try:
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        except asyncio.CancelledError:
+            # Остановка бота: сохраняем то, что успело уйти, остальные останутся pending
+            finished = [
+                (user_id, *_classify(f.exception() or f.result()))
+                for user_id, f in zip(user_ids, futures) if f.done() and not f.cancelled()
+            ]
+            if finished:
+                await asyncio.shield(db.mark_broadcast_recipients(broadcast_id, finished, time.monotonic() - started))
+            raise
+
+        marks: List[Tuple[int, str, Optional[str]]] = [
+            (user_id, *_classify(result)) for user_id, result in zip(user_ids, results)
+        ]
+        if not await db.mark_broadcast_recipients(broadcast_id, marks, time.monotonic() - started):
+            logger.error(f"❌ Рассылка #{broadcast_id}: не удалось сохранить статусы — остановлена до перезапуска")
+            return
+
+        if time.monotonic() - last_progress >= BROADCAST_PROGRESS_INTERVAL:
+            await _update_progress(application, broadcast_id)
+            last_progress = time.monotonic()
+
+    await db.finish_broadcast(broadcast_id, "done")
+    summary = await _update_progress(application, broadcast_id, finished=True)
+    logger.info(f"✅ Рассылка #{broadcast_id} завершена")
+    if summary:
+        try:
+            await send_queue.submit(PRIORITY_TRANSACTIONAL, lambda: application.bot.send_message(
+                chat_id=broadcast["created_by"],
+                text=summary,
+                parse_mode="HTML"
+            ))
+        except Exception as e:
+            logger.warning(f"⚠️ Итог рассылки #{broadcast_id} не отправлен админу: {e}")
+
+
+def start_broadcast(application: Application, broadcast_id: int) -> None:
+    """Запускает исполнителя рассылки в фоне (повторный вызов для идущей рассылки — без эффекта)"""
+    task = _tasks.get(broadcast_id)
+    if task and not task.done():
+        return
+
+    async def runner():
+        try:
+            await _run(application, broadcast_id)
+        except asyncio.CancelledError:
+            logger.info(f"⏸️ Рассылка #{broadcast_id} приостановлена — продолжится после перезапуска")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Рассылка #{broadcast_id} прервана: {e}", exc_info=True)
+        finally:
+            _tasks.pop(broadcast_id, None)
+
+    # asyncio.create_task, а не application.create_task: resume_broadcasts вызывается в post_init,
+    # когда приложение ещё не running. Ссылки на задачи держим сами в _tasks
+    _tasks[broadcast_id] = asyncio.create_task(runner(), name=f"broadcast_{broadcast_id}")
+
+
+async def resume_broadcasts(application: Application) -> int:
+    """Продолжает рассылки, прерванные перезапуском. Вызывается в post_init"""
+    broadcast_ids = await db.get_running_broadcast_ids()
+    for broadcast_id in broadcast_ids:
+        start_broadcast(application, broadcast_id)
+    if broadcast_ids:
+        logger.info(f"📤 Продолжены рассылки: {broadcast_ids}")
+    return len(broadcast_ids)
+
+
+async def shutdown_broadcasts() -> None:
+    """Приостанавливает идущие рассылки (статус остаётся running)"""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
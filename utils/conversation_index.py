@@ -0,0 +1,113 @@
+# utils/conversation_index.py
+"""
+Обратный индекс диалогов: user_id → ключи его активных ConversationHandler.
+✅ Словарь диалогов каждого ConversationHandler подменяется на отслеживающий —
+   индекс обновляется сам, когда диалог начинается, меняет состояние или завершается (в т.ч. по таймауту)
+✅ Сброс диалогов пользователя — O(его диалогов), без обхода всех обработчиков и всех ключей
+✅ has_conversations(user_id) — O(1) для фронт-контроллера кнопок
+"""
+
+import logging
+from typing import Dict, Set, Tuple
+
+from telegram.ext import Application, ConversationHandler
+
+logger = logging.getLogger(__name__)
+
+# user_id → {(обработчик, ключ диалога)}
+_index: Dict[int, Set[Tuple[ConversationHandler, tuple]]] = {}
+
+
+def _user_position(handler: ConversationHandler) -> int:
+    """Где в ключе диалога лежит user_id (без per_user — chat_id, в личке он совпадает)"""
+    if handler.per_user:
+        return 1 if handler.per_chat else 0
+    return 0
+
+
+class _TrackedConversations(dict):
+    """dict диалогов PTB, который держит _index в актуальном состоянии"""
+
+    def __init__(self, handler: ConversationHandler, data: dict):
+        super().__init__()
+        self._handler = handler
+        self._position = _user_position(handler)
+        for key, state in data.items():
+            self[key] = state
+
+    def _link(self, key):
+        _index.setdefault(key[self._position], set()).add((self._handler, key))
+
+    def _unlink(self, key):
+        user_id = key[self._position]
+        entries = _index.get(user_id)
+        if entries is not None:
+            entries.discard((self._handler, key))
+            if not entries:
+                del _index[user_id]
+
+    def __setitem__(self, key, state):
+        super().__setitem__(key, state)
+        self._link(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._unlink(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._unlink(key)
+        return super().pop(key, *default)
+
+    def clear(self):
+        for key in self:
+            self._unlink(key)
+        super().clear()
+
+
+def track_conversations(application: Application) -> int:
+    """
+    Подключает индекс ко всем ConversationHandler приложения (повторный вызов безопасен).
+    Возвращает число отслеживаемых обработчиков.
+    """
+    tracked = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if not isinstance(handler, ConversationHandler):
+                continue
+            # Словарь диалогов PTB публично не отдаёт
+            conversations = handler._conversations
+            if not isinstance(conversations, _TrackedConversations):
+                if type(conversations) is not dict:
+                    # Персистентный диалог: PTB хранит TrackingDict — не трогаем
+                    logger.warning(f"⚠️ Диалог {handler.name} не индексируется: {type(conversations).__name__}")
+                    continue
+                handler._conversations = _TrackedConversations(handler, conversations)
+            tracked += 1
+    return tracked
+
+
+def has_conversations(user_id: int) -> bool:
+    return user_id in _index
+
+
+def reset_user_conversations(user_id: int) -> int:
+    """Завершает все диалоги пользователя. Возвращает число прерванных диалогов"""
+    entries = _index.pop(user_id, None)
+    if not entries:
+        return 0
+    for handler, key in entries:
+        # Запись в _index уже снята — удаляем из словаря в обход _unlink
+        dict.pop(handler._conversations, key, None)
+        job = handler.timeout_jobs.pop(key, None)
+        if job is not None:
+            job.schedule_removal()
+        logger.debug(f"🛑 Прерван диалог {handler.name} для пользователя {user_id}")
+    return len(entries)
+
+
+def get_conversation_stats() -> Dict[str, int]:
+    return {
+        "users": len(_index),
+        "conversations": sum(len(entries) for entries in _index.values()),
+    }
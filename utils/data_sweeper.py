@@ -0,0 +1,153 @@
+# utils/data_sweeper.py
+"""
+Очистка user_data / chat_data PTB, которые иначе живут до перезапуска.
+✅ Время последней активности — по любому апдейту (TypeHandler, group=-3, цепочку не останавливает)
+✅ Пользователь молчит дольше USER_DATA_TTL — его user_data удаляется, незавершённые диалоги сбрасываются
+✅ Чат молчит дольше CHAT_DATA_TTL — chat_data удаляется
+✅ user_data больше USER_DATA_MAX_BYTES вне диалога — удаляются самые крупные ключи
+   (в диалоге данные нужны потоку — ждём его завершения)
+✅ Освобождённый объём в логе и в /status
+"""
+
+import logging
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+
+from utils.conversation_index import has_conversations, reset_user_conversations
+
+logger = logging.getLogger(__name__)
+
+USER_DATA_TTL = float(os.getenv("USER_DATA_TTL", str(24 * 3600)))
+CHAT_DATA_TTL = float(os.getenv("CHAT_DATA_TTL", str(24 * 3600)))
+USER_DATA_MAX_BYTES = int(os.getenv("USER_DATA_MAX_BYTES", str(256 * 1024)))
+SWEEP_INTERVAL = float(os.getenv("DATA_SWEEP_INTERVAL", "900"))
+
+ACTIVITY_GROUP = -3
+_MAX_DEPTH = 8
+
+_user_activity: Dict[int, float] = {}
+_chat_activity: Dict[int, float] = {}
+_stats = {
+    "sweeps": 0, "users_evicted": 0, "chats_evicted": 0, "keys_trimmed": 0,
+    "bytes_reclaimed": 0, "last_sweep_ms": 0.0,
+}
+
+
+def _deep_size(obj: Any, seen: Optional[set] = None, depth: int = 0) -> int:
+    """Примерный размер объекта с содержимым контейнеров (dict, list, sqlite3.Row...)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth > _MAX_DEPTH:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _deep_size(key, seen, depth + 1) + _deep_size(value, seen, depth + 1)
+    elif isinstance(obj, (list, tuple, set, frozenset, sqlite3.Row)):
+        for item in obj:
+            size += _deep_size(item, seen, depth + 1)
+    return size
+
+
+async def track_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмечает активность пользователя и чата. Ничего не отвечает"""
+    now = time.monotonic()
+    if update.effective_user:
+        _user_activity[update.effective_user.id] = now
+    if update.effective_chat:
+        _chat_activity[update.effective_chat.id] = now
+
+
+def _trim_user_data(user_id: int, data: dict, size: int) -> int:
+    """Удаляет самые крупные ключи, пока данные не влезут в лимит. Возвращает освобождённый объём"""
+    by_size = sorted(((key, _deep_size(value)) for key, value in data.items()), key=lambda kv: kv[1], reverse=True)
+    reclaimed = 0
+    for key, key_size in by_size:
+        if size - reclaimed <= USER_DATA_MAX_BYTES:
+            break
+        data.pop(key, None)
+        reclaimed += key_size
+        _stats["keys_trimmed"] += 1
+        logger.debug(f"✂️ user_data[{user_id}]: удалён ключ '{key}' ({key_size // 1024} КБ)")
+    return reclaimed
+
+
+async def sweep_user_data(context: ContextTypes.DEFAULT_TYPE):
+    """Фоновая задача: удаляет данные неактивных пользователей/чатов и урезает слишком крупные"""
+    application = context.application
+    started = time.monotonic()
+    now = started
+    evicted_users = evicted_chats = reclaimed = 0
+
+    for user_id, data in list(application.user_data.items()):
+        last_seen = _user_activity.setdefault(user_id, now)  # Данные без отметки — считаем с этой очистки
+        if now - last_seen > USER_DATA_TTL:
+            reclaimed += _deep_size(data)
+            reset_user_conversations(user_id)
+            application.drop_user_data(user_id)
+            _user_activity.pop(user_id, None)
+            evicted_users += 1
+            continue
+        if not data or has_conversations(user_id):
+            continue
+        size = _deep_size(data)
+        if size > USER_DATA_MAX_BYTES:
+            reclaimed += _trim_user_data(user_id, data, size)
+
+    for chat_id, data in list(application.chat_data.items()):
+        last_seen = _chat_activity.setdefault(chat_id, now)
+        if now - last_seen > CHAT_DATA_TTL:
+            reclaimed += _deep_size(data)
+            application.drop_chat_data(chat_id)
+            _chat_activity.pop(chat_id, None)
+            evicted_chats += 1
+
+    # Отметки тех, у кого данных нет, тоже не копим
+    for activity, ttl in ((_user_activity, USER_DATA_TTL), (_chat_activity, CHAT_DATA_TTL)):
+        for key in [key for key, last_seen in activity.items() if now - last_seen > ttl]:
+            del activity[key]
+
+    _stats["sweeps"] += 1
+    _stats["users_evicted"] += evicted_users
+    _stats["chats_evicted"] += evicted_chats
+    _stats["bytes_reclaimed"] += reclaimed
+    _stats["last_sweep_ms"] = round((time.monotonic() - started) * 1000, 2)
+    if evicted_users or evicted_chats or reclaimed:
+        logger.info(
+            f"🧹 Очистка данных: пользователей {evicted_users}, чатов {evicted_chats}, "
+            f"освобождено ~{reclaimed // 1024} КБ за {_stats['last_sweep_ms']} мс"
+        )
+
+
+def get_sweeper_stats() -> Dict[str, Any]:
+    return {**_stats, "tracked_users": len(_user_activity), "tracked_chats": len(_chat_activity)}
+
+
+def register_activity_tracker(application: Application) -> None:
+    """Регистрирует отметку активности раньше всех обработчиков (group=-3)"""
+    application.add_handler(TypeHandler(Update, track_activity), group=ACTIVITY_GROUP)
+    logger.info(f"✅ Отметка активности пользователей включена (group={ACTIVITY_GROUP})")
+
+
+def setup_sweeper_job(application: Application) -> None:
+    """Регистрирует периодическую очистку. Вызывается в post_init"""
+    job_queue = application.job_queue
+    if not job_queue:
+        logger.error("❌ JobQueue не доступен — очистка user_data не установлена")
+        return
+
+    for job in job_queue.get_jobs_by_name("user_data_sweeper"):
+        job.schedule_removal()
+
+    job_queue.run_repeating(sweep_user_data, interval=SWEEP_INTERVAL, first=SWEEP_INTERVAL, name="user_data_sweeper")
+    logger.info(
+        f"✅ Очистка user_data/chat_data: каждые {int(SWEEP_INTERVAL)} с, "
+        f"TTL {int(USER_DATA_TTL)} с, лимит {USER_DATA_MAX_BYTES // 1024} КБ на пользователя"
+    )
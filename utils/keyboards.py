@@ -1,6 +1,6 @@
 """
 Утилиты для генерации клавиатур.
-Динамически загружает породы из БД, с fallback на старые данные.
+Динамически загружает породы из снимка остатков (database.inventory), с fallback на старые данные.
 """
 
 from typing import List, Optional
@@ -17,28 +17,19 @@ logger = logging.getLogger(__name__)
 
 async def get_available_breeds_from_db() -> List[str]:
     """
-    Загружает список уникальных пород с остатками и актуальной датой.
+    Список уникальных пород с остатками и актуальной датой — из снимка остатков.
+    SQL выполняется только при первой загрузке / после изменения партий и заказов.
     Возвращает пустой список при ошибках или если БД ещё не инициализирована.
     """
     try:
         from database.repository import db  # Отложенная загрузка — безопасно
+        from database.inventory import inventory
 
         if not db.conn:
             logger.warning("⚠️ Попытка загрузить породы до инициализации БД — возвращаем пустой список")
             return []
 
-        rows = await db.execute_read("""
-            SELECT DISTINCT breed
-            FROM stocks
-            WHERE available_quantity > 0
-              AND status = 'active'
-              AND date >= DATE('now')
-            ORDER BY breed
-        """)
-
-        breeds = [row["breed"] for row in rows]
-        logger.info(f"✅ Успешно загружено {len(breeds)} пород из БД")
-        return breeds
+        return await inventory.breeds()
 
     except Exception as e:
         logger.error(f"❌ Ошибка загрузки пород из БД: {e}", exc_info=True)
@@ -62,7 +53,9 @@ async def get_breeds_keyboard(bot_data: Optional[dict] = None) -> ReplyKeyboardM
     try:
         breeds = await get_available_breeds_from_db()
         # Если запрос прошёл, даже если пород нет → это нормально
-        # Не используем fallback
+        # Не используем fallback, но освежаем кэш в bot_data
+        if breeds and isinstance(bot_data, dict):
+            bot_data["available_breeds"] = breeds
     except Exception as e:
         logger.warning(f"⚠️ Ошибка при загрузке пород из БД: {e}. Используем fallback.")
         use_fallback = True
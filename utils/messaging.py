@@ -14,12 +14,15 @@
 ✅ Безопасная работа при context=None (например, при старте)
 ✅ Исправлено: <a href="tel:..."> работает корректно
 ✅ Напоминания клиентам: за 2 и 1 день до поставки (только pending, с записью в user_actions)
+✅ Напоминания — один конвейер: анти-джойн, получатели пачкой, параллельная отправка через очередь,
+   отметки reminder_sent_* одной транзакцией
 """
 
 import logging
 import asyncio
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Set
+from typing import Callable, Optional, Set
 
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -27,7 +30,8 @@ from html import escape
 
 from config.buttons import get_back_only_keyboard
 from database.repository import db
-from utils.safe_send import safe_reply
+from utils.safe_send import enqueue_reply, safe_reply
+from utils.send_queue import PRIORITY_REMINDER
 
 logger = logging.getLogger(__name__)
 
@@ -129,13 +133,15 @@ async def send_daily_report(context: ContextTypes.DEFAULT_TYPE):
 
         # 🛒 Все заказы за вчера (любой статус)
         total_orders_result = await db.execute_read(
-            "SELECT COUNT(*) FROM orders WHERE DATE(created_at) = ?", (yesterday,)
+            "SELECT COUNT(*) FROM orders WHERE created_at >= ? AND created_at < DATE(?, '+1 day')",
+            (yesterday, yesterday)
         )
         total_orders = total_orders_result[0][0] if total_orders_result and total_orders_result[0] else 0
 
         # 💰 Выручка за день — все заказы, созданные вчера, с ценой
         revenue_result = await db.execute_read(
-            "SELECT SUM(quantity * price) FROM orders WHERE DATE(created_at) = ?", (yesterday,)
+            "SELECT SUM(quantity * price) FROM orders WHERE created_at >= ? AND created_at < DATE(?, '+1 day')",
+            (yesterday, yesterday)
         )
         new_revenue = int(revenue_result[0][0] or 0)
 
@@ -182,7 +188,8 @@ async def send_daily_report(context: ContextTypes.DEFAULT_TYPE):
             text=report,
             chat_id=devops_chat_id,
             disable_cooldown=True,
-            parse_mode="HTML"
+            parse_mode="HTML",
+            priority=PRIORITY_REMINDER
         )
         logger.info("✅ Ежедневный отчёт отправлен")
     except Exception as e:
@@ -235,146 +242,127 @@ async def send_admin_shipment_reminder(context: ContextTypes.DEFAULT_TYPE):
             text="\n".join(message_lines),
             chat_id=devops_chat_id,
             disable_cooldown=True,
-            parse_mode="HTML"
+            parse_mode="HTML",
+            priority=PRIORITY_REMINDER
         )
         logger.info(f"✅ Напоминание о поставках отправлено: {len(result)} партий")
     except Exception as e:
         logger.error(f"❌ Ошибка при отправке напоминания админам: {e}", exc_info=True)
 
 
-# === НАПОМИНАНИЕ КЛИЕНТУ ЗА 2 ДНЯ ===
-async def send_pending_reminder_2_days(context: ContextTypes.DEFAULT_TYPE):
+# === НАПОМИНАНИЯ КЛИЕНТАМ: общий конвейер ===
+def _reminder_2_days_text(quantity: int, breed: str, date_str: str) -> str:
+    return (
+        f"📅 <b>Почти готово!</b>\n\n"
+        f"Через 2 дня ({date_str}) — получение:\n"
+        f"🐔 <b>{quantity} шт. {breed}</b>\n\n"
+        f"Пожалуйста, подтвердите, что сможете забрать заказ.\n"
+        f"Это поможет нам правильно спланировать поставку 🙏"
+    )
+
+
+def _reminder_1_day_text(quantity: int, breed: str, date_str: str) -> str:
+    return (
+        f"⏰ <b>Финальное напоминание!</b>\n\n"
+        f"Завтра ({date_str}) — получение:\n"
+        f"🐔 <b>{quantity} шт. {breed}</b>\n\n"
+        f"Если вы <b>не подтвердите</b> сегодня —\n"
+        f"мы рискуем отдать цыплят другим клиентам 😔\n\n"
+        f"Подтвердите, пожалуйста, что сможете забрать заказ!"
+    )
+
+
+async def _send_pending_reminders(
+    context: ContextTypes.DEFAULT_TYPE,
+    days_ahead: int,
+    action: str,
+    build_text: Callable[[int, str, str], str],
+    label: str
+):
     """
-    Первое напоминание клиентам с pending-заказами за 2 дня до поставки.
+    Напоминания клиентам с pending-заказами на дату через days_ahead дней.
+    1. Заказы без отметки action — анти-джойн по idx_user_actions_order (action, target_id)
+    2. user_id для заказов без него — resolve_many, одним запросом на пачку
+    3. Отправка параллельно через очередь (класс reminder, под OutboundRateLimiter)
+    4. Отметки action для доставленных — одной транзакцией
     """
-    try:
-        two_days_ahead = (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d")
-        rows = await db.execute_read(
-            """
-            SELECT o.id, o.user_id, o.breed, o.quantity, o.price, o.date, o.phone
-            FROM orders o
-            WHERE o.status = 'pending'
-              AND o.date = ?
-              AND o.id NOT IN (
-                  SELECT target_id FROM user_actions
-                  WHERE action = 'reminder_sent_2_days' AND target_id = o.id
-              )
-            """,
-            (two_days_ahead,)
-        )
+    started = time.monotonic()
+    target_date = (datetime.now() + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+    rows = await db.execute_read(
+        """
+        SELECT o.id, o.user_id, o.breed, o.quantity, o.date, o.phone
+        FROM orders o
+        LEFT JOIN user_actions ua ON ua.action = ? AND ua.target_id = o.id
+        WHERE o.status = 'pending'
+          AND o.date = ?
+          AND ua.id IS NULL
+        """,
+        (action, target_date)
+    )
+
+    if not rows:
+        logger.info(f"📭 На {target_date} нет pending-заказов для напоминания ({label}).")
+        return
+
+    from utils.notifications import resolve_many
+    resolved = await resolve_many(row["phone"] for row in rows if not row["user_id"])
+
+    date_str = datetime.strptime(target_date, "%Y-%m-%d").strftime("%d-%m-%Y")
+    recipients = []
+    futures = []
+    for order_id, user_id, breed, quantity, _, phone in rows:
+        target_user_id = user_id or resolved.get(phone)
+        if not target_user_id:
+            logger.warning(f"❌ Не найден user_id для заказа {order_id}, телефон {phone}")
+            continue
+        recipients.append((order_id, target_user_id))
+        futures.append(enqueue_reply(
+            None,
+            context,
+            build_text(quantity, breed, date_str),
+            priority=PRIORITY_REMINDER,
+            chat_id=target_user_id,
+            disable_cooldown=True,
+            parse_mode="HTML"
+        ))
 
-        if not rows:
-            logger.info(f"📭 На {two_days_ahead} нет pending-заказов для напоминания (2 дня).")
-            return
+    results = await asyncio.gather(*futures, return_exceptions=True)
+
+    markers = []
+    for (order_id, target_user_id), result in zip(recipients, results):
+        if isinstance(result, BaseException) or not result:
+            logger.error(f"❌ Не удалось отправить напоминание ({label}) для заказа {order_id}: {result}")
+            continue
+        markers.append((
+            "INSERT INTO user_actions (user_id, action, target_id) VALUES (?, ?, ?)",
+            (target_user_id, action, order_id)
+        ))
 
-        for order_id, user_id, breed, quantity, price, order_date, phone in rows:
-            try:
-                target_user_id = user_id
-                if not target_user_id:
-                    from utils.notifications import _get_user_id_by_phone
-                    target_user_id = await _get_user_id_by_phone(phone)
-                if not target_user_id:
-                    logger.warning(f"❌ Не найден user_id для заказа {order_id}, телефон {phone}")
-                    continue
-
-                total = quantity * int(price) if price else 0
-                date_str = datetime.strptime(order_date, "%Y-%m-%d").strftime("%d-%m-%Y")
-
-                message = (
-                    f"📅 <b>Почти готово!</b>\n\n"
-                    f"Через 2 дня ({date_str}) — получение:\n"
-                    f"🐔 <b>{quantity} шт. {breed}</b>\n\n"
-                    f"Пожалуйста, подтвердите, что сможете забрать заказ.\n"
-                    f"Это поможет нам правильно спланировать поставку 🙏"
-                )
-
-                await safe_reply(
-                    update=None,
-                    context=context,
-                    text=message,
-                    chat_id=target_user_id,
-                    disable_cooldown=True,
-                    parse_mode="HTML"
-                )
-
-                await db.execute_write(
-                    "INSERT INTO user_actions (user_id, action, target_id) VALUES (?, ?, ?)",
-                    (target_user_id, 'reminder_sent_2_days', order_id)
-                )
-                logger.info(f"📨 [2 дня] Напоминание отправлено: заказ {order_id}, user_id {target_user_id}")
-
-            except Exception as e:
-                logger.error(f"❌ Не удалось отправить напоминание (2 дня) для заказа {order_id}: {e}")
+    if markers and not await db.execute_transaction(markers):
+        logger.error(f"❌ Напоминания ({label}) отправлены, но отметки не сохранены — возможен повтор")
 
+    logger.info(
+        f"📨 [{label}] Напоминания на {target_date}: отправлено {len(markers)} из {len(rows)} "
+        f"за {time.monotonic() - started:.1f} с"
+    )
+
+
+async def send_pending_reminder_2_days(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Первое напоминание клиентам с pending-заказами за 2 дня до поставки.
+    """
+    try:
+        await _send_pending_reminders(context, 2, "reminder_sent_2_days", _reminder_2_days_text, "2 дня")
     except Exception as e:
         logger.error(f"❌ Ошибка при отправке напоминаний за 2 дня: {e}", exc_info=True)
 
 
-# === НАПОМИНАНИЕ КЛИЕНТУ ЗА 1 ДЕНЬ ===
 async def send_pending_reminder_1_day(context: ContextTypes.DEFAULT_TYPE):
     """
     Финальное напоминание клиентам с pending-заказами за 1 день до поставки.
     """
     try:
-        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-        rows = await db.execute_read(
-            """
-            SELECT o.id, o.user_id, o.breed, o.quantity, o.price, o.date, o.phone
-            FROM orders o
-            WHERE o.status = 'pending'
-              AND o.date = ?
-              AND o.id NOT IN (
-                  SELECT target_id FROM user_actions
-                  WHERE action = 'reminder_sent_1_day' AND target_id = o.id
-              )
-            """,
-            (tomorrow,)
-        )
-
-        if not rows:
-            logger.info(f"📭 На {tomorrow} нет pending-заказов для финального напоминания.")
-            return
-
-        for order_id, user_id, breed, quantity, price, order_date, phone in rows:
-            try:
-                target_user_id = user_id
-                if not target_user_id:
-                    from utils.notifications import _get_user_id_by_phone
-                    target_user_id = await _get_user_id_by_phone(phone)
-                if not target_user_id:
-                    logger.warning(f"❌ Не найден user_id для заказа {order_id}, телефон {phone}")
-                    continue
-
-                total = quantity * int(price) if price else 0
-                date_str = datetime.strptime(order_date, "%Y-%m-%d").strftime("%d-%m-%Y")
-
-                message = (
-                    f"⏰ <b>Финальное напоминание!</b>\n\n"
-                    f"Завтра ({date_str}) — получение:\n"
-                    f"🐔 <b>{quantity} шт. {breed}</b>\n\n"
-                    f"Если вы <b>не подтвердите</b> сегодня —\n"
-                    f"мы рискуем отдать цыплят другим клиентам 😔\n\n"
-                    f"Подтвердите, пожалуйста, что сможете забрать заказ!"
-                )
-
-                await safe_reply(
-                    update=None,
-                    context=context,
-                    text=message,
-                    chat_id=target_user_id,
-                    disable_cooldown=True,
-                    parse_mode="HTML"
-                )
-
-                await db.execute_write(
-                    "INSERT INTO user_actions (user_id, action, target_id) VALUES (?, ?, ?)",
-                    (target_user_id, 'reminder_sent_1_day', order_id)
-                )
-                logger.info(f"📨 [1 день] Финальное напоминание отправлено: заказ {order_id}, user_id {target_user_id}")
-
-            except Exception as e:
-                logger.error(f"❌ Не удалось отправить финальное напоминание для заказа {order_id}: {e}")
-
+        await _send_pending_reminders(context, 1, "reminder_sent_1_day", _reminder_1_day_text, "1 день")
     except Exception as e:
         logger.error(f"❌ Ошибка при отправке финальных напоминаний: {e}", exc_info=True)
 
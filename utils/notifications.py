@@ -1,24 +1,116 @@
 """
 Модуль уведомлений клиентам: выдача, изменение, подтверждение заказа.
 Использует кэширование phone → user_id.
+✅ Кэш phone → user_id: LRU с лимитом, TTL (короткий — для ненайденных), сброс при upsert_user / trust_phone
+✅ resolve_many() — один SELECT ... IN (...) на пачку номеров
 ✅ Использует safe_reply из utils.safe_send
 ✅ Нет from main import bot
 ✅ Все сообщения проходят через retry, cooldown, обработку ошибок
 """
 
 from database.repository import db
+from collections import OrderedDict
 from html import escape
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Tuple
 import logging
+import time
 
 # ✅ Импортируем safe_reply из нового модуля
 from utils.safe_send import safe_reply
+from utils.send_queue import PRIORITY_TRANSACTIONAL
 
 logger = logging.getLogger(__name__)
 
-# Кэш: phone → user_id (в памяти)
-_user_cache = {}
+# Кэш: phone → user_id (в памяти), LRU с ограничением размера и TTL
+USER_CACHE_MAX_SIZE = 5000
+USER_CACHE_TTL = 6 * 3600  # Найденный user_id
+USER_CACHE_NEGATIVE_TTL = 600  # «Нет такого номера» — клиент может зарегистрироваться позже
+RESOLVE_CHUNK_SIZE = 500
+
+_user_cache: "OrderedDict[str, Tuple[Optional[int], float]]" = OrderedDict()  # phone → (user_id, expires_at)
+_user_phones: Dict[int, str] = {}  # user_id → phone в кэше: смена номера сбрасывает старую запись
+_user_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def _cache_get(phone: str) -> Tuple[bool, Optional[int]]:
+    entry = _user_cache.get(phone)
+    if entry is None:
+        return False, None
+    user_id, expires_at = entry
+    if expires_at < time.monotonic():
+        _cache_drop(phone)
+        return False, None
+    _user_cache.move_to_end(phone)
+    return True, user_id
+
+
+def _cache_put(phone: str, user_id: Optional[int]):
+    ttl = USER_CACHE_TTL if user_id else USER_CACHE_NEGATIVE_TTL
+    _cache_drop(phone)
+    _user_cache[phone] = (user_id, time.monotonic() + ttl)
+    if user_id:
+        _user_phones[user_id] = phone
+    while len(_user_cache) > USER_CACHE_MAX_SIZE:
+        oldest, _ = next(iter(_user_cache.items()))
+        _cache_drop(oldest)
+        _user_cache_stats["evictions"] += 1
+
+
+def _cache_drop(phone: str):
+    entry = _user_cache.pop(phone, None)
+    if entry and entry[0] and _user_phones.get(entry[0]) == phone:
+        del _user_phones[entry[0]]
+
+
+def invalidate_user_cache(phone: Optional[str] = None, user_id: Optional[int] = None):
+    """Сбрасывает запись по номеру и прежний номер пользователя (вызывается из DB.add_user_listener)"""
+    if phone:
+        _cache_drop(phone)
+    if user_id and user_id in _user_phones:
+        _cache_drop(_user_phones[user_id])
+    _user_cache_stats["invalidations"] += 1
+
+
+db.add_user_listener(invalidate_user_cache)
+
+
+async def resolve_many(phones: Iterable[str]) -> Dict[str, Optional[int]]:
+    """
+    phone → user_id для целой пачки номеров: кэш + один SELECT ... IN (...) на недостающие
+    (кусками по RESOLVE_CHUNK_SIZE). Ненайденные номера — None.
+    """
+    result: Dict[str, Optional[int]] = {}
+    missing = []
+    for phone in dict.fromkeys(p for p in phones if p):
+        found, user_id = _cache_get(phone)
+        if found:
+            _user_cache_stats["hits"] += 1
+            result[phone] = user_id
+        else:
+            missing.append(phone)
+
+    for i in range(0, len(missing), RESOLVE_CHUNK_SIZE):
+        chunk = missing[i:i + RESOLVE_CHUNK_SIZE]
+        _user_cache_stats["misses"] += len(chunk)
+        try:
+            placeholders = ", ".join("?" * len(chunk))
+            rows = await db.execute_read(
+                f"SELECT phone, MIN(user_id) AS user_id FROM users WHERE phone IN ({placeholders}) GROUP BY phone",
+                tuple(chunk),
+                raise_errors=True  # Иначе сбой вернёт [] и все номера куска попадут в негативный кэш
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении user_id для {len(chunk)} номеров: {e}", exc_info=True)
+            for phone in chunk:
+                result[phone] = None  # Ошибку не кэшируем
+            continue
+        found = {row["phone"]: row["user_id"] for row in rows}
+        for phone in chunk:
+            result[phone] = found.get(phone)
+            _cache_put(phone, result[phone])
+
+    return result
 
 
 async def _get_user_id_by_phone(phone: str) -> Optional[int]:
@@ -28,20 +120,11 @@ async def _get_user_id_by_phone(phone: str) -> Optional[int]:
     """
     if not phone:
         return None
+    return (await resolve_many([phone])).get(phone)
 
-    if phone in _user_cache:
-        return _user_cache[phone]
 
-    try:
-        result = await db.execute_read(
-            "SELECT user_id FROM users WHERE phone = ?", (phone,)
-        )
-        user_id = result[0]["user_id"] if result else None
-        _user_cache[phone] = user_id
-        return user_id
-    except Exception as e:
-        logger.error(f"❌ Ошибка при получении user_id для {phone}: {e}", exc_info=True)
-        return None
+def get_user_cache_stats() -> Dict[str, int]:
+    return {**_user_cache_stats, "size": len(_user_cache)}
 
 
 def _format_date(date_str: str) -> str:
@@ -117,7 +200,8 @@ async def notify_client_issue(context, order_data: Dict[str, Any]) -> bool:
             text=message,
             chat_id=user_id,
             parse_mode="HTML",
-            disable_cooldown=True  # Приоритетное уведомление
+            disable_cooldown=True,  # Приоритетное уведомление
+            priority=PRIORITY_TRANSACTIONAL
         )
 
         if success:
@@ -182,7 +266,8 @@ async def notify_client_order_updated(context, order: Dict[str, Any]) -> bool:
             text=message,
             chat_id=user_id,
             parse_mode="HTML",
-            disable_cooldown=True
+            disable_cooldown=True,
+            priority=PRIORITY_TRANSACTIONAL
         )
 
         if success:
@@ -229,7 +314,8 @@ async def notify_client_order_confirmed(
             text=message,
             chat_id=user_id,
             parse_mode="HTML",
-            disable_cooldown=True
+            disable_cooldown=True,
+            priority=PRIORITY_TRANSACTIONAL
         )
 
         if success:
@@ -245,4 +331,5 @@ async def notify_client_order_confirmed(
 def clear_user_cache():
     """Очистка кэша user_id (например, при перезапуске или обновлении БД)"""
     _user_cache.clear()
+    _user_phones.clear()
     logger.info("🗑️ Кэш user_id очищен")
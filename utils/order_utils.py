@@ -2,7 +2,7 @@
 """
 Утилиты для работы с заказами.
 ✅ Общая логика отмены заказа
-✅ Возврат количества в партию
+✅ Возврат количества в партию — триггером БД при смене статуса
 ✅ Уведомление клиента
 ✅ Логирование
 ✅ Работает с таблицей 'stocks'
@@ -49,18 +49,13 @@ async def cancel_order_by_id(order_id: int, context=None, user_id=None, admin_in
             logger.info(f"ℹ️ Заказ {order_id} не может быть отменён: статус {status}")
             return False
 
-        stock_id = row["stock_id"]
-        quantity = row["quantity"]
-
-        if stock_id:
-            await db.execute_write(
-                "UPDATE stocks SET available_quantity = available_quantity + ? WHERE id = ?",
-                (quantity, stock_id)
-            )
-            logger.info(f"🔁 {quantity} шт. возвращены в партию {stock_id}")
-
-        await db.execute_write("UPDATE orders SET status = 'cancelled' WHERE id = ?", (order_id,))
-        logger.info(f"✅ Заказ {order_id} отменён")
+        # Остаток в партию возвращает триггер trg_orders_update_hold
+        if not await db.execute_write(
+            "UPDATE orders SET status = 'cancelled' WHERE id = ? AND status IN ('active', 'pending')", (order_id,)
+        ):
+            logger.info(f"ℹ️ Заказ {order_id} уже изменён другим действием")
+            return False
+        logger.info(f"✅ Заказ {order_id} отменён, {row['quantity']} шт. возвращены в партию {row['stock_id']}")
 
         # Отправка уведомления клиенту
         try:
@@ -0,0 +1,134 @@
+# utils/promotions_cache.py
+"""
+Кэш активных акций для клиентов (Telegram и MAX).
+✅ Один SELECT до ближайшей границы start_date / end_date (акция началась или закончилась)
+✅ Правки акций в админке сбрасывают кэш (DB.promotions_version)
+✅ Подписи готовы сразу в двух разметках: HTML (Telegram) и markdown (MAX)
+✅ file_id фото после первой успешной отправки — дальше Telegram не скачивает картинку заново
+✅ Ошибка БД не кэшируется: отдаём прежний набор, следующий вызов перечитает
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from html import escape
+from typing import Any, Dict, List, Optional
+
+from database.repository import db
+
+logger = logging.getLogger(__name__)
+
+_promotions: List[Dict[str, Any]] = []
+_loaded_version: Optional[int] = None
+_loaded_day: Optional[str] = None
+_valid_until: Optional[str] = None  # День, с которого набор активных акций меняется сам по себе
+_file_ids: Dict[str, str] = {}  # image_url → Telegram file_id
+_lock = asyncio.Lock()
+_stats = {"hits": 0, "loads": 0, "file_id_hits": 0}
+
+
+def _today() -> str:
+    # get_active_promotions сравнивает с date('now') — это UTC
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _is_fresh(today: str) -> bool:
+    if _loaded_day is None or _loaded_version != db.promotions_version:
+        return False
+    return _valid_until is None or today < _valid_until
+
+
+def _build_entry(promo) -> Dict[str, Any]:
+    title = escape(str(promo['title']))
+    desc = escape(str(promo['description']))
+    image_url = str(promo['image_url']).strip() if promo['image_url'] else None
+    start_date = promo['start_date']
+    end_date = promo['end_date']
+
+    start_str = f"📅 Начало: {start_date}\n" if start_date else ""
+    end_str = f"🔚 Окончание: {end_date}\n" if end_date else "🔚 Окончание: бессрочно\n"
+    return {
+        "id": promo['id'],
+        "title": title,
+        "image_url": image_url or None,
+        "caption_html": f"🎁 <b>{title}</b>\n\n{start_str}{end_str}{desc}",
+        "caption_markdown": f"🎁 *{title}*\n\n{start_str}{end_str}{desc}",
+    }
+
+
+async def _next_boundary(today: str) -> Optional[str]:
+    """Ближайший день, когда какая-то включённая акция начнётся или закончится"""
+    rows = await db.execute_read(
+        """
+        SELECT MIN(boundary) FROM (
+            SELECT start_date AS boundary FROM promotions WHERE is_active = 1 AND start_date > ?
+            UNION ALL
+            SELECT date(end_date, '+1 day') FROM promotions WHERE is_active = 1 AND end_date >= ?
+        )
+        """,
+        (today, today),
+        raise_errors=True
+    )
+    return rows[0][0] if rows else None
+
+
+async def get_active_promotions() -> List[Dict[str, Any]]:
+    """
+    Активные акции: [{id, title, image_url, caption_html, caption_markdown}].
+    SQL — только после правки акций или когда наступила граница дат.
+    """
+    global _promotions, _loaded_version, _loaded_day, _valid_until
+
+    today = _today()
+    if _is_fresh(today):
+        _stats["hits"] += 1
+        return _promotions
+
+    async with _lock:
+        today = _today()
+        if _is_fresh(today):
+            _stats["hits"] += 1
+            return _promotions
+
+        version = db.promotions_version  # До SELECT: правка во время чтения не потеряется
+        try:
+            rows = await db.get_active_promotions(raise_errors=True)
+            valid_until = await _next_boundary(today)
+        except Exception as e:
+            # Сбой — не «акций нет» и не «границы нет»: кэш не трогаем, повтор при следующем вызове
+            logger.error(f"❌ Акции не загружены, отдаём прежний набор: {e}")
+            return _promotions
+
+        promotions = []
+        for promo in rows:
+            try:
+                promotions.append(_build_entry(promo))
+            except Exception as e:
+                logger.error(f"❌ Ошибка формирования акции: {e}", exc_info=True)
+
+        _promotions, _loaded_version, _loaded_day, _valid_until = promotions, version, today, valid_until
+        _stats["loads"] += 1
+        logger.debug(f"🎁 Акции загружены: {len(promotions)} шт., до {valid_until or 'правки в админке'}")
+        return promotions
+
+
+def get_photo_file_id(image_url: str) -> Optional[str]:
+    """file_id ранее отправленного фото или None"""
+    file_id = _file_ids.get(image_url)
+    if file_id:
+        _stats["file_id_hits"] += 1
+    return file_id
+
+
+def remember_photo_file_id(image_url: str, message) -> None:
+    """Запоминает file_id самого крупного размера из отправленного сообщения"""
+    if message is not None and getattr(message, "photo", None):
+        _file_ids[image_url] = message.photo[-1].file_id
+
+
+def forget_photo_file_id(image_url: str) -> None:
+    _file_ids.pop(image_url, None)
+
+
+def get_promotions_cache_stats() -> Dict[str, Any]:
+    return {**_stats, "cached": len(_promotions), "file_ids": len(_file_ids), "valid_until": _valid_until}
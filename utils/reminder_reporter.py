@@ -63,16 +63,19 @@ async def send_unconfirmed_orders_report(context):
             # )
             return
 
-        # 2️⃣ Проверяем: кому сегодня отправляли напоминания?
+        # 2️⃣ Проверяем: отправлялись ли сегодня напоминания?
+        # Сам список id не нужен: основной запрос проверяет напоминание через EXISTS
         reminder_check_query = """
-            SELECT DISTINCT target_id FROM user_actions
-            WHERE action IN ('reminder_sent_2_days', 'reminder_sent_1_day')
-              AND DATE(created_at) = DATE('now')
+            SELECT EXISTS (
+                SELECT 1 FROM user_actions
+                WHERE action IN ('reminder_sent_2_days', 'reminder_sent_1_day')
+                  AND DATE(created_at) = DATE('now')
+            )
         """
-        reminded_orders = await db.execute_read(reminder_check_query)
-        reminded_order_ids = {row[0] for row in reminded_orders} if reminded_orders else set()
+        reminder_result = await db.execute_read(reminder_check_query)
+        reminders_sent = bool(reminder_result and reminder_result[0][0])
 
-        if not reminded_order_ids:
+        if not reminders_sent:
             logger.info("📭 Напоминания сегодня не отправлялись — отчёт пропущен.")
             # Можно уведомить (по желанию)
             # await context.bot.send_message(
@@ -85,8 +88,7 @@ async def send_unconfirmed_orders_report(context):
             return
 
         # 3️⃣ Основной запрос: кто получил напоминание, но не подтвердил
-        placeholders = ','.join('?' * len(reminded_order_ids))
-        query = f"""
+        query = """
             SELECT 
                 o.id AS order_id,
                 o.user_id,
@@ -103,7 +105,12 @@ async def send_unconfirmed_orders_report(context):
             LEFT JOIN users u ON o.user_id = u.user_id
             WHERE o.status = 'active'
               AND o.date = ?
-              AND o.id IN ({placeholders})
+              AND EXISTS (
+                  SELECT 1 FROM user_actions r
+                  WHERE r.action IN ('reminder_sent_2_days', 'reminder_sent_1_day')
+                    AND r.target_id = o.id
+                    AND DATE(r.created_at) = DATE('now')
+              )
               AND NOT EXISTS (
                   SELECT 1 FROM user_actions ua
                   WHERE ua.action = 'confirmed_order'
@@ -112,7 +119,7 @@ async def send_unconfirmed_orders_report(context):
             ORDER BY o.created_at DESC
         """
 
-        result = await db.execute_read(query, (tomorrow_date, *reminded_order_ids))
+        result = await db.execute_read(query, (tomorrow_date,))
 
         if not result:
             logger.info("✅ Все заказы, кому отправляли напоминания, подтверждены.")
@@ -0,0 +1,66 @@
+# utils/restart_epoch.py
+"""
+Эпоха перезапуска: кто уже писал боту с момента старта процесса.
+✅ EPOCH — время старта процесса (unix), меняется только при перезапуске
+✅ Пользователи текущей эпохи — отсортированный array('q') по 8 байт на id + небольшой буфер новых
+✅ Потолок SEEN_USERS_MAX: сверх него новые пользователи считаются «уже видели» — приветствие
+   о перезапуске не повторится, память не растёт
+✅ Счётчики для /status
+"""
+
+import heapq
+import logging
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+EPOCH = int(time.time())
+SEEN_USERS_MAX = int(os.getenv("SEEN_USERS_MAX", "1000000"))  # ~8 МБ в худшем случае
+_MERGE_THRESHOLD = 4096
+
+_seen = array('q')  # Отсортированные user_id текущей эпохи
+_recent: Set[int] = set()  # Новые user_id до слияния в _seen
+_overflow = 0
+
+
+def _merge():
+    global _seen
+    _seen = array('q', heapq.merge(_seen, sorted(_recent)))
+    _recent.clear()
+
+
+def _contains(user_id: int) -> bool:
+    if user_id in _recent:
+        return True
+    i = bisect_left(_seen, user_id)
+    return i < len(_seen) and _seen[i] == user_id
+
+
+def mark_seen(user_id: int) -> bool:
+    """Отмечает пользователя. True — это его первое сообщение после перезапуска"""
+    global _overflow
+    if _contains(user_id):
+        return False
+    if len(_seen) + len(_recent) >= SEEN_USERS_MAX:
+        if _overflow == 0:
+            logger.warning(f"⚠️ Достигнут лимит SEEN_USERS_MAX={SEEN_USERS_MAX} — автозапуск для новых пользователей отключён")
+        _overflow += 1
+        return False
+    _recent.add(user_id)
+    if len(_recent) >= _MERGE_THRESHOLD:
+        _merge()
+    return True
+
+
+def get_epoch_stats() -> Dict[str, int]:
+    return {
+        "epoch": EPOCH,
+        "seen": len(_seen) + len(_recent),
+        "bytes": _seen.buffer_info()[1] * _seen.itemsize + sys.getsizeof(_recent),
+        "overflow": _overflow,
+    }
@@ -1,25 +1,220 @@
 # utils/safe_send.py
+"""
+Безопасная отправка сообщений и ограничение исходящего потока.
+✅ safe_reply — повторы при сетевых ошибках, разбиение длинных текстов
+✅ OutboundRateLimiter — token bucket перед КАЖДЫМ send* запросом бота (ApplicationBuilder.rate_limiter):
+   ~30 сообщений/с на бота, 1/с в личном чате, 20/мин в группе
+✅ Лишние отправки ждут своей очереди (FIFO по времени вызова), ожидание одного чата не задерживает другие
+✅ safe_reply(priority=...) / enqueue_reply — фоновые отправки через utils.send_queue
+✅ RetryAfter — по RetryAfter.retry_after: пауза чата (группа) или всего исходящего потока (личка),
+   запрос повторяется после паузы; ожидание дольше MAX_FLOOD_WAIT не повторяется
+✅ Сетевые ошибки — повтор с экспоненциальной задержкой и джиттером (backoff_delay)
+✅ Всё это в OutboundRateLimiter — действует на все bot.send_* бота приложения, не только safe_reply
+"""
 import logging
 import asyncio
 import hashlib
-from typing import Optional, List, Union
+import os
+import random
+import time
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, Optional, List, Union
 
 from telegram import Update, Message
-from telegram.ext import ContextTypes
-from telegram.error import NetworkError, BadRequest, Forbidden, TimedOut
+from telegram.ext import BaseRateLimiter, ContextTypes
+from telegram.error import NetworkError, BadRequest, Forbidden, RetryAfter, TimedOut
 import httpx
 
+from utils.send_queue import PRIORITY_BULK, send_queue
+
 logger = logging.getLogger(__name__)
 
 MAX_MESSAGE_LENGTH = 4096
 MAX_RETRIES = 3
 BASE_RETRY_DELAY = 1.0
 MAX_RETRY_DELAY = 10.0
+MAX_FLOOD_WAIT = float(os.getenv("MAX_FLOOD_WAIT", "60"))  # Дольше — не ждём, отдаём RetryAfter вызывающему
 
 # Внутренние ключи user_data (для cooldown)
 COOLDOWN_KEY_PREFIX = "last_reply_"
 LAST_MESSAGE_KEY = "last_bot_message_id"
 
+# Лимиты Bot API: (скорость, токенов/с; ёмкость — сколько можно отправить подряд)
+GLOBAL_SEND_RATE = float(os.getenv("GLOBAL_SEND_RATE", "30"))
+PRIVATE_CHAT_RATE = (1.0, 3)
+GROUP_CHAT_RATE = (20 / 60, 3)
+_BUCKET_PRUNE_EVERY = 1000  # Новых чатов между чистками простаивающих «вёдер»
+
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная задержка перед повтором с джиттером: повторы разных отправок не совпадают"""
+    delay = min(BASE_RETRY_DELAY * (2 ** attempt), MAX_RETRY_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    """RetryAfter.retry_after в секундах (PTB отдаёт int или timedelta)"""
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class _TokenBucket:
+    """Ведро с резервированием: токены уходят в минус, вызывающий ждёт своей очереди"""
+    __slots__ = ("rate", "capacity", "tokens", "updated", "lock", "paused_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()  # Отправки одного чата — строго по очереди
+        self.paused_until = 0.0  # RetryAfter: до этого момента (monotonic) не отправляем
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Занимает токен. Возвращает, сколько секунд ждать до отправки"""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def delay(self) -> float:
+        """Сколько ждать до свободного токена (не занимая его) или до конца паузы"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity and not self.lock.locked() and self.paused_until <= time.monotonic()
+
+
+class OutboundRateLimiter(BaseRateLimiter):
+    """
+    Ограничитель для ApplicationBuilder().rate_limiter(...).
+    Срабатывает на все методы отправки (send*, copy/forward) — и safe_reply, и прямые bot.send_*.
+    Там же повторы: RetryAfter (с паузой) и сетевые ошибки (backoff_delay).
+    Число повторов — rate_limit_args=<int> в вызове bot.send_*, по умолчанию MAX_RETRIES.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_SEND_RATE, max_retries: int = MAX_RETRIES):
+        self._global = _TokenBucket(global_rate, global_rate)
+        self._chats: Dict[Any, _TokenBucket] = {}
+        self._new_chats = 0
+        self._max_retries = max_retries
+        self._stats = {
+            "requests": 0, "delayed": 0, "wait_total_s": 0.0, "max_wait_s": 0.0,
+            "flood_waits": 0, "global_pauses": 0, "network_retries": 0,
+        }
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @staticmethod
+    def _is_limited(endpoint: str) -> bool:
+        return (endpoint.startswith("send") and endpoint != "sendChatAction") or endpoint in ("copyMessage", "forwardMessage")
+
+    def _chat_bucket(self, chat_id: Any) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательный id (или @username) — группа/канал
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = self._chats[chat_id] = _TokenBucket(*(GROUP_CHAT_RATE if is_group else PRIVATE_CHAT_RATE))
+            self._new_chats += 1
+            if self._new_chats >= _BUCKET_PRUNE_EVERY:
+                self._new_chats = 0
+                for key in [key for key, b in self._chats.items() if b.is_idle()]:
+                    del self._chats[key]
+        return bucket
+
+    async def _wait(self, delay: float):
+        if delay > 0:
+            self._stats["delayed"] += 1
+            self._stats["wait_total_s"] += delay
+            self._stats["max_wait_s"] = max(self._stats["max_wait_s"], delay)
+            await asyncio.sleep(delay)
+
+    def _on_retry_after(self, error: RetryAfter, chat_id: Any, bucket: Optional[_TokenBucket]) -> float:
+        """
+        Ставит паузу по RetryAfter. Лимит группы (20/мин) — свой у каждой группы, пауза только её.
+        Личные чаты limiter и так держит в 1/с — 429 там означает общий лимит бота: пауза для всех.
+        """
+        seconds = retry_after_seconds(error)
+        self._stats["flood_waits"] += 1
+        if bucket is not None and (not isinstance(chat_id, int) or chat_id < 0):
+            bucket.pause(seconds)
+            logger.warning(f"🌊 Flood control в чате {chat_id}: пауза {seconds:.0f} с")
+        else:
+            self._global.pause(seconds)
+            self._stats["global_pauses"] += 1
+            logger.warning(f"🌊 Flood control: вся исходящая отправка на паузе {seconds:.0f} с")
+        return seconds
+
+    async def _send(self, callback, args, kwargs, chat_id: Any, bucket: Optional[_TokenBucket], max_retries: int):
+        """Отправка с повторами. Перед каждой попыткой — очередь чата и общая очередь (с учётом пауз)"""
+        for attempt in range(max_retries + 1):
+            if bucket is not None:
+                await self._wait(bucket.delay())
+            await self._wait(self._global.paused_until - time.monotonic())
+            await self._wait(self._global.reserve())
+            if bucket is not None:
+                bucket.reserve()
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                seconds = self._on_retry_after(e, chat_id, bucket)
+                if attempt == max_retries or seconds > MAX_FLOOD_WAIT:
+                    raise
+            except BadRequest:
+                raise  # Подкласс NetworkError, но повтор не поможет
+            except NetworkError as e:
+                if attempt == max_retries:
+                    raise
+                self._stats["network_retries"] += 1
+                delay = backoff_delay(attempt)
+                logger.warning(f"🔁 Сетевая ошибка при отправке в {chat_id}: {e} — повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Any],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        if not self._is_limited(endpoint):
+            # Правки, ответы на callback и т.п. не лимитируются, но общую паузу RetryAfter соблюдают
+            await self._wait(self._global.paused_until - time.monotonic())
+            return await callback(*args, **kwargs)
+
+        self._stats["requests"] += 1
+        max_retries = rate_limit_args if isinstance(rate_limit_args, int) else self._max_retries
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._send(callback, args, kwargs, None, None, max_retries)
+        # Сначала очередь своего чата, потом общая — медленный чат не держит общую очередь.
+        # Токен чата списывается в момент реальной отправки: интервал 1/с не съедается ожиданием общей очереди
+        bucket = self._chat_bucket(chat_id)
+        async with bucket.lock:
+            return await self._send(callback, args, kwargs, chat_id, bucket, max_retries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self._stats, "chats": len(self._chats)}
+
 
 def _stable_hash(text: str) -> str:
     """Генерирует стабильный короткий хеш текста."""
@@ -67,40 +262,51 @@ async def _send_single_message(
     send_kwargs: dict,
     attempt_limit: int = MAX_RETRIES
 ) -> Optional[Message]:
-    """Отправляет одно сообщение с повторными попытками."""
-    for attempt in range(attempt_limit + 1):
-        try:
-            return await context.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                **send_kwargs
-            )
-        except (TimedOut, NetworkError, httpx.ReadError, httpx.ConnectError) as e:
-            if attempt == attempt_limit:
-                logger.error(f"❌ Все попытки исчерпаны (Network): {e}")
-                return None
-            delay = min(BASE_RETRY_DELAY * (2 ** attempt), MAX_RETRY_DELAY)
-            await asyncio.sleep(delay)
-        except BadRequest as e:
-            err_msg = str(e).lower()
-            if any(x in err_msg for x in ("query is too old", "message is not modified")):
-                logger.warning(f"⚠️ Игнор: {err_msg}")
-                return None
-            elif "retry after" in err_msg:
-                wait_time = int(''.join(filter(str.isdigit, err_msg))) if any(c.isdigit() for c in err_msg) else 5
-                await asyncio.sleep(wait_time)
-                if attempt == attempt_limit:
-                    return None
-            else:
-                logger.error(f"❌ BadRequest: {e}")
-                return None
-        except Forbidden as e:
-            logger.error(f"❌ Бот заблокирован пользователем: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"❌ Неизвестная ошибка: {e}", exc_info=True)
-            return None
-    return None
+    """
+    Отправляет одно сообщение. Повторы (RetryAfter, сеть) делает OutboundRateLimiter,
+    attempt_limit передаётся ему через rate_limit_args.
+    """
+    if getattr(context.bot, "rate_limiter", None):
+        send_kwargs = {**send_kwargs, "rate_limit_args": attempt_limit}
+    try:
+        return await context.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            **send_kwargs
+        )
+    except RetryAfter as e:
+        logger.error(f"❌ Flood control, сообщение не отправлено: повтор через {retry_after_seconds(e):.0f} с")
+        return None
+    except BadRequest as e:
+        err_msg = str(e).lower()
+        if any(x in err_msg for x in ("query is too old", "message is not modified")):
+            logger.warning(f"⚠️ Игнор: {err_msg}")
+        else:
+            logger.error(f"❌ BadRequest: {e}")
+        return None
+    except (TimedOut, NetworkError, httpx.ReadError, httpx.ConnectError) as e:
+        logger.error(f"❌ Все попытки исчерпаны (Network): {e}")
+        return None
+    except Forbidden as e:
+        logger.error(f"❌ Бот заблокирован пользователем: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"❌ Неизвестная ошибка: {e}", exc_info=True)
+        return None
+
+
+def enqueue_reply(
+    update: Optional[Update],
+    context: ContextTypes.DEFAULT_TYPE,
+    text: str,
+    priority: int = PRIORITY_BULK,
+    **kwargs
+) -> asyncio.Future:
+    """
+    safe_reply через очередь отправки (utils.send_queue): сразу возвращает Future
+    с тем, что вернул бы safe_reply.
+    """
+    return send_queue.submit(priority, lambda: safe_reply(update, context, text, **kwargs))
 
 
 async def safe_reply(
@@ -109,6 +315,7 @@ async def safe_reply(
     text: str,
     max_retries: int = MAX_RETRIES,
     disable_cooldown: bool = False,
+    priority: Optional[int] = None,
     **kwargs
 ) -> Union[Optional[Message], List[Optional[Message]], None]:
     """
@@ -120,10 +327,18 @@ async def safe_reply(
     - parse_mode="HTML" по умолчанию
     - disable_notification=True по умолчанию
     - Автоматическое разбиение длинных сообщений (>4096)
+    - priority=PRIORITY_* — отправка через очередь с приоритетами (фоновые задачи);
+      без priority — сразу, как ответ пользователю
 
     Returns:
         Message | List[Message] | None
     """
+    if priority is not None:
+        return await enqueue_reply(
+            update, context, text, priority=priority,
+            max_retries=max_retries, disable_cooldown=disable_cooldown, **kwargs
+        )
+
     if not text or not isinstance(text, str):
         logger.warning("❌ safe_reply: пустой или неверный текст")
         return None
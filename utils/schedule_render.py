@@ -0,0 +1,126 @@
+# utils/schedule_render.py
+"""
+График поставок: общий рендер для Telegram (HTML) и MAX (markdown).
+✅ Готовый текст кэшируется по формату и ключу inventory.version()
+✅ SQL и сборка текста — только если менялись партии/заказы или наступил новый день
+✅ Ошибки БД не кэшируются — SELECT с raise_errors=True, исключение пробрасывается вызывающему
+   (handle_schedule / format_schedule_message показывают «Ошибка при загрузке графика»)
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from config.buttons import SEPARATOR
+from database.repository import db
+from database.inventory import inventory
+
+logger = logging.getLogger(__name__)
+
+EMPTY_SCHEDULE_TEXT = "📅 Нет активных поставок на ближайшее время."
+
+# Разметка: (заголовок, открывающий тег, закрывающий тег, разделитель записей)
+_FORMATS = {
+    "html": ("📦 <b>График поставок:</b>", "<b>", "</b>", SEPARATOR),
+    "markdown": ("📦 *График поставок:*", "*", "*", ""),
+}
+
+_rows: Optional[Tuple[Tuple[int, str], list]] = None
+_texts: Dict[str, Tuple[Tuple[int, str], str]] = {}
+_lock = asyncio.Lock()
+_stats = {"hits": 0, "renders": 0, "loads": 0}
+
+
+async def _load_rows(key: Tuple[int, str]) -> list:
+    global _rows
+    if _rows and _rows[0] == key:
+        return _rows[1]
+    rows = await db.execute_read(
+        """
+        SELECT breed, incubator, date, available_quantity, quantity, price
+        FROM stocks
+        WHERE quantity > 0 AND status = 'active' AND date >= ?
+        ORDER BY date
+        """,
+        (key[1],),
+        raise_errors=True  # Сбой не должен закэшироваться как «нет поставок»
+    )
+    _rows = (key, rows)
+    _stats["loads"] += 1
+    return rows
+
+
+def _render(rows: list, fmt: str) -> str:
+    if not rows:
+        return EMPTY_SCHEDULE_TEXT
+
+    title, b_open, b_close, separator = _FORMATS[fmt]
+    message_lines: List[str] = [title, separator]
+    for breed, incubator, raw_date, avail_qty, total_qty, price in rows:
+        try:
+            avail = max(int(avail_qty or 0), 0)
+            total = max(int(total_qty or 0), 1)
+            percent = (avail / total) * 100
+        except (ValueError, TypeError):
+            continue
+
+        icon = "🟢" if percent >= 50 else "🟡" if percent >= 10 else "🔴"
+
+        try:
+            price_value = int(float(price or 0))
+        except (ValueError, TypeError):
+            price_value = 0
+
+        try:
+            formatted_date = datetime.strptime(raw_date, "%Y-%m-%d").strftime("%d-%m-%Y")
+        except ValueError:
+            formatted_date = raw_date
+
+        breed_safe = escape(breed)
+        incubator_safe = escape(incubator) if incubator else "Не указан"
+
+        message_lines.append(
+            f"🐔 {b_open}Порода:{b_close} {breed_safe}\n"
+            f"🏢 {b_open}Инкубатор:{b_close} {incubator_safe}\n"
+            f"📅 {b_open}Поставка:{b_close} {formatted_date}\n"
+            f"{icon} {b_open}Доступно:{b_close} {avail} шт.\n"
+            f"💰 {b_open}Цена:{b_close} {price_value} руб."
+        )
+        message_lines.append(separator)
+
+    if separator and message_lines[-1] == separator:
+        message_lines.pop()
+
+    return "\n".join(message_lines).strip()
+
+
+async def render_schedule(fmt: str = "html") -> str:
+    """
+    Текст графика поставок в формате 'html' или 'markdown'.
+    Повторные вызовы без изменений остатков возвращают готовую строку без SQL.
+    """
+    key = inventory.version()
+    cached = _texts.get(fmt)
+    if cached and cached[0] == key:
+        _stats["hits"] += 1
+        return cached[1]
+
+    async with _lock:
+        # Ключ берётся до SELECT: запись во время чтения сделает кэш устаревшим, а не ложно свежим
+        key = inventory.version()
+        cached = _texts.get(fmt)
+        if cached and cached[0] == key:
+            _stats["hits"] += 1
+            return cached[1]
+
+        text = _render(await _load_rows(key), fmt)
+        _texts[fmt] = (key, text)
+        _stats["renders"] += 1
+        logger.debug(f"📅 График поставок перерисован ({fmt}), версия остатков {key}")
+        return text
+
+
+def get_schedule_cache_stats() -> Dict[str, int]:
+    return dict(_stats)
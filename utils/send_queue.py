@@ -0,0 +1,124 @@
+# utils/send_queue.py
+"""
+Очередь исходящих сообщений с приоритетами и пулом воркеров.
+✅ Классы: интерактивные ответы → уведомления по заказам → напоминания → массовая рассылка
+✅ submit() сразу возвращает Future — вызывающий сам решает, ждать ли доставки
+✅ Воркеры берут самое приоритетное; внутри класса — по порядку постановки
+✅ Фоновые классы занимают не больше SEND_WORKERS - SEND_WORKERS_RESERVED воркеров:
+   свободные воркеры всегда остаются для интерактивных ответов
+✅ В полёте одновременно не больше SEND_WORKERS отправок — рассылка не занимает общий лимит
+   OutboundRateLimiter на минуты вперёд, ответ на «🐔 Каталог» не стоит за ней в очереди
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_TRANSACTIONAL = 1
+PRIORITY_REMINDER = 2
+PRIORITY_BULK = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_TRANSACTIONAL: "transactional",
+    PRIORITY_REMINDER: "reminder",
+    PRIORITY_BULK: "bulk",
+}
+
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+SEND_WORKERS_RESERVED = int(os.getenv("SEND_WORKERS_RESERVED", "2"))
+
+# (приоритет, порядковый номер, фабрика корутины, future)
+_QueueItem = Tuple[int, int, Callable[[], Awaitable[Any]], asyncio.Future]
+
+
+class SendQueue:
+    def __init__(self, workers: int = SEND_WORKERS, reserved: int = SEND_WORKERS_RESERVED):
+        self.workers = max(workers, 1)
+        self.background_limit = max(self.workers - max(reserved, 0), 1)
+        self._heap: List[_QueueItem] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._background_busy = 0
+        self._stats = {name: {"queued": 0, "sent": 0, "failed": 0} for name in PRIORITY_NAMES.values()}
+
+    def _start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"send_worker_{i}") for i in range(self.workers)]
+        logger.info(f"📮 Очередь отправки запущена: {self.workers} воркеров, фоновым — до {self.background_limit}")
+
+    def submit(self, priority: int, factory: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """
+        Ставит отправку в очередь. factory — функция без аргументов, возвращающая корутину
+        (например, lambda: bot.send_message(...)). Результат или исключение — в Future.
+        """
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), factory, future))
+        self._stats[PRIORITY_NAMES.get(priority, "bulk")]["queued"] += 1
+        self._wakeup.set()
+        return future
+
+    def _can_take(self) -> bool:
+        if not self._heap:
+            return False
+        return self._heap[0][0] == PRIORITY_INTERACTIVE or self._background_busy < self.background_limit
+
+    async def _worker(self):
+        while True:
+            while not self._can_take():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            priority, _, factory, future = heapq.heappop(self._heap)
+            background = priority != PRIORITY_INTERACTIVE
+            if background:
+                self._background_busy += 1
+
+            stats = self._stats[PRIORITY_NAMES.get(priority, "bulk")]
+            try:
+                if not future.cancelled():
+                    result = await factory()
+                    if not future.cancelled():
+                        future.set_result(result)
+                    stats["sent"] += 1
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                stats["failed"] += 1
+                if not future.cancelled():
+                    future.set_exception(e)
+            finally:
+                if background:
+                    self._background_busy -= 1
+                    self._wakeup.set()
+
+    async def shutdown(self):
+        """Останавливает воркеров. Неотправленное отменяется"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._heap:
+            heapq.heappop(self._heap)[3].cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._heap),
+            "background_busy": self._background_busy,
+            **{name: dict(values) for name, values in self._stats.items()},
+        }
+
+
+# === Глобальная очередь ===
+send_queue = SendQueue()
@@ -0,0 +1,89 @@
+# utils/telegram_files.py
+"""
+Отправка локальных картинок (images/*.jpg) через file_id вместо повторной загрузки.
+✅ Реестр (путь + sha256) → file_id в таблице telegram_files — переживает перезапуск
+✅ Первая отправка загружает файл и сохраняет file_id, дальше — только file_id
+✅ Хэш пересчитывается, только если у файла изменились размер или mtime
+✅ file_id, который Telegram не принял, забывается — файл загружается заново
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from telegram import Message
+from telegram.error import BadRequest
+
+from database.repository import db
+
+logger = logging.getLogger(__name__)
+
+_hashes: Dict[str, Tuple[int, int, str]] = {}  # path → (mtime_ns, size, sha256)
+_file_ids: Optional[Dict[Tuple[str, str], str]] = None  # Загружается из БД при первой отправке
+_load_lock = asyncio.Lock()
+_stats = {"reused": 0, "uploaded": 0, "rejected": 0}
+
+
+def _content_hash(path: str) -> str:
+    st = os.stat(path)
+    cached = _hashes.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+async def _registry() -> Dict[Tuple[str, str], str]:
+    global _file_ids
+    if _file_ids is None:
+        async with _load_lock:
+            if _file_ids is None:
+                try:
+                    _file_ids = await db.get_telegram_file_ids()
+                    logger.info(f"🖼️ Реестр file_id загружен: {len(_file_ids)} картинок")
+                except Exception as e:
+                    logger.error(f"❌ Не удалось загрузить реестр file_id: {e}", exc_info=True)
+                    return {}
+    return _file_ids
+
+
+async def reply_local_photo(message: Message, path: str, **kwargs) -> Message:
+    """
+    message.reply_photo для файла с диска: по file_id, если файл уже загружался.
+    kwargs передаются в reply_photo (caption, parse_mode, reply_markup...).
+    Ошибки отправки пробрасываются — текстовый fallback остаётся за вызывающим.
+    """
+    key = (path, _content_hash(path))
+    registry = await _registry()
+
+    file_id = registry.get(key)
+    if file_id:
+        try:
+            sent = await message.reply_photo(photo=file_id, **kwargs)
+            _stats["reused"] += 1
+            return sent
+        except BadRequest as e:
+            # Например, file_id от другого бота (сменили токен) — загрузим файл заново
+            logger.warning(f"🖼️ file_id для {path} не принят: {e} — загружаем файл")
+            _stats["rejected"] += 1
+            registry.pop(key, None)
+            await db.forget_telegram_file_id(*key)
+
+    with open(path, "rb") as photo:
+        sent = await message.reply_photo(photo=photo, **kwargs)
+    _stats["uploaded"] += 1
+
+    if sent and sent.photo:
+        largest = sent.photo[-1]
+        registry[key] = largest.file_id
+        await db.save_telegram_file_id(path, key[1], largest.file_id, largest.file_unique_id)
+        logger.info(f"🖼️ {path} загружен в Telegram, file_id сохранён")
+    return sent
+
+
+def get_telegram_files_stats() -> Dict[str, int]:
+    return {**_stats, "registered": len(_file_ids or {})}